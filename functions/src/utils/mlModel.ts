@@ -16,6 +16,10 @@ try {
 const DEV_MODE = config.ml_service?.dev_mode === "true" || process.env.DEV_MODE === "true";
 const ML_SERVICE_URL = config.ml_service?.url || process.env.ML_SERVICE_URL || "http://localhost:8000";
 
+// How long we wait for the ML service before falling back to the mock.
+// Sent as X-Deadline-Ms so the service can drop work we will no longer read.
+const ML_TIMEOUT_MS = 15000;
+
 // Log configuration on module load
 console.log("ML Model Configuration:", {
   devMode: DEV_MODE,
@@ -45,12 +49,13 @@ export async function predictPCOSRisk(
     console.log(`Calling ML service at: ${ML_SERVICE_URL}/predict`);
     
     const controller = new AbortController();
-    const timeoutId = setTimeout(() => controller.abort(), 15000); // 15 second timeout (faster fail)
+    const timeoutId = setTimeout(() => controller.abort(), ML_TIMEOUT_MS); // 15 second timeout (faster fail)
     
     const response = await fetch(`${ML_SERVICE_URL}/predict`, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        "X-Deadline-Ms": String(ML_TIMEOUT_MS),
       },
       body: JSON.stringify(input),
       signal: controller.signal,
@@ -59,6 +64,7 @@ export async function predictPCOSRisk(
     clearTimeout(timeoutId);
 
     if (!response.ok) {
+      // 503 (overloaded, see Retry-After) and 504 (deadline passed) also fall back to the mock
       const errorText = await response.text();
       console.error(`ML service HTTP error: ${response.status} - ${errorText}`);
       throw new Error(`ML service error: ${response.status} - ${errorText}`);
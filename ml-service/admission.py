@@ -0,0 +1,252 @@
+"""
+Admission control for the PCOS prediction service
+
+Prediction requests pass through a gate before any work is done on them:
+
+- at most `max_concurrent` requests run at once
+- up to `max_queued` more wait in FIFO order, each for at most
+  `queue_timeout_ms` (or until its own deadline, if sooner)
+- anything beyond that is rejected at once with 503 and a Retry-After
+  estimated from recent service times
+
+Callers may send `X-Deadline-Ms`, the milliseconds they are still willing
+to wait. Requests whose deadline has already passed on arrival (a value of
+0 or less) or passes while queued are answered with 504 without running; the endpoint checks the deadline again right before
+inference (see `remaining_seconds`). Keeping both the queue and the wait
+short means admitted requests see roughly the latency of an idle service
+while the excess is shed quickly for the caller to retry or fall back.
+"""
+
+import asyncio
+import collections
+import contextvars
+import json
+import math
+import re
+import time
+from contextlib import contextmanager
+from typing import Deque, Optional, Sequence
+
+import metrics
+
+DEADLINE_HEADER = b"x-deadline-ms"
+
+# Paths gated by default: everything that runs the model per request
+DEFAULT_PATHS = ("/predict", "/predict/batch", "/predict/compact")
+DEFAULT_PATH_PATTERNS = (r"^/models/[^/]+/predict$",)
+
+REJECTED = metrics.registry.counter(
+    "pcos_admission_rejected_total", "Requests shed by admission control", ("reason",))
+QUEUE_WAIT_SECONDS = metrics.registry.histogram(
+    "pcos_admission_queue_wait_seconds", "Time admitted requests spent queued")
+
+
+class DeadlineExceeded(Exception):
+    """The caller's deadline passed before the work could start"""
+
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+def remaining_seconds() -> Optional[float]:
+    """Seconds left before the current request's deadline; None if it has none"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def current_deadline() -> Optional[float]:
+    """The current request's deadline on the time.monotonic() clock, if it has one"""
+    return _deadline.get()
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current request's deadline has passed"""
+    remaining = remaining_seconds()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Give the enclosed work a deadline `seconds` from now (e.g. a gRPC deadline)"""
+    token = _deadline.set(time.monotonic() + seconds if seconds is not None else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def parse_deadline_ms(value: Optional[bytes]) -> Optional[float]:
+    """Milliseconds from the deadline header; None if absent or not a number
+
+    Zero or negative values are kept: that deadline has already passed.
+    """
+    if value is None:
+        return None
+    try:
+        milliseconds = float(value)
+    except ValueError:
+        return None
+    if math.isnan(milliseconds) or milliseconds == math.inf:
+        return None
+    return milliseconds
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded, time-limited FIFO queue"""
+
+    def __init__(self, max_concurrent: int = 32, max_queued: int = 64,
+                 queue_timeout_ms: float = 1000.0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.queue_timeout_ms = max(0.0, queue_timeout_ms)
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        # Smoothed seconds per admitted request, for Retry-After
+        self._service_seconds = 0.05
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Whole seconds until the current backlog should have drained"""
+        backlog = self.queued + self.active
+        return max(1, math.ceil(backlog * self._service_seconds / self.max_concurrent))
+
+    async def acquire(self, deadline: Optional[float]) -> Optional[str]:
+        """Take a slot; returns None once admitted, or the reason for rejection"""
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            return None
+        if self.queued >= self.max_queued:
+            return "queue_full"
+
+        wait_until = time.monotonic() + self.queue_timeout_ms / 1000.0
+        reason = "queue_timeout"
+        if deadline is not None and deadline < wait_until:
+            wait_until, reason = deadline, "deadline"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        admitted = False
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=max(0.0, wait_until - time.monotonic()))
+            admitted = True
+            return None
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ran out: keep it
+                admitted = True
+                return None
+            return reason
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            elif not admitted and not waiter.cancelled():
+                # Cancelled (client gone) after being handed a slot: pass it on
+                self.release()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self, service_seconds: Optional[float] = None):
+        """Free a slot, handing it straight to the oldest live waiter"""
+        if service_seconds is not None:
+            self._service_seconds += 0.1 * (service_seconds - self._service_seconds)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot passes on without `active` changing
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "queue_timeout_ms": self.queue_timeout_ms,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "service_ms": round(self._service_seconds * 1000, 3),
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that gates matching paths through an AdmissionController
+
+    Requests to other paths (health, metrics, models, streaming) pass
+    straight through. `X-Deadline-Ms` is honoured on every path, so
+    `remaining_seconds()` works wherever the endpoint wants to check it.
+    """
+
+    def __init__(self, app, controller: AdmissionController, enabled: bool = True,
+                 default_deadline_ms: Optional[float] = None,
+                 paths: Sequence[str] = DEFAULT_PATHS, path_patterns: Sequence[str] = DEFAULT_PATH_PATTERNS):
+        self.app = app
+        self.controller = controller
+        self.enabled = enabled
+        self.default_deadline_ms = default_deadline_ms
+        self.paths = set(paths)
+        self.patterns = [re.compile(pattern) for pattern in path_patterns]
+
+    def gated(self, path: str) -> bool:
+        return path in self.paths or any(pattern.match(path) for pattern in self.patterns)
+
+    async def reject(self, send, status: int, reason: str, detail: str, retry_after: Optional[int] = None):
+        REJECTED.inc(reason=reason)
+        self.controller.rejected += 1
+        headers = [(b"content-type", b"application/json")]
+        if retry_after is not None:
+            headers.append((b"retry-after", str(retry_after).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": json.dumps({"detail": detail}).encode()})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline_ms = parse_deadline_ms(dict(scope["headers"]).get(DEADLINE_HEADER))
+        if deadline_ms is None:
+            deadline_ms = self.default_deadline_ms
+        deadline = time.monotonic() + deadline_ms / 1000.0 if deadline_ms is not None else None
+        token = _deadline.set(deadline)
+        try:
+            if not self.enabled or not self.gated(scope["path"]):
+                await self.app(scope, receive, send)
+                return
+
+            if deadline is not None and deadline <= time.monotonic():
+                await self.reject(send, 504, "deadline", "Deadline exceeded before admission")
+                return
+
+            queued_at = time.monotonic()
+            reason = await self.controller.acquire(deadline)
+            # Kept apart from validation in the request's stage timings
+            metrics.set_queue_wait(time.monotonic() - queued_at)
+            if reason == "deadline":
+                await self.reject(send, 504, reason, "Deadline exceeded while queued")
+                return
+            if reason is not None:
+                await self.reject(send, 503, reason, "Service overloaded, retry later",
+                                  retry_after=self.controller.retry_after())
+                return
+
+            started = time.monotonic()
+            QUEUE_WAIT_SECONDS.observe(started - queued_at)
+            self.controller.admitted += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.controller.release(time.monotonic() - started)
+        finally:
+            _deadline.reset(token)
@@ -0,0 +1,428 @@
+"""
+Versioned model artifacts for the PCOS prediction service
+
+An artifact is a directory, <name>.artifact/, holding a JSON manifest and
+the model's parameters as plain data instead of an arbitrary pickle:
+
+    manifest.json      format version, model kind and type, feature spec
+                       (imputation and scaling included), class map,
+                       library versions, training metrics and the SHA-256
+                       of every payload file
+    arrays/*.npy       "trees" and "linear" kinds: flat node arrays or
+                       coefficients, memory-mapped on load
+    model.ubj          "xgboost" kind: XGBoost's native model format
+    estimator.pkl      "pickle" kind: any other estimator (last resort)
+
+Tree ensembles load straight into the compiled evaluator with the arrays
+memory-mapped read-only, so loading takes milliseconds and pre-forked
+workers share the pages through the page cache instead of each holding
+its own copy.
+
+Loading fails loudly with ArtifactError: on an unknown format version, on
+a checksum mismatch, and when an installed library cannot read what was
+saved (see COMPATIBILITY). Nothing is silently skipped.
+
+Inspect and verify an artifact with:
+    python artifact.py ../ml_f/models/random_forest.artifact
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import platform
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from importlib import metadata
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+
+from feature_encoder import FeatureSpec
+from inference import CompiledTreeBackend, UnsupportedModelError, compile_model
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT = "pcos-model-artifact"
+FORMAT_VERSION = 1
+ARTIFACT_SUFFIX = ".artifact"
+MANIFEST_FILE = "manifest.json"
+
+TREE_ARRAYS = ("feature", "threshold", "left", "right", "default_left", "value", "roots")
+
+DISTRIBUTIONS = {"numpy": "numpy", "sklearn": "scikit-learn", "xgboost": "xgboost"}
+
+# Library versions each kind's payload depends on: "major" must match the
+# saving version's major, "exact" the full version
+COMPATIBILITY = {
+    "trees": {"numpy": "major"},
+    "linear": {"numpy": "major"},
+    "xgboost": {"xgboost": "major"},
+    "pickle": {"numpy": "major", "sklearn": "exact", "xgboost": "exact"},
+}
+
+
+class ArtifactError(ValueError):
+    """An artifact is malformed, corrupted or incompatible with this environment"""
+
+
+def library_versions() -> Dict[str, Optional[str]]:
+    """Installed versions of the libraries artifacts depend on (None if missing)
+
+    Read from package metadata, so checking an artifact never imports a
+    library its kind doesn't need.
+    """
+    versions = {"python": platform.python_version()}
+    for name, distribution in DISTRIBUTIONS.items():
+        try:
+            versions[name] = metadata.version(distribution)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+@contextmanager
+def atomic_directory(path: str) -> Iterator[str]:
+    """Yield a staging directory that replaces `path` only once the block completes
+
+    The staging directory is created next to `path` and renamed into place,
+    so readers never see a half-written directory; on any error it is
+    removed and `path` is left as it was. An existing `path` is moved aside
+    and deleted after the swap. Also used for the training-side caches
+    (ml_f/src/feature_store.py, checkpoints.py).
+    """
+    path = path.rstrip(os.sep)
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        os.chmod(staging, 0o755)
+        yield staging
+        if os.path.exists(path):
+            retired = tempfile.mkdtemp(prefix=".old-", dir=parent)
+            os.rename(path, os.path.join(retired, "old"))
+            os.rename(staging, path)
+            shutil.rmtree(retired, ignore_errors=True)
+        else:
+            os.rename(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def remove_siblings(path: str, prefix: str):
+    """Delete the other entries next to `path` whose names start with `prefix`"""
+    parent = os.path.dirname(os.path.abspath(path))
+    for other in os.listdir(parent):
+        if other.startswith(prefix) and other != os.path.basename(path):
+            shutil.rmtree(os.path.join(parent, other), ignore_errors=True)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _files_checksum(files: Dict[str, dict]) -> str:
+    """One hash over every payload checksum; doubles as the artifact's version"""
+    return hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()
+
+
+class ArtifactTreeEnsemble:
+    """A sklearn forest or tree restored from its node arrays
+
+    Carries what the service reads from a model besides inference (classes,
+    importances, SHAP input); predictions come from the compiled backend.
+    """
+
+    def __init__(self, model_type: str, classes: np.ndarray, importances: np.ndarray,
+                 backend: CompiledTreeBackend, cover: np.ndarray):
+        self.model_type = model_type
+        self.classes_ = classes
+        self.n_features_in_ = len(importances)
+        self.feature_importances_ = importances
+        self.backend = backend
+        self.cover = cover
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        return self.backend.predict_proba(features)
+
+    def shap_model(self) -> Dict[str, Any]:
+        """The ensemble in shap's dict model format (path-dependent TreeSHAP on probabilities)"""
+        backend = self.backend
+        ends = list(backend.roots[1:]) + [len(backend.left)]
+        scaling = 1.0 / len(backend.roots) if backend.aggregate == "mean" else 1.0
+        trees = []
+        for start, end in zip(backend.roots, ends):
+            own = np.arange(start, end)
+            # Leaves point to themselves in the compiled arrays; shap marks them with -1
+            leaf = np.asarray(backend.left[start:end]) == own
+            left = np.where(leaf, -1, np.asarray(backend.left[start:end]) - start)
+            right = np.where(leaf, -1, np.asarray(backend.right[start:end]) - start)
+            trees.append({
+                "children_left": left,
+                "children_right": right,
+                "children_default": np.where(np.asarray(backend.default_left[start:end]), left, right),
+                "features": np.where(leaf, -2, np.asarray(backend.feature[start:end])),
+                "thresholds": np.asarray(backend.threshold[start:end], dtype=np.float64),
+                "values": np.asarray(backend.value[start:end], dtype=np.float64) * scaling,
+                "node_sample_weight": np.asarray(self.cover[start:end], dtype=np.float64),
+            })
+        return {"trees": trees, "tree_output": "probability", "input_dtype": np.float32,
+                "internal_dtype": np.float64}
+
+
+class LoadedArtifact:
+    def __init__(self, path: str, manifest: dict, model, feature_spec: FeatureSpec,
+                 backend: Optional[CompiledTreeBackend], load_ms: float):
+        self.path = path
+        self.manifest = manifest
+        self.model = model
+        self.feature_spec = feature_spec
+        # Set for kinds served only by their compiled form
+        self.backend = backend
+        self.load_ms = load_ms
+
+    @property
+    def version(self) -> str:
+        """Content hash of the artifact: the manifest pins every payload's checksum"""
+        return self.manifest["checksum"][:12]
+
+    @property
+    def metrics(self) -> dict:
+        return self.manifest.get("metrics") or {}
+
+
+def _write_arrays(directory: str, arrays: Dict[str, np.ndarray]):
+    os.makedirs(os.path.join(directory, "arrays"), exist_ok=True)
+    for key, array in arrays.items():
+        np.save(os.path.join(directory, "arrays", f"{key}.npy"), np.ascontiguousarray(array))
+
+
+def _tree_cover(model) -> np.ndarray:
+    """Training samples reaching each node, in compiled node order (TreeSHAP needs it)"""
+    estimators = getattr(model, "estimators_", [model])
+    return np.concatenate([
+        np.asarray(estimator.tree_.weighted_n_node_samples, dtype=np.float64) for estimator in estimators
+    ])
+
+
+def _save_payload(directory: str, model) -> Dict[str, Any]:
+    """Write the model's parameters; returns the manifest's kind-specific fields"""
+    type_name = type(model).__name__
+    try:
+        from xgboost import XGBClassifier
+        if isinstance(model, XGBClassifier):
+            model.save_model(os.path.join(directory, "model.ubj"))
+            return {"kind": "xgboost"}
+    except ImportError:
+        pass
+
+    from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.tree import DecisionTreeClassifier
+
+    if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier, DecisionTreeClassifier)):
+        try:
+            backend = compile_model(model)
+        except UnsupportedModelError:
+            backend = None
+        if backend is not None:
+            arrays = {key: getattr(backend, key) for key in TREE_ARRAYS}
+            arrays["cover"] = _tree_cover(model)
+            arrays["importances"] = np.asarray(model.feature_importances_, dtype=np.float64)
+            _write_arrays(directory, arrays)
+            return {"kind": "trees", "params": {
+                "max_depth": int(backend.max_depth), "strict": bool(backend.strict),
+                "aggregate": backend.aggregate,
+            }}
+    if isinstance(model, LogisticRegression):
+        _write_arrays(directory, {"coef": model.coef_, "intercept": model.intercept_})
+        return {"kind": "linear", "params": {
+            "multi_class": model.multi_class, "solver": model.solver,
+        }}
+
+    logger.warning(f"⚠️ No array form for {type_name}; storing it as a pickle tied to this sklearn version")
+    with open(os.path.join(directory, "estimator.pkl"), "wb") as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {"kind": "pickle"}
+
+
+def save_artifact(path: str, model, feature_spec: FeatureSpec, name: Optional[str] = None,
+                  class_labels: Optional[Dict[int, str]] = None, metrics: Optional[dict] = None,
+                  extra: Optional[dict] = None) -> dict:
+    """Write `model` (a fitted estimator, not a pipeline) as an artifact directory at `path`
+
+    Preprocessing travels in `feature_spec` (imputation statistics and
+    scaling). The directory is built next to `path` and renamed into place,
+    replacing any previous artifact (see atomic_directory). Returns the
+    manifest.
+    """
+    if feature_spec.imputation is None:
+        raise ArtifactError("An artifact's feature spec must carry imputation statistics; "
+                            "no preprocessing objects are stored")
+    path = path.rstrip(os.sep)
+    with atomic_directory(path) as staging:
+        payload = _save_payload(staging, model)
+        classes = [int(c) for c in getattr(model, "classes_", [])]
+        files = {}
+        for root, _, filenames in os.walk(staging):
+            for filename in sorted(filenames):
+                full = os.path.join(root, filename)
+                relative = os.path.relpath(full, staging)
+                files[relative] = {"sha256": _sha256(full), "bytes": os.path.getsize(full)}
+        manifest = {
+            "format": ARTIFACT_FORMAT,
+            "format_version": FORMAT_VERSION,
+            "name": name or os.path.basename(path)[:-len(ARTIFACT_SUFFIX)],
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "model_type": type(model).__name__,
+            "kind": payload["kind"],
+            "params": payload.get("params", {}),
+            "n_features": feature_spec.n_features,
+            "classes": classes,
+            "class_labels": {str(c): (class_labels or {}).get(c) for c in classes},
+            "feature_spec": feature_spec.to_dict(),
+            "libraries": library_versions(),
+            "metrics": {k: float(v) for k, v in (metrics or {}).items() if isinstance(v, (int, float))},
+            "files": files,
+        }
+        if extra:
+            manifest["extra"] = extra
+        manifest["checksum"] = _files_checksum(files)
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _major(version: Optional[str]) -> Optional[str]:
+    return version.split(".")[0] if version else None
+
+
+def check_compatibility(manifest: dict, installed: Optional[Dict[str, Optional[str]]] = None):
+    """Raise ArtifactError if an installed library cannot read this artifact's payload"""
+    installed = installed or library_versions()
+    saved = manifest.get("libraries", {})
+    problems = []
+    for library, rule in COMPATIBILITY.get(manifest["kind"], {}).items():
+        expected, actual = saved.get(library), installed.get(library)
+        if expected is None:
+            continue
+        if actual is None:
+            problems.append(f"{library} {expected} is required but not installed")
+        elif rule == "exact" and actual != expected:
+            problems.append(f"{library} {actual} installed, artifact needs exactly {expected}")
+        elif rule == "major" and _major(actual) != _major(expected):
+            problems.append(f"{library} {actual} installed, artifact needs {_major(expected)}.x")
+    if problems:
+        raise ArtifactError(f"{manifest.get('name')} ({manifest['kind']}) was saved with incompatible "
+                            f"libraries: {'; '.join(problems)}")
+
+
+def read_manifest(path: str) -> dict:
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ArtifactError(f"{path}: cannot read {MANIFEST_FILE}: {e}")
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ArtifactError(f"{path} is not a model artifact (format {manifest.get('format')!r})")
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ArtifactError(f"{path} has format version {manifest.get('format_version')}, "
+                            f"this service reads version {FORMAT_VERSION}")
+    if manifest.get("kind") not in COMPATIBILITY:
+        raise ArtifactError(f"{path}: unknown model kind {manifest.get('kind')!r}")
+    return manifest
+
+
+def verify_files(path: str, manifest: dict):
+    """Raise ArtifactError unless every payload file matches its recorded SHA-256"""
+    files = manifest.get("files", {})
+    if _files_checksum(files) != manifest.get("checksum"):
+        raise ArtifactError(f"{path}: manifest checksum does not match its file list")
+    for relative, expected in files.items():
+        full = os.path.join(path, relative)
+        if not os.path.isfile(full):
+            raise ArtifactError(f"{path}: payload file {relative} is missing")
+        if _sha256(full) != expected["sha256"]:
+            raise ArtifactError(f"{path}: checksum mismatch for {relative}; the artifact is corrupted")
+
+
+def _load_arrays(path: str, manifest: dict) -> Dict[str, np.ndarray]:
+    arrays = {}
+    for relative in manifest["files"]:
+        if relative.startswith("arrays" + os.sep) and relative.endswith(".npy"):
+            key = os.path.basename(relative)[:-len(".npy")]
+            arrays[key] = np.load(os.path.join(path, relative), mmap_mode="r", allow_pickle=False)
+    return arrays
+
+
+def load_artifact(path: str, verify: bool = True) -> LoadedArtifact:
+    """Load an artifact directory; raises ArtifactError if it cannot be used as saved"""
+    started = time.perf_counter()
+    path = path.rstrip(os.sep)
+    manifest = read_manifest(path)
+    check_compatibility(manifest)
+    if verify:
+        verify_files(path, manifest)
+
+    kind = manifest["kind"]
+    classes = np.asarray(manifest["classes"], dtype=np.int64)
+    backend = None
+    if kind == "trees":
+        arrays = _load_arrays(path, manifest)
+        params = manifest["params"]
+        backend = CompiledTreeBackend(
+            **{key: arrays[key] for key in TREE_ARRAYS},
+            max_depth=params["max_depth"], strict=params["strict"], aggregate=params["aggregate"],
+        )
+        model = ArtifactTreeEnsemble(manifest["model_type"], classes, np.asarray(arrays["importances"]),
+                                     backend, arrays["cover"])
+    elif kind == "linear":
+        from sklearn.linear_model import LogisticRegression
+        arrays = _load_arrays(path, manifest)
+        model = LogisticRegression(**manifest["params"])
+        model.coef_ = np.asarray(arrays["coef"])
+        model.intercept_ = np.asarray(arrays["intercept"])
+        model.classes_ = classes
+        model.n_features_in_ = manifest["n_features"]
+    elif kind == "xgboost":
+        from xgboost import XGBClassifier
+        model = XGBClassifier()
+        model.load_model(os.path.join(path, "model.ubj"))
+    else:
+        with open(os.path.join(path, "estimator.pkl"), "rb") as f:
+            model = pickle.load(f)
+
+    feature_spec = FeatureSpec.from_dict(manifest["feature_spec"])
+    if feature_spec.n_features != manifest["n_features"]:
+        raise ArtifactError(f"{path}: feature spec has {feature_spec.n_features} features, "
+                            f"manifest says {manifest['n_features']}")
+    load_ms = round((time.perf_counter() - started) * 1000, 2)
+    return LoadedArtifact(path, manifest, model, feature_spec, backend, load_ms)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Verify and describe a model artifact")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    try:
+        loaded = load_artifact(args.path)
+    except ArtifactError as e:
+        print(f"FAILED: {e}")
+        raise SystemExit(1)
+    manifest = loaded.manifest
+    print(f"{manifest['name']}: {manifest['model_type']} ({manifest['kind']}), version {loaded.version}")
+    print(f"  created {manifest['created']} with {json.dumps(manifest['libraries'])}")
+    print(f"  {len(manifest['files'])} file(s), {sum(f['bytes'] for f in manifest['files'].values())} bytes, "
+          f"checksums OK, loaded in {loaded.load_ms} ms")
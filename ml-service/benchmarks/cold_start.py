@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the PCOS prediction service
+
+Starts the service in a fresh process several times and measures, per run:
+- port_open_ms:     process start until the port accepts connections
+- ready_ms:         process start until /ready returns 200
+- first_predict_ms: latency of the first /predict after ready
+- the service's own startup phase timings reported on /ready
+
+Results are printed as JSON (with medians across runs).
+
+Usage (from ml-service/):
+    python benchmarks/cold_start.py --runs 5
+    python benchmarks/cold_start.py --mode serve --workers 2
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAYLOAD = {
+    "age": 28,
+    "weight": 65,
+    "height": 165,
+    "cycleRegularity": "irregular",
+    "exerciseFrequency": "1-2_week",
+    "diet": "balanced",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def port_open(port: int) -> bool:
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=0.05):
+            return True
+    except OSError:
+        return False
+
+
+def http(method: str, url: str, body=None, timeout: float = 30.0):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None, None
+
+
+def command(mode: str, port: int, workers: int):
+    if mode == "serve":
+        return [sys.executable, "serve.py", "--port", str(port), "--host", "127.0.0.1",
+                "--workers", str(workers), "--log-level", "warning"]
+    return [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+            "--port", str(port), "--log-level", "warning"]
+
+
+def run_once(mode: str, workers: int, timeout: float) -> dict:
+    port = free_port()
+    env = dict(os.environ)
+    env.setdefault("MODEL_DIR", os.path.join(SERVICE_DIR, "..", "ml_f", "models"))
+    started = time.perf_counter()
+    process = subprocess.Popen(command(mode, port, workers), cwd=SERVICE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {}
+    try:
+        deadline = started + timeout
+        while not port_open(port):
+            if time.perf_counter() > deadline or process.poll() is not None:
+                raise RuntimeError("Service did not open its port")
+            time.sleep(0.005)
+        result["port_open_ms"] = (time.perf_counter() - started) * 1000
+
+        base = f"http://127.0.0.1:{port}"
+        while True:
+            status, body = http("GET", f"{base}/ready", timeout=1.0)
+            if status == 200:
+                break
+            if time.perf_counter() > deadline or process.poll() is not None:
+                raise RuntimeError(f"Service did not become ready (last status {status})")
+            time.sleep(0.01)
+        result["ready_ms"] = (time.perf_counter() - started) * 1000
+        result["service_timings_ms"] = body.get("timings_ms", {})
+
+        predict_started = time.perf_counter()
+        status, _ = http("POST", f"{base}/predict", PAYLOAD)
+        result["first_predict_ms"] = (time.perf_counter() - predict_started) * 1000
+        result["first_predict_status"] = status
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure ML service cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mode", choices=["uvicorn", "serve"], default="uvicorn")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    runs = []
+    for i in range(args.runs):
+        run = run_once(args.mode, args.workers, args.timeout)
+        print(f"run {i + 1}/{args.runs}: port {run['port_open_ms']:.0f} ms, "
+              f"ready {run['ready_ms']:.0f} ms, first predict {run['first_predict_ms']:.1f} ms",
+              file=sys.stderr)
+        runs.append(run)
+
+    summary = {
+        key: round(statistics.median(run[key] for run in runs), 2)
+        for key in ("port_open_ms", "ready_ms", "first_predict_ms")
+    }
+    phase_keys = sorted({key for run in runs for key in run["service_timings_ms"]})
+    summary["service_timings_ms"] = {
+        key: round(statistics.median(run["service_timings_ms"].get(key, 0.0) for run in runs), 2)
+        for key in phase_keys
+    }
+
+    report = {
+        "benchmark": "cold_start",
+        "mode": args.mode,
+        "workers": args.workers,
+        "runs": len(runs),
+        "python": sys.version.split()[0],
+        "median": summary,
+        "samples": runs,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+gRPC vs REST throughput for the PCOS prediction service
+
+Starts one uvicorn server with GRPC_PORT set, so both protocols hit the
+same process, models and micro-batcher, then runs the same assessments
+through:
+
+- rest-predict / grpc-predict:   one assessment per call at each concurrency
+- rest-batch / grpc-batch:       --batch-size assessments per call
+- grpc-stream:                   one PredictStream call per concurrency slot,
+                                 each sending its share of the assessments
+
+For each it reports calls and rows per second, p50/p99 latency and server
+CPU time per row. Results are printed as JSON.
+
+Usage (from ml-service/):
+    python benchmarks/grpc_vs_rest.py
+    python benchmarks/grpc_vs_rest.py --concurrency 1 16 --requests 2000 --output grpc.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from cold_start import free_port, port_open
+from load_test import DEFAULT_DATA, SERVICE_DIR, httpx, load_payloads, process_cpu_seconds
+
+sys.path.insert(0, SERVICE_DIR)
+
+import grpc  # noqa: E402
+
+from grpc_server import FIELD_NAMES, prediction_pb2, prediction_pb2_grpc  # noqa: E402
+
+# AssessmentInput field -> Assessment proto field
+PROTO_FIELDS = {rest: proto for proto, rest in FIELD_NAMES.items()}
+
+SCENARIOS = ["rest-predict", "grpc-predict", "rest-batch", "grpc-batch", "grpc-stream"]
+
+
+def to_proto(payload: dict):
+    return prediction_pb2.Assessment(**{PROTO_FIELDS[key]: value for key, value in payload.items()})
+
+
+def summarize(name: str, concurrency: int, latencies: list, calls: int, rows: int, errors: int,
+              elapsed: float, cpu_seconds: float) -> dict:
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "calls": calls,
+        "rows": rows,
+        "errors": errors,
+        "duration_s": round(elapsed, 4),
+        "calls_per_second": round(calls / elapsed, 2),
+        "rows_per_second": round(rows / elapsed, 2),
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies_ms, 50)), 3),
+            "p99": round(float(np.percentile(latencies_ms, 99)), 3),
+        },
+        "server_cpu_us_per_row": round(cpu_seconds * 1e6 / rows, 1) if rows else None,
+    }
+
+
+async def run_calls(concurrency: int, count: int, call) -> tuple:
+    """Run `count` calls of `call()` from `concurrency` workers; (latencies, errors)"""
+    latencies = []
+    errors = [0]
+    remaining = [count]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                if not await call():
+                    errors[0] += 1
+            except (httpx.TransportError, grpc.aio.AioRpcError):
+                errors[0] += 1
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors[0]
+
+
+async def run_scenario(name: str, args, payloads: list, http, stub, concurrency: int, pid: int) -> dict:
+    rng = random.Random(args.seed + concurrency)
+    batch_size = min(args.batch_size, len(payloads))
+    protos = [to_proto(payload) for payload in payloads]
+
+    async def rest_predict():
+        return (await http.post("/predict", json=rng.choice(payloads))).status_code == 200
+
+    async def grpc_predict():
+        response = await stub.Predict(prediction_pb2.PredictRequest(assessment=rng.choice(protos)))
+        return response.HasField("result")
+
+    async def rest_batch():
+        response = await http.post("/predict/batch", json={"assessments": rng.sample(payloads, batch_size)})
+        return response.status_code == 200
+
+    async def grpc_batch():
+        response = await stub.PredictBatch(prediction_pb2.PredictBatchRequest(
+            assessments=rng.sample(protos, batch_size)))
+        return response.failed == 0
+
+    if name == "grpc-stream":
+        # Each slot streams its share of the rows over one call; latency is per message
+        per_stream = max(1, args.requests // concurrency)
+        latencies = []
+        errors = [0]
+
+        async def stream():
+            sent = {}
+
+            async def requests():
+                for i in range(per_stream):
+                    sent[str(i)] = time.perf_counter()
+                    yield prediction_pb2.PredictRequest(id=str(i), assessment=rng.choice(protos))
+
+            async for response in stub.PredictStream(requests()):
+                latencies.append(time.perf_counter() - sent[response.id])
+                if not response.HasField("result"):
+                    errors[0] += 1
+
+        cpu_started = process_cpu_seconds(pid)
+        started = time.perf_counter()
+        await asyncio.gather(*[stream() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        cpu = process_cpu_seconds(pid) - cpu_started
+        return summarize(name, concurrency, latencies, concurrency, per_stream * concurrency, errors[0],
+                         elapsed, cpu)
+
+    call = {"rest-predict": rest_predict, "grpc-predict": grpc_predict,
+            "rest-batch": rest_batch, "grpc-batch": grpc_batch}[name]
+    batched = name.endswith("batch")
+    calls = max(1, args.requests // batch_size) if batched else args.requests
+    await run_calls(concurrency, min(args.warmup, calls), call)
+    cpu_started = process_cpu_seconds(pid)
+    started = time.perf_counter()
+    latencies, errors = await run_calls(concurrency, calls, call)
+    elapsed = time.perf_counter() - started
+    cpu = process_cpu_seconds(pid) - cpu_started
+    return summarize(name, concurrency, latencies, calls, calls * (batch_size if batched else 1), errors,
+                     elapsed, cpu)
+
+
+async def run(args) -> dict:
+    payloads = load_payloads(args.data)
+    http_port, grpc_port = free_port(), free_port()
+    env = dict(os.environ, GRPC_PORT=str(grpc_port))
+    if not args.cache:
+        env["PREDICTION_CACHE_SIZE"] = "0"
+    env.setdefault("MODEL_DIR", os.path.join(SERVICE_DIR, "..", "ml_f", "models"))
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                                "--port", str(http_port), "--log-level", "warning"],
+                               cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = []
+    try:
+        deadline = time.perf_counter() + 120
+        while not (port_open(http_port) and port_open(grpc_port)):
+            if time.perf_counter() > deadline or process.poll() is not None:
+                raise RuntimeError("Server did not open its ports")
+            await asyncio.sleep(0.05)
+
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{http_port}", limits=limits, timeout=60) as http, \
+                grpc.aio.insecure_channel(f"127.0.0.1:{grpc_port}") as channel:
+            while (await http.get("/ready")).status_code != 200:
+                await asyncio.sleep(0.05)
+            stub = prediction_pb2_grpc.PredictionStub(channel)
+            for concurrency in args.concurrency:
+                for name in args.scenarios:
+                    result = await run_scenario(name, args, payloads, http, stub, concurrency, process.pid)
+                    print(f"{name} c={concurrency}: {result['calls_per_second']:.0f} calls/s, "
+                          f"{result['rows_per_second']:.0f} rows/s, p50 {result['latency_ms']['p50']:.2f} ms, "
+                          f"p99 {result['latency_ms']['p99']:.2f} ms", file=sys.stderr)
+                    results.append(result)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    return {
+        "benchmark": "grpc_vs_rest",
+        "batch_size": args.batch_size,
+        "prediction_cache": args.cache,
+        "python": sys.version.split()[0],
+        "grpc": grpc.__version__,
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare gRPC and REST throughput on one server")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--requests", type=int, default=1000, help="Rows per scenario and concurrency level")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--cache", action="store_true", help="Keep the prediction cache on (off by default)")
+    parser.add_argument("--data", default=DEFAULT_DATA)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
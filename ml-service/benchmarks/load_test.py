@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Load-test and throughput benchmark for the PCOS prediction service
+
+Drives the service with realistic assessments built from
+ml_f/data/PCOS_data.csv, either in-process through ASGI (no network, no
+uvicorn) or over a local socket against a freshly started server, and sweeps
+concurrency levels. For each level it reports p50/p95/p99 latency, requests
+per second and server CPU time per request.
+
+Results are printed as JSON. With --baseline, the run is compared to an
+earlier report and the exit code is 1 if any level regressed by more than
+--tolerance.
+
+Usage (from ml-service/):
+    python benchmarks/load_test.py --mode asgi --concurrency 1 8 32
+    python benchmarks/load_test.py --mode socket --server serve --workers 2
+    python benchmarks/load_test.py --endpoint batch --batch-size 100
+    python benchmarks/load_test.py --endpoint compact --compact-format msgpack
+    python benchmarks/load_test.py --output after.json --baseline before.json
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+try:
+    import httpx
+except ImportError:
+    sys.exit("The load test needs httpx: pip install httpx")
+
+from cold_start import free_port, port_open
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATA = os.path.join(SERVICE_DIR, "..", "ml_f", "data", "PCOS_data.csv")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def load_payloads(path: str) -> list:
+    """Build AssessmentInput payloads from the PCOS dataset"""
+
+    def number(row, column):
+        try:
+            return float(row[column].strip())
+        except (KeyError, ValueError, AttributeError):
+            return None
+
+    def flag(row, column):
+        value = number(row, column)
+        return None if value is None else value == 1
+
+    payloads = []
+    with open(path, newline="") as f:
+        for raw in csv.DictReader(f):
+            # Column names in the CSV carry stray whitespace
+            row = {key.strip(): value for key, value in raw.items() if key}
+            age, weight, height = number(row, "Age (yrs)"), number(row, "Weight (Kg)"), number(row, "Height(Cm)")
+            if not age or not weight or not height:
+                continue
+            payload = {
+                "age": age,
+                "weight": weight,
+                "height": height,
+                # Dataset codes cycles as 2=regular, 4=irregular
+                "cycleRegularity": "irregular" if number(row, "Cycle(R/I)") == 4 else "regular",
+                "exerciseFrequency": "3-4_week" if flag(row, "Reg.Exercise(Y/N)") else "none",
+                "diet": "unhealthy" if flag(row, "Fast food (Y/N)") else "balanced",
+                "cycleLength": number(row, "Cycle length(days)"),
+                "bmi": number(row, "BMI"),
+                "pregnant": flag(row, "Pregnant(Y/N)"),
+                "abortions": number(row, "No. of abortions"),
+                "fsh": number(row, "FSH(mIU/mL)"),
+                "lh": number(row, "LH(mIU/mL)"),
+                "tsh": number(row, "TSH (mIU/L)"),
+                "amh": number(row, "AMH(ng/mL)"),
+                "prl": number(row, "PRL(ng/mL)"),
+                "vitD3": number(row, "Vit D3 (ng/mL)"),
+                "rbs": number(row, "RBS(mg/dl)"),
+                "weightGain": flag(row, "Weight gain(Y/N)"),
+                "hairGrowth": flag(row, "hair growth(Y/N)"),
+                "skinDarkening": flag(row, "Skin darkening (Y/N)"),
+                "hairLoss": flag(row, "Hair loss(Y/N)"),
+                "pimples": flag(row, "Pimples(Y/N)"),
+                "fastFood": flag(row, "Fast food (Y/N)"),
+                "regularExercise": flag(row, "Reg.Exercise(Y/N)"),
+                "bpSystolic": number(row, "BP _Systolic (mmHg)"),
+                "bpDiastolic": number(row, "BP _Diastolic (mmHg)"),
+            }
+            payloads.append({key: value for key, value in payload.items() if value is not None})
+    if not payloads:
+        raise ValueError(f"No usable rows in {path}")
+    return payloads
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """User + system CPU of a process and its live children (Linux /proc)"""
+    total = 0.0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/stat") as f:
+                # Fields after the parenthesised command name; utime/stime are 14th/15th overall
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+class Target:
+    """Where requests go, and how to read the server's CPU time"""
+
+    def __init__(self, args):
+        self.args = args
+        self.process = None
+        self.app = None
+        self.lifespan = None
+        self.base_url = "http://benchmark"
+
+    async def __aenter__(self):
+        env_overrides = {} if self.args.cache else {"PREDICTION_CACHE_SIZE": "0"}
+        if self.args.mode == "asgi":
+            os.environ.update(env_overrides)
+            os.environ.setdefault("MODEL_DIR", os.path.join(SERVICE_DIR, "..", "ml_f", "models"))
+            sys.path.insert(0, SERVICE_DIR)
+            import main
+            self.app = main.app
+            self.lifespan = main.app.router.lifespan_context(main.app)
+            await self.lifespan.__aenter__()
+        elif self.args.url:
+            self.base_url = self.args.url.rstrip("/")
+        else:
+            port = free_port()
+            env = dict(os.environ, **env_overrides)
+            env.setdefault("MODEL_DIR", os.path.join(SERVICE_DIR, "..", "ml_f", "models"))
+            if self.args.server == "serve":
+                command = [sys.executable, "serve.py", "--port", str(port), "--host", "127.0.0.1",
+                           "--workers", str(self.args.workers), "--log-level", "warning"]
+            else:
+                command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                           "--port", str(port), "--log-level", "warning"]
+            self.process = subprocess.Popen(command, cwd=SERVICE_DIR, env=env,
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            deadline = time.perf_counter() + 120
+            while not port_open(port):
+                if time.perf_counter() > deadline or self.process.poll() is not None:
+                    raise RuntimeError("Server did not open its port")
+                await asyncio.sleep(0.05)
+            self.base_url = f"http://127.0.0.1:{port}"
+        await self.wait_ready()
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.lifespan is not None:
+            await self.lifespan.__aexit__(*exc)
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def client(self, concurrency: int) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        if self.app is not None:
+            transport = httpx.ASGITransport(app=self.app)
+            return httpx.AsyncClient(transport=transport, base_url=self.base_url, timeout=60)
+        return httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=60)
+
+    async def wait_ready(self):
+        async with self.client(1) as client:
+            deadline = time.perf_counter() + 120
+            while True:
+                try:
+                    if (await client.get("/ready")).status_code == 200:
+                        return
+                except httpx.TransportError:
+                    pass
+                if time.perf_counter() > deadline:
+                    raise RuntimeError("Service did not become ready")
+                await asyncio.sleep(0.05)
+
+    def cpu_seconds(self):
+        """Server CPU time so far; None when the server is not ours to measure"""
+        if self.app is not None:
+            # In-process: includes the client's own CPU
+            return time.process_time()
+        if self.process is not None:
+            return process_cpu_seconds(self.process.pid)
+        return None
+
+
+async def compact_vectors(target: Target, payloads: list) -> list:
+    """Encode payloads into the positional vectors /predict/compact expects
+    
+    Uses the feature spec of the service's default model, read from the same
+    model directory the server loads.
+    """
+    sys.path.insert(0, SERVICE_DIR)
+    from feature_encoder import LEGACY_SPEC
+    from registry import load_feature_spec
+    
+    async with target.client(1) as client:
+        models = (await client.get("/models")).json()
+    model_dir = os.environ.get("MODEL_DIR", os.path.join(SERVICE_DIR, "..", "ml_f", "models"))
+    spec = load_feature_spec(model_dir, models["default"]) or LEGACY_SPEC
+    matrix = spec.compile().encode_batch(payloads)
+    # None marks missing values on the wire
+    return [[None if np.isnan(value) else float(value) for value in row] for row in matrix]
+
+
+def make_request(args, payloads, rng):
+    """(path, httpx request keyword arguments) for one request"""
+    rows = min(args.batch_size, len(payloads))
+    if args.endpoint == "batch":
+        return "/predict/batch", {"json": {"assessments": rng.sample(payloads, rows)}}
+    if args.endpoint.startswith("compact"):
+        body = rng.sample(payloads, rows) if args.endpoint == "compact-batch" else rng.choice(payloads)
+        if args.compact_format == "msgpack":
+            import msgpack
+            media_type = "application/msgpack"
+            return "/predict/compact", {"content": msgpack.packb(body),
+                                        "headers": {"content-type": media_type, "accept": media_type}}
+        return "/predict/compact", {"json": body}
+    return "/predict", {"json": rng.choice(payloads)}
+
+
+async def run_level(target: Target, args, payloads, concurrency: int) -> dict:
+    rng = random.Random(args.seed + concurrency)
+    latencies = []
+    statuses = {}
+
+    async with target.client(concurrency) as client:
+        # Warm up connections and code paths, untimed
+        for _ in range(min(args.warmup, args.requests)):
+            path, request = make_request(args, payloads, rng)
+            await client.post(path, **request)
+
+        remaining = [args.requests]
+
+        async def worker():
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                path, request = make_request(args, payloads, rng)
+                started = time.perf_counter()
+                try:
+                    response = await client.post(path, **request)
+                    status = response.status_code
+                except httpx.TransportError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        cpu_started = target.cpu_seconds()
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        cpu_finished = target.cpu_seconds()
+
+    latencies_ms = np.array(latencies) * 1000
+    completed = len(latencies)
+    batched = args.endpoint in ("batch", "compact-batch")
+    rows_per_request = min(args.batch_size, len(payloads)) if batched else 1
+    result = {
+        "concurrency": concurrency,
+        "requests": completed,
+        "errors": completed - statuses.get("200", 0),
+        "status_counts": statuses,
+        "duration_s": round(elapsed, 4),
+        "requests_per_second": round(completed / elapsed, 2),
+        "rows_per_second": round(completed * rows_per_request / elapsed, 2),
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies_ms, 50)), 3),
+            "p95": round(float(np.percentile(latencies_ms, 95)), 3),
+            "p99": round(float(np.percentile(latencies_ms, 99)), 3),
+            "mean": round(float(latencies_ms.mean()), 3),
+            "max": round(float(latencies_ms.max()), 3),
+        },
+        "cpu_ms_per_request": None,
+    }
+    if cpu_started is not None and cpu_finished is not None:
+        result["cpu_ms_per_request"] = round((cpu_finished - cpu_started) * 1000 / completed, 3)
+    return result
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions vs a baseline report: p95 latency up or throughput down by more than tolerance"""
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    regressions = []
+    for level in report["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None:
+            continue
+        p95_before, p95_after = before["latency_ms"]["p95"], level["latency_ms"]["p95"]
+        if p95_after > p95_before * (1 + tolerance):
+            regressions.append(f"c={level['concurrency']}: p95 {p95_before:.2f} -> {p95_after:.2f} ms")
+        rps_before, rps_after = before["requests_per_second"], level["requests_per_second"]
+        if rps_after < rps_before * (1 - tolerance):
+            regressions.append(f"c={level['concurrency']}: {rps_before:.0f} -> {rps_after:.0f} req/s")
+    return regressions
+
+
+async def run(args) -> dict:
+    payloads = load_payloads(args.data)
+    levels = []
+    async with Target(args) as target:
+        if args.endpoint.startswith("compact"):
+            payloads = await compact_vectors(target, payloads)
+        for concurrency in args.concurrency:
+            level = await run_level(target, args, payloads, concurrency)
+            print(f"c={concurrency}: {level['requests_per_second']:.0f} req/s, "
+                  f"p50 {level['latency_ms']['p50']:.2f} ms, p99 {level['latency_ms']['p99']:.2f} ms, "
+                  f"{level['errors']} errors", file=sys.stderr)
+            levels.append(level)
+
+    return {
+        "benchmark": "load_test",
+        "mode": args.mode,
+        "server": None if args.mode == "asgi" else (args.url or args.server),
+        "workers": args.workers if args.mode == "socket" and args.server == "serve" and not args.url else 1,
+        "endpoint": args.endpoint,
+        "batch_size": args.batch_size if args.endpoint in ("batch", "compact-batch") else 1,
+        "compact_format": args.compact_format if args.endpoint.startswith("compact") else None,
+        "prediction_cache": args.cache,
+        "payload_rows": len(payloads),
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "levels": levels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ML service latency and throughput")
+    parser.add_argument("--mode", choices=["asgi", "socket"], default="asgi",
+                        help="asgi: in-process, no network; socket: HTTP over localhost")
+    parser.add_argument("--server", choices=["uvicorn", "serve"], default="uvicorn",
+                        help="Server started in socket mode")
+    parser.add_argument("--workers", type=int, default=2, help="Workers for --server serve")
+    parser.add_argument("--url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--endpoint", choices=["predict", "batch", "compact", "compact-batch"], default="predict",
+                        help="compact/compact-batch: positional vectors to /predict/compact")
+    parser.add_argument("--compact-format", choices=["json", "msgpack"], default="json")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=500, help="Timed requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--cache", action="store_true",
+                        help="Keep the prediction cache on (off by default so every request is scored)")
+    parser.add_argument("--data", default=DEFAULT_DATA)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    if regressions:
+        print("Regressions vs baseline:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
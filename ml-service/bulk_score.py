@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Offline bulk scoring for the PCOS prediction service
+
+Scores datasets in the ml_f/data/PCOS_data.csv layout without HTTP. The
+model bundle is loaded exactly as the service loads it (registry.py, with
+the same feature spec and inference backend), then the input is read in
+chunks and the chunks are spread across a process pool. Each chunk's
+predictions and top contributors are written to its own part file in the
+output directory:
+
+    <output>/part-00000.csv   (or .parquet)
+    <output>/part-00001.csv
+    <output>/_manifest.json   input, model version and chunk size of the run
+    <output>/_summary.json    rows, seconds and rows/sec, written on success
+
+Part files are written atomically, so --resume skips every chunk that was
+completed by an earlier, interrupted run with the same input, model and
+chunk size.
+
+Usage (from ml-service/):
+    python bulk_score.py ../ml_f/data/PCOS_data.csv --output scores/
+    python bulk_score.py big.parquet --output scores/ --format parquet --workers 8
+    python bulk_score.py big.csv --output scores/ --resume
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from registry import ModelBundle, ModelRegistry
+
+logger = logging.getLogger("bulk_score")
+
+# Map model class indices to labels (as in main.py)
+LABEL_MAP = {0: "No Risk", 1: "Early", 2: "High"}
+PROBABILITY_COLUMNS = ["prob_NoRisk", "prob_Early", "prob_High"]
+TOP_K = 3
+
+# Set in each worker process (inherited on fork, loaded by init_worker otherwise)
+_bundle: Optional[ModelBundle] = None
+_explain = True
+
+
+def load_bundle(model_dir: str, model_name: Optional[str], backend: str, explain: bool) -> ModelBundle:
+    """Load one bundle the way the service does (same registry, spec and backend)"""
+    registry = ModelRegistry(model_dir, default_name=model_name, inference_backend=backend,
+                             enable_shap=explain)
+    if not registry.load():
+        raise RuntimeError(f"Could not load models from {model_dir}")
+    bundle = registry.get(model_name)
+    if bundle is None:
+        raise RuntimeError(f"Model '{model_name}' not found in {model_dir}")
+    return bundle
+
+
+def init_worker(model_dir: str, model_name: Optional[str], backend: str, explain: bool):
+    global _bundle, _explain
+    _explain = explain
+    if _bundle is None:
+        _bundle = load_bundle(model_dir, model_name, backend, explain)
+
+
+def dataset_to_fields(frame: pd.DataFrame) -> dict:
+    """Columns in the PCOS_data.csv layout -> API field columns for the feature encoder
+
+    Going through the API fields means every row is encoded exactly as the
+    same assessment sent to /predict would be.
+    """
+    frame = frame.rename(columns=lambda name: str(name).strip())
+
+    def numeric(column):
+        if column not in frame:
+            return [None] * len(frame)
+        values = pd.to_numeric(frame[column], errors="coerce")
+        return values.astype(object).where(values.notna(), None).tolist()
+
+    def flag(column):
+        return [None if value is None else value == 1 for value in numeric(column)]
+
+    # Dataset codes cycles as 2=regular, 4=irregular
+    cycle = numeric("Cycle(R/I)")
+    exercise = flag("Reg.Exercise(Y/N)")
+    fast_food = flag("Fast food (Y/N)")
+    return {
+        "age": numeric("Age (yrs)"),
+        "weight": numeric("Weight (Kg)"),
+        "height": numeric("Height(Cm)"),
+        "bmi": numeric("BMI"),
+        "cycleRegularity": [None if value is None else ("irregular" if value == 4 else "regular") for value in cycle],
+        "cycleLength": numeric("Cycle length(days)"),
+        "exerciseFrequency": ["3-4_week" if value else "none" for value in exercise],
+        "diet": ["unhealthy" if value else "balanced" for value in fast_food],
+        "skinDarkening": flag("Skin darkening (Y/N)"),
+        "fastFood": fast_food,
+        "regularExercise": exercise,
+        "pregnant": flag("Pregnant(Y/N)"),
+    }
+
+
+def top_contributors(importances: np.ndarray, names) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k feature names and normalized contributions for each row"""
+    totals = importances.sum(axis=1, keepdims=True)
+    normalized = np.divide(importances, totals, out=np.zeros_like(importances), where=totals > 0)
+    top = np.argsort(normalized, axis=1)[:, ::-1][:, :TOP_K]
+    names = np.asarray(names, dtype=object)
+    return names[top], np.take_along_axis(normalized, top, axis=1)
+
+
+def score_chunk(index: int, frame: pd.DataFrame, first_row: int, id_column: Optional[str],
+                output_path: str, fmt: str) -> int:
+    """Score one chunk and write its part file; returns the number of rows"""
+    bundle = _bundle
+    fields = dataset_to_fields(frame)
+    features = bundle.preprocess(bundle.encoder.encode_batch(fields))
+    predictions, probabilities = bundle.backend.predict(features)
+
+    if _explain and bundle.explainer is not None:
+        importances = bundle.explainer.contributions(features, predictions)
+    else:
+        importances = np.broadcast_to(bundle.global_importances, features.shape)
+    names = bundle.feature_names if isinstance(bundle.feature_names, list) else bundle.feature_spec.names
+    top_names, top_values = top_contributors(np.asarray(importances, dtype=np.float64), names)
+
+    out = pd.DataFrame({"row": np.arange(first_row, first_row + len(frame))})
+    if id_column is not None:
+        out[id_column] = frame[id_column].to_numpy()
+    out["label"] = [LABEL_MAP.get(int(p), "No Risk") for p in predictions]
+    for i, column in enumerate(PROBABILITY_COLUMNS):
+        out[column] = probabilities[:, i] if probabilities.shape[1] > i else 0.0
+    for k in range(TOP_K):
+        out[f"contributor_{k + 1}"] = top_names[:, k]
+        out[f"contribution_{k + 1}"] = top_values[:, k]
+    out["model"] = bundle.name
+    out["model_version"] = bundle.version
+
+    # os.replace publishes the part file only after it is fully written
+    tmp_path = output_path + ".tmp"
+    if fmt == "parquet":
+        out.to_parquet(tmp_path, index=False)
+    else:
+        out.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+    return len(out)
+
+
+def read_chunks(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("Reading Parquet needs pyarrow: pip install pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+
+
+def check_manifest(output_dir: str, manifest: dict, resume: bool):
+    """Refuse to mix part files from a different input, model or chunking"""
+    path = os.path.join(output_dir, "_manifest.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)
+        if not resume:
+            sys.exit(f"{output_dir} already has results; pass --resume to continue or pick a new --output")
+        mismatched = [key for key in manifest if previous.get(key) != manifest[key]]
+        if mismatched:
+            sys.exit(f"Cannot resume: {', '.join(mismatched)} differ from the earlier run in {output_dir}")
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a dataset offline with the service's model bundle")
+    parser.add_argument("input", help="CSV or Parquet file in the PCOS_data.csv layout")
+    parser.add_argument("--output", required=True, help="Output directory for part files")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--model-dir", default=os.getenv("MODEL_DIR", os.path.join("..", "ml_f", "models")))
+    parser.add_argument("--model", default=os.getenv("DEFAULT_MODEL"), help="Bundle name (default: service default)")
+    parser.add_argument("--backend", default=os.getenv("INFERENCE_BACKEND", "auto"))
+    parser.add_argument("--chunk-rows", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--no-explain", action="store_true",
+                        help="Use global importances instead of per-row SHAP contributors")
+    parser.add_argument("--id-column", default="Patient File No.",
+                        help="Input column copied to the output, if present")
+    parser.add_argument("--resume", action="store_true", help="Skip chunks completed by an earlier run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    explain = not args.no_explain
+    ext = "parquet" if args.format == "parquet" else "csv"
+    os.makedirs(args.output, exist_ok=True)
+
+    # Load once in the parent; forked workers share it copy-on-write
+    global _bundle, _explain
+    _bundle = load_bundle(args.model_dir, args.model, args.backend, explain)
+    _explain = explain
+    check_manifest(args.output, {
+        "input": os.path.abspath(args.input),
+        "input_size": os.path.getsize(args.input),
+        "model": _bundle.name,
+        "model_version": _bundle.version,
+        "chunk_rows": args.chunk_rows,
+        "format": args.format,
+        "explain": explain,
+    }, args.resume)
+    print(f"Scoring {args.input} with '{_bundle.name}' ({_bundle.version}, {_bundle.backend.name} backend) "
+          f"on {args.workers} worker(s)", file=sys.stderr)
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    started = time.perf_counter()
+    rows_done = rows_skipped = chunks_done = chunks_skipped = 0
+    max_pending = args.workers * 2
+    pending = {}
+
+    def collect(done):
+        nonlocal rows_done, chunks_done
+        for future in done:
+            chunk_index = pending.pop(future)
+            rows_done += future.result()
+            chunks_done += 1
+            elapsed = time.perf_counter() - started
+            print(f"chunk {chunk_index} done: {rows_done} rows, {rows_done / elapsed:.0f} rows/s",
+                  file=sys.stderr)
+
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=init_worker,
+                             initargs=(args.model_dir, args.model, args.backend, explain)) as pool:
+        first_row = 0
+        for chunk_index, frame in enumerate(read_chunks(args.input, args.chunk_rows)):
+            part = os.path.join(args.output, f"part-{chunk_index:05d}.{ext}")
+            if args.resume and os.path.exists(part):
+                rows_skipped += len(frame)
+                chunks_skipped += 1
+            else:
+                # Bound the chunks held in memory while workers are busy
+                while len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                id_column = args.id_column if args.id_column in frame.columns else None
+                future = pool.submit(score_chunk, chunk_index, frame, first_row, id_column, part, args.format)
+                pending[future] = chunk_index
+            first_row += len(frame)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "rows_scored": rows_done,
+        "chunks_scored": chunks_done,
+        "rows_skipped": rows_skipped,
+        "chunks_skipped": chunks_skipped,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows_done / elapsed, 1) if elapsed > 0 else None,
+        "workers": args.workers,
+    }
+    with open(os.path.join(args.output, "_summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Per-prediction feature contributions for the PCOS prediction service
+
+Wraps a SHAP TreeExplainer that is built once when the model loads and runs
+it on a dedicated worker thread under a time budget. Rows that cannot be
+explained within the budget are returned as NaN so the caller can fall back
+to the model's cached global importances; explanations never hold a request
+for longer than the budget.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows explained per SHAP call; the budget is checked between chunks
+CHUNK_ROWS = 64
+
+
+def compute_global_importances(model, n_features: int) -> np.ndarray:
+    """Normalized global importances from the model's own attributes
+
+    Tree models use feature_importances_, linear models use |coef_|. Models
+    with neither get uniform weights.
+    """
+    importances = None
+    if hasattr(model, "feature_importances_"):
+        importances = np.asarray(model.feature_importances_, dtype=np.float64)
+    elif hasattr(model, "coef_"):
+        coef = np.asarray(model.coef_, dtype=np.float64)
+        importances = np.abs(coef).mean(axis=0) if coef.ndim > 1 else np.abs(coef)
+
+    if importances is None or len(importances) != n_features or not np.isfinite(importances).all():
+        importances = np.ones(n_features, dtype=np.float64)
+
+    total = importances.sum()
+    return importances / total if total > 0 else np.full(n_features, 1.0 / n_features)
+
+
+def build_tree_explainer(model):
+    """Build a SHAP TreeExplainer for the model, or None if unavailable"""
+    try:
+        # shap pulls in numba; only pay for the import when explanations are enabled
+        import shap
+    except ImportError as e:
+        logger.warning(f"⚠️ shap not available, using global importances: {e}")
+        return None
+
+    try:
+        # Models restored from array artifacts describe their trees in shap's dict format
+        return shap.TreeExplainer(model.shap_model() if hasattr(model, "shap_model") else model)
+    except Exception as e:
+        logger.info(f"TreeExplainer not supported for {type(model).__name__}, using global importances: {e}")
+        return None
+
+
+class BudgetedExplainer:
+    """Runs SHAP on a single worker thread with a per-call time budget"""
+
+    def __init__(self, tree_explainer, budget_ms: float):
+        self.tree_explainer = tree_explainer
+        self.budget_ms = budget_ms
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shap")
+        self._busy = threading.Lock()
+        self.calls = 0
+        self.rows_explained = 0
+        self.rows_fallback = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def stats(self) -> dict:
+        return {
+            "budget_ms": self.budget_ms,
+            "calls": self.calls,
+            "rows_explained": self.rows_explained,
+            "rows_fallback": self.rows_fallback,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+        }
+
+    def _row_contributions(self, features: np.ndarray, predictions: np.ndarray) -> np.ndarray:
+        """|SHAP| for each row's predicted class, shape (n_rows, n_features)"""
+        values = self.tree_explainer.shap_values(features, check_additivity=False)
+        if isinstance(values, list):
+            # One array per class: pick the predicted class for each row
+            values = np.stack(values)[predictions, np.arange(len(features))]
+        elif values.ndim == 3:
+            values = values[np.arange(len(features)), :, predictions]
+        return np.abs(values)
+
+    def contributions(self, features: np.ndarray, predictions: np.ndarray) -> np.ndarray:
+        """Explain every row on the calling thread, without a budget
+
+        For offline scoring; does not start the worker thread (safe before fork).
+        """
+        return self._row_contributions(features, np.asarray(predictions, dtype=np.intp))
+
+    def warm_up(self, features: np.ndarray, predictions: np.ndarray) -> np.ndarray:
+        """Explain rows once at startup so the first request doesn't pay SHAP's one-time costs"""
+        return self.contributions(features, predictions)
+
+    def _run(self, features, predictions, out, progress, cancelled):
+        try:
+            for start in range(0, len(features), CHUNK_ROWS):
+                if cancelled.is_set():
+                    return
+                stop = start + CHUNK_ROWS
+                out[start:stop] = self._row_contributions(features[start:stop], predictions[start:stop])
+                progress[0] = min(stop, len(features))
+        finally:
+            self._busy.release()
+
+    def explain(self, features: np.ndarray, predictions: np.ndarray,
+                budget_ms: Optional[float] = None) -> np.ndarray:
+        """Per-row contributions; rows not explained within budget are NaN"""
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        n_rows = len(features)
+        out = np.full(features.shape, np.nan, dtype=np.float64)
+        self.calls += 1
+
+        # A previous call that overran its budget is still running: don't queue behind it
+        if budget_ms <= 0 or not self._busy.acquire(blocking=False):
+            self.rows_fallback += n_rows
+            return out
+
+        progress = [0]
+        cancelled = threading.Event()
+        start = time.perf_counter()
+        try:
+            future = self._executor.submit(self._run, features, np.asarray(predictions, dtype=np.intp),
+                                           out, progress, cancelled)
+        except RuntimeError:
+            self._busy.release()
+            self.rows_fallback += n_rows
+            return out
+
+        try:
+            future.result(timeout=budget_ms / 1000.0)
+        except FutureTimeoutError:
+            cancelled.set()
+            self.timeouts += 1
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            logger.warning(f"⚠️ SHAP exceeded {budget_ms:.0f} ms budget ({elapsed_ms:.0f} ms), "
+                           f"explained {progress[0]}/{n_rows} rows")
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"SHAP explanation failed: {e}")
+
+        # Only rows below the completed mark are guaranteed to be fully written
+        done = progress[0]
+        result = np.full(features.shape, np.nan, dtype=np.float64)
+        result[:done] = out[:done]
+        self.rows_explained += done
+        self.rows_fallback += n_rows - done
+        return result
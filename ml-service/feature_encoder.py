@@ -0,0 +1,339 @@
+"""
+Feature encoding shared by training (ml_f/src/model_comparison.py) and serving
+
+A FeatureSpec is the single description of the model's input: column order,
+how each API field maps to a training column (including categorical codes),
+and the imputation statistics and scaling learned at training time. Training
+writes it as JSON next to each model bundle (<name>_feature_spec.json) and
+serving loads it from there, so both sides encode features the same way.
+
+FeatureSpec.compile() returns a FeatureEncoder that turns one assessment or a
+batch (a list of records or a dict of columns) into a float64 matrix with
+plain numpy operations: NaN filling with the stored statistics and scaling
+are vectorized, with no sklearn transform calls per request.
+
+Spec format (version 1):
+
+    {
+      "version": 1,
+      "features": [
+        {"name": "Age (yrs)", "field": "age", "type": "numeric"},
+        {"name": "BMI", "field": "bmi", "type": "bmi"},
+        {"name": "Cycle(R/I)", "field": "cycleRegularity", "type": "categorical",
+         "mapping": {"regular": 2, "irregular": 4}, "default": null},
+        {"name": "Pregnant(Y/N)", "field": "pregnant", "type": "boolean", "default": 0},
+        ...
+      ],
+      "imputation": {"strategy": "median", "statistics": [...]},   # or null
+      "scaling": {"mean": [...], "scale": [...]}                   # or null
+    }
+
+Field types:
+- numeric:     the field's value; missing (None) -> "default"
+- boolean:     1 if truthy else 0; missing -> "default"
+- categorical: "mapping"[value]; missing or unmapped -> "default"
+- bmi:         the field if truthy, else weight / (height / 100) ** 2
+
+A "default" of null encodes as NaN, which imputation then fills.
+"""
+
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+SPEC_VERSION = 1
+SPEC_SUFFIX = "_feature_spec.json"
+FEATURE_TYPES = ("numeric", "boolean", "categorical", "bmi")
+
+
+class FeatureSpecError(ValueError):
+    """A feature spec is malformed or does not match the model"""
+
+
+def spec_path_for(model_dir: str, name: str) -> str:
+    """Where the spec for the bundle called `name` lives: <model_dir>/<name>_feature_spec.json"""
+    return os.path.join(model_dir, name + SPEC_SUFFIX)
+
+
+class FeatureSpec:
+    """Column order, field mappings and fitted statistics for the model's input"""
+
+    def __init__(self, features: List[Dict[str, Any]], imputation: Optional[Dict[str, Any]] = None,
+                 scaling: Optional[Dict[str, Any]] = None):
+        self.features = [dict(feature) for feature in features]
+        self.imputation = imputation
+        self.scaling = scaling
+        self.validate()
+
+    @property
+    def names(self) -> List[str]:
+        """Training column names, in model input order"""
+        return [feature["name"] for feature in self.features]
+
+    @property
+    def n_features(self) -> int:
+        return len(self.features)
+
+    def validate(self):
+        if not self.features:
+            raise FeatureSpecError("Feature spec has no features")
+        for feature in self.features:
+            if "name" not in feature or "field" not in feature:
+                raise FeatureSpecError(f"Feature needs 'name' and 'field': {feature}")
+            if feature.get("type", "numeric") not in FEATURE_TYPES:
+                raise FeatureSpecError(f"Unknown type for feature {feature['name']}: {feature.get('type')}")
+            if feature.get("type") == "categorical" and not isinstance(feature.get("mapping"), dict):
+                raise FeatureSpecError(f"Categorical feature {feature['name']} needs a 'mapping'")
+        for section, keys in (("imputation", ("statistics",)), ("scaling", ("mean", "scale"))):
+            block = getattr(self, section)
+            if block is None:
+                continue
+            for key in keys:
+                values = block.get(key)
+                if values is None or len(values) != self.n_features:
+                    raise FeatureSpecError(
+                        f"{section}.{key} must have {self.n_features} values, got "
+                        f"{None if values is None else len(values)}"
+                    )
+
+    def with_statistics(self, statistics: Optional[Sequence[float]] = None, strategy: str = "median",
+                        mean: Optional[Sequence[float]] = None,
+                        scale: Optional[Sequence[float]] = None) -> "FeatureSpec":
+        """Copy of this spec carrying fitted imputation statistics and/or scaling"""
+        imputation = self.imputation
+        if statistics is not None:
+            imputation = {"strategy": strategy, "statistics": [float(v) for v in statistics]}
+        scaling = self.scaling
+        if mean is not None and scale is not None:
+            scaling = {"mean": [float(v) for v in mean], "scale": [float(v) for v in scale]}
+        return FeatureSpec(self.features, imputation, scaling)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": SPEC_VERSION,
+            "features": self.features,
+            "imputation": self.imputation,
+            "scaling": self.scaling,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "FeatureSpec":
+        version = data.get("version")
+        if version != SPEC_VERSION:
+            raise FeatureSpecError(f"Unsupported feature spec version {version} (expected {SPEC_VERSION})")
+        return cls(data["features"], data.get("imputation"), data.get("scaling"))
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureSpec":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def compile(self) -> "FeatureEncoder":
+        return FeatureEncoder(self)
+
+
+def _compile_step(field: str, kind: str, mapping: Dict[str, float], default: float):
+    """Single-row encoder for one column: get(field) -> float"""
+    if kind == "numeric":
+        def step(get):
+            value = get(field)
+            return default if value is None else float(value)
+    elif kind == "boolean":
+        def step(get):
+            value = get(field)
+            return default if value is None else (1.0 if value else 0.0)
+    elif kind == "categorical":
+        lookup = mapping.get
+
+        def step(get):
+            value = get(field)
+            return default if value is None else lookup(str(value), default)
+    else:  # bmi
+        def step(get):
+            value = get(field)
+            if value:
+                return float(value)
+            weight, height = get("weight"), get("height")
+            if weight is None or not height:
+                return default
+            return float(weight) / ((float(height) / 100) ** 2)
+    return step
+
+
+class FeatureEncoder:
+    """Encodes assessments into model input rows according to a FeatureSpec
+
+    Per-column work is resolved once here; encoding a row is one small
+    closure call per column, and a batch is encoded column by column with
+    numpy.
+    """
+
+    def __init__(self, spec: FeatureSpec):
+        self.spec = spec
+        self.n_features = spec.n_features
+        # (column index, field, type, mapping, default as float) resolved once
+        self._columns = []
+        for index, feature in enumerate(spec.features):
+            default = feature.get("default")
+            self._columns.append((
+                index,
+                feature["field"],
+                feature.get("type", "numeric"),
+                {str(key): float(value) for key, value in (feature.get("mapping") or {}).items()},
+                np.nan if default is None else float(default),
+            ))
+        self._steps = [_compile_step(field, kind, mapping, default)
+                       for _, field, kind, mapping, default in self._columns]
+        self._fields = tuple(dict.fromkeys(
+            [field for _, field, _, _, _ in self._columns]
+            + [f for _, _, kind, _, _ in self._columns if kind == "bmi" for f in ("weight", "height")]
+        ))
+        self._statistics = None
+        if spec.imputation is not None:
+            self._statistics = np.asarray(spec.imputation["statistics"], dtype=np.float64)
+        self._mean = self._scale = None
+        if spec.scaling is not None:
+            self._mean = np.asarray(spec.scaling["mean"], dtype=np.float64)
+            scale = np.asarray(spec.scaling["scale"], dtype=np.float64)
+            # StandardScaler leaves zero-variance columns unscaled
+            self._scale = np.where(scale == 0, 1.0, scale)
+
+    @property
+    def imputes(self) -> bool:
+        """Whether encoded rows come out with missing values already filled"""
+        return self._statistics is not None
+
+    @property
+    def scales(self) -> bool:
+        return self._mean is not None
+
+    @staticmethod
+    def _getter(record) -> Callable[[str], Any]:
+        if isinstance(record, dict):
+            return record.get
+        return lambda field: getattr(record, field, None)
+
+    def encode_row(self, record, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Encode one assessment (pydantic model or dict) into a 1D row
+
+        Pass `out` (length n_features) to reuse a preallocated buffer.
+        """
+        get = self._getter(record)
+        values = [step(get) for step in self._steps]
+        if out is None:
+            row = np.array(values, dtype=np.float64)
+        else:
+            row = out
+            row[:] = values
+        if self._statistics is not None or self._mean is not None:
+            self.finish(row.reshape(1, -1))
+        return row
+
+    @staticmethod
+    def _column(column, kind, mapping, default, columns: Mapping[str, Any]) -> np.ndarray:
+        """Vectorized encoding of one column of raw field values (None is missing)"""
+        if kind == "categorical":
+            lookup = mapping.get
+            return np.array([default if v is None else lookup(str(v), default) for v in column],
+                            dtype=np.float64)
+        # numpy converts None to NaN for float arrays
+        values = np.array(column, dtype=np.float64)
+        missing = np.isnan(values)
+        if kind == "boolean":
+            values = (values != 0).astype(np.float64)
+        elif kind == "bmi":
+            # Falsy (missing or 0) BMI is derived from weight and height
+            missing |= values == 0
+            if missing.any():
+                weight = np.array(columns.get("weight", [None] * len(values)), dtype=np.float64)
+                height = np.array(columns.get("height", [None] * len(values)), dtype=np.float64)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    derived = weight / ((height / 100) ** 2)
+                derived[~np.isfinite(derived) | (height == 0)] = default
+                values[missing] = derived[missing]
+            return values
+        values[missing] = default
+        return values
+
+    def encode_batch(self, records: Union[Iterable[Any], Mapping[str, Sequence[Any]]],
+                     out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Encode many assessments into an (n_rows, n_features) matrix
+
+        `records` is a list of assessments (pydantic models or dicts) or a
+        dict of columns keyed by field name. Pass `out` to reuse a
+        preallocated matrix.
+        """
+        if isinstance(records, Mapping):
+            columns = records
+            n_rows = len(next(iter(columns.values()))) if columns else 0
+        else:
+            records = records if isinstance(records, list) else list(records)
+            n_rows = len(records)
+            if records and isinstance(records[0], dict):
+                columns = {field: [record.get(field) for record in records] for field in self._fields}
+            else:
+                columns = {field: [getattr(record, field, None) for record in records] for field in self._fields}
+
+        matrix = np.empty((n_rows, self.n_features), dtype=np.float64) if out is None else out
+        for index, field, kind, mapping, default in self._columns:
+            column = columns.get(field)
+            if column is None:
+                matrix[:, index] = default
+            else:
+                matrix[:, index] = self._column(column, kind, mapping, default, columns)
+        self.finish(matrix)
+        return matrix
+
+    def finish(self, matrix: np.ndarray) -> np.ndarray:
+        """Impute and scale an encoded matrix in place, as configured by the spec"""
+        if self._statistics is not None:
+            missing = np.isnan(matrix)
+            if missing.any():
+                np.copyto(matrix, np.broadcast_to(self._statistics, matrix.shape), where=missing)
+        if self._mean is not None:
+            matrix -= self._mean
+            matrix /= self._scale
+        return matrix
+
+
+# Input encoding of the original basic model, used when a bundle ships no spec.
+# Mirrors the service's historical encode_input exactly, including its cycle
+# codes (1=regular, 2=irregular) and zero for a missing cycle length.
+LEGACY_SPEC = FeatureSpec([
+    {"name": "Age (yrs)", "field": "age", "type": "numeric"},
+    {"name": "Weight (Kg)", "field": "weight", "type": "numeric"},
+    {"name": "Height(Cm)", "field": "height", "type": "numeric"},
+    {"name": "BMI", "field": "bmi", "type": "bmi"},
+    {"name": "Cycle(R/I)", "field": "cycleRegularity", "type": "categorical",
+     "mapping": {"regular": 1}, "default": 2},
+    {"name": "Cycle length(days)", "field": "cycleLength", "type": "numeric", "default": 0},
+    {"name": "Skin darkening (Y/N)", "field": "skinDarkening", "type": "boolean", "default": 0},
+    {"name": "Fast food (Y/N)", "field": "fastFood", "type": "boolean", "default": 0},
+    {"name": "Reg.Exercise(Y/N)", "field": "exerciseFrequency", "type": "categorical",
+     "mapping": {"none": 0}, "default": 1},
+    {"name": "Pregnant(Y/N)", "field": "pregnant", "type": "boolean", "default": 0},
+])
+
+# Encoding matching the training data (ml_f/data/PCOS_cleaned_basic.csv),
+# which codes cycles as 2=regular, 4=irregular. Training writes this spec,
+# with fitted statistics, next to every bundle it saves.
+TRAINING_SPEC = FeatureSpec([
+    {"name": "Age (yrs)", "field": "age", "type": "numeric"},
+    {"name": "Weight (Kg)", "field": "weight", "type": "numeric"},
+    {"name": "Height(Cm)", "field": "height", "type": "numeric"},
+    {"name": "BMI", "field": "bmi", "type": "bmi"},
+    {"name": "Cycle(R/I)", "field": "cycleRegularity", "type": "categorical",
+     "mapping": {"regular": 2, "irregular": 4}, "default": None},
+    {"name": "Cycle length(days)", "field": "cycleLength", "type": "numeric", "default": None},
+    {"name": "Skin darkening (Y/N)", "field": "skinDarkening", "type": "boolean", "default": 0},
+    {"name": "Fast food (Y/N)", "field": "fastFood", "type": "boolean", "default": 0},
+    {"name": "Reg.Exercise(Y/N)", "field": "exerciseFrequency", "type": "categorical",
+     "mapping": {"none": 0}, "default": 1},
+    {"name": "Pregnant(Y/N)", "field": "pregnant", "type": "boolean", "default": 0},
+])
@@ -0,0 +1,268 @@
+"""
+gRPC interface for the PCOS prediction service
+
+Serves the Prediction service from protos/prediction.proto over HTTP/2, so
+internal consumers keep one multiplexed connection open instead of paying
+JSON and HTTP/1.1 per call:
+
+- Predict:        one assessment, micro-batched with concurrent calls (and
+                  with REST /predict traffic) exactly like POST /predict
+- PredictBatch:   many assessments in one model call like /predict/batch
+- PredictStream:  bidirectional; requests are scored as they arrive (up to
+                  STREAM_WINDOW at a time) and answered in request order
+
+Requests go through the same model registry, validation, feature encoding,
+prediction cache and admission control as the REST API. gRPC deadlines are
+honoured like the X-Deadline-Ms header.
+
+Run it inside the REST process by setting GRPC_PORT (every serve.py worker
+binds the port with SO_REUSEPORT), or as a sibling process:
+    python grpc_server.py --port 50051
+
+Python modules are generated from the .proto on first import if they are
+missing (needs grpcio-tools); the Docker image generates them at build time.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from typing import Any, Dict
+
+import grpc
+
+import admission
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROTO_DIR = os.path.join(SERVICE_DIR, "protos")
+
+# Stream requests scored concurrently per PredictStream call
+STREAM_WINDOW = int(os.getenv("GRPC_STREAM_WINDOW", "64"))
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+GRPC_REQUESTS = metrics.registry.counter(
+    "pcos_grpc_requests_total", "gRPC calls by method and status code", ("method", "code"))
+
+
+def _load_stubs():
+    try:
+        import prediction_pb2
+        import prediction_pb2_grpc
+    except ImportError:
+        from grpc_tools import protoc
+        logger.info("Generating gRPC modules from protos/prediction.proto")
+        status = protoc.main(["protoc", f"-I{PROTO_DIR}", f"--python_out={SERVICE_DIR}",
+                              f"--grpc_python_out={SERVICE_DIR}", os.path.join(PROTO_DIR, "prediction.proto")])
+        if status != 0:
+            raise ImportError("Could not generate gRPC modules from protos/prediction.proto")
+        import prediction_pb2
+        import prediction_pb2_grpc
+    return prediction_pb2, prediction_pb2_grpc
+
+
+prediction_pb2, prediction_pb2_grpc = _load_stubs()
+
+
+def _camel(name: str) -> str:
+    head, *rest = name.split("_")
+    return head + "".join(part[:1].upper() + part[1:] for part in rest)
+
+
+# Assessment proto field -> AssessmentInput field (cycle_length -> cycleLength, vit_d3 -> vitD3)
+FIELD_NAMES = {field.name: _camel(field.name) for field in prediction_pb2.Assessment.DESCRIPTOR.fields}
+
+# HTTP status raised by the shared pipeline -> gRPC status
+STATUS_CODES = {
+    400: grpc.StatusCode.INVALID_ARGUMENT,
+    404: grpc.StatusCode.NOT_FOUND,
+    413: grpc.StatusCode.RESOURCE_EXHAUSTED,
+    422: grpc.StatusCode.INVALID_ARGUMENT,
+    503: grpc.StatusCode.UNAVAILABLE,
+    504: grpc.StatusCode.DEADLINE_EXCEEDED,
+}
+
+
+def assessment_to_dict(message) -> Dict[str, Any]:
+    """Set fields only, under their REST names, ready for AssessmentInput validation"""
+    return {FIELD_NAMES[field.name]: value for field, value in message.ListFields()}
+
+
+def result_to_proto(result):
+    return prediction_pb2.Result(
+        label=result.label,
+        probabilities=result.probabilities,
+        top_contributors=[
+            prediction_pb2.Contributor(feature=c.feature, contribution=c.contribution, explanation=c.explanation)
+            for c in result.topContributors
+        ],
+    )
+
+
+def error_status(error: Exception):
+    """(gRPC status, message) for an exception from the shared pipeline"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return STATUS_CODES.get(status_code, grpc.StatusCode.INTERNAL), str(getattr(error, "detail", error))
+    if isinstance(error, ValueError):
+        return grpc.StatusCode.INVALID_ARGUMENT, str(error)
+    return grpc.StatusCode.INTERNAL, f"Prediction failed: {error}"
+
+
+class PredictionServicer(prediction_pb2_grpc.PredictionServicer):
+    """Prediction RPCs on top of the REST service's pipeline
+
+    `service` is the loaded main module, passed in rather than imported so
+    the servicer works whether main runs as a module or as __main__.
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    def _validate(self, message):
+        try:
+            return self.service.AssessmentInput.model_validate(assessment_to_dict(message))
+        except self.service.ValidationError as e:
+            problems = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+            raise ValueError(f"Invalid assessment: {problems}")
+
+    async def _predict(self, request):
+        service = self.service
+        await service.wait_until_ready()
+        bundle = service.resolve_bundle(request.model or None, request.tier or None)
+        result = await service.predict_with(self._validate(request.assessment), bundle)
+        return prediction_pb2.PredictResponse(id=request.id, result=result_to_proto(result))
+
+    async def _admit(self, method: str, context) -> bool:
+        """Take an admission slot like a REST request; aborts the call if shed"""
+        if not self.service.ADMISSION_CONTROL:
+            return False
+        controller = self.service.admission_controller
+        reason = await controller.acquire(admission.current_deadline())
+        if reason is None:
+            controller.admitted += 1
+            return True
+        admission.REJECTED.inc(reason=reason)
+        controller.rejected += 1
+        code = grpc.StatusCode.DEADLINE_EXCEEDED if reason == "deadline" else grpc.StatusCode.RESOURCE_EXHAUSTED
+        GRPC_REQUESTS.inc(method=method, code=code.name)
+        await context.abort(code, f"Service overloaded ({reason}), retry later")
+
+    async def _unary(self, method: str, call, request, context):
+        with admission.deadline_scope(context.time_remaining()):
+            admitted = await self._admit(method, context)
+            started = asyncio.get_running_loop().time()
+            try:
+                response = await call(request)
+            except Exception as e:
+                code, message = error_status(e)
+                GRPC_REQUESTS.inc(method=method, code=code.name)
+                await context.abort(code, message)
+            finally:
+                if admitted:
+                    self.service.admission_controller.release(asyncio.get_running_loop().time() - started)
+        GRPC_REQUESTS.inc(method=method, code=grpc.StatusCode.OK.name)
+        return response
+
+    async def Predict(self, request, context):
+        return await self._unary("Predict", self._predict, request, context)
+
+    async def _predict_batch(self, request):
+        service = self.service
+        await service.wait_until_ready()
+        bundle = service.resolve_bundle(request.model or None, request.tier or None)
+        if len(request.assessments) > service.MAX_BATCH_SIZE:
+            raise ValueError(f"Batch too large: {len(request.assessments)} rows (max {service.MAX_BATCH_SIZE})")
+        items = await service.predict_rows([assessment_to_dict(a) for a in request.assessments], bundle)
+        results = [
+            prediction_pb2.PredictResponse(id=str(item.index), result=result_to_proto(item.result))
+            if item.result is not None else
+            prediction_pb2.PredictResponse(id=str(item.index), error=item.error or "Prediction failed")
+            for item in items
+        ]
+        succeeded = sum(item.result is not None for item in items)
+        return prediction_pb2.PredictBatchResponse(results=results, succeeded=succeeded,
+                                                   failed=len(items) - succeeded)
+
+    async def PredictBatch(self, request, context):
+        return await self._unary("PredictBatch", self._predict_batch, request, context)
+
+    async def _stream_one(self, request):
+        try:
+            return await self._predict(request)
+        except Exception as e:
+            return prediction_pb2.PredictResponse(id=request.id, error=error_status(e)[1])
+
+    async def PredictStream(self, request_iterator, context):
+        """Score requests as they arrive, answer in order; errors are per message"""
+        pending: asyncio.Queue = asyncio.Queue(maxsize=STREAM_WINDOW)
+
+        async def read():
+            async for request in request_iterator:
+                # Blocks once STREAM_WINDOW requests are in flight: backpressure to the client
+                await pending.put(asyncio.ensure_future(self._stream_one(request)))
+            await pending.put(None)
+
+        with admission.deadline_scope(context.time_remaining()):
+            reader = asyncio.ensure_future(read())
+            try:
+                while True:
+                    task = await pending.get()
+                    if task is None:
+                        break
+                    yield await task
+                await reader
+            finally:
+                reader.cancel()
+                while not pending.empty():
+                    task = pending.get_nowait()
+                    if task is not None:
+                        task.cancel()
+        GRPC_REQUESTS.inc(method="PredictStream", code=grpc.StatusCode.OK.name)
+
+
+def create_server(service, port: int, host: str = "[::]") -> grpc.aio.Server:
+    """Build (but don't start) a gRPC server for the service module"""
+    server = grpc.aio.server(options=[
+        # serve.py workers each bind the same port
+        ("grpc.so_reuseport", 1),
+        ("grpc.max_receive_message_length", MAX_MESSAGE_BYTES),
+        ("grpc.max_send_message_length", MAX_MESSAGE_BYTES),
+    ])
+    prediction_pb2_grpc.add_PredictionServicer_to_server(PredictionServicer(service), server)
+    server.add_insecure_port(f"{host}:{port}")
+    return server
+
+
+async def serve(port: int, host: str):
+    """Sibling-process mode: load models and serve gRPC only"""
+    import main
+
+    # This process serves gRPC itself; don't start a second server from startup
+    main.GRPC_PORT = 0
+    await main.startup_event()
+    server = create_server(main, port, host)
+    await server.start()
+    logger.info(f"✅ gRPC server listening on {host}:{port}")
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(5)
+        await main.shutdown_event()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the PCOS prediction gRPC API")
+    parser.add_argument("--port", type=int, default=int(os.getenv("GRPC_PORT") or 50051))
+    parser.add_argument("--host", default="[::]")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    try:
+        asyncio.run(serve(args.port, args.host))
+    except KeyboardInterrupt:
+        sys.exit(0)
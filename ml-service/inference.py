@@ -0,0 +1,526 @@
+"""
+Inference backends for the PCOS prediction service
+
+Two engines are available:
+- "estimator": calls predict_proba on the unpickled sklearn/XGBoost object
+- "compiled":  flattens the loaded tree ensemble or linear model into NumPy
+               arrays at load time and evaluates them directly, skipping the
+               estimator's per-call input validation
+
+Both engines return class probabilities from a single pass and derive the
+label as the argmax, so inference never runs twice per request.
+
+The compiled evaluator wins on single rows and small batches, the
+estimator's native code on large ones. "auto" times both at a few batch
+sizes after the parity check and routes each call by its row count to the
+engine that was faster for that size (see RoutedBackend).
+
+Run a parity check against a model file with:
+    python inference.py --model ../ml_f/models/basic_pcos_model.pkl
+"""
+
+import json
+import logging
+import math
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKEND_NAMES = ("auto", "estimator", "compiled")
+
+# Maximum absolute probability difference tolerated by the parity check.
+# XGBoost accumulates leaf values in float32, so exact bitwise equality is
+# not achievable; labels must always match exactly.
+PARITY_ATOL = 1e-6
+
+# Batch sizes "auto" times both engines at; each covers the row counts
+# closest to it (boundaries at the geometric midpoints)
+ROUTING_BATCH_ROWS = (1, 16, 256, 2048)
+ROUTING_REPEATS = 5
+
+
+class UnsupportedModelError(ValueError):
+    """Raised when a model cannot be compiled into flat arrays"""
+
+
+class InferenceBackend:
+    """Base class for inference engines"""
+
+    name = "base"
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (labels, probabilities) from one probability pass"""
+        probabilities = self.predict_proba(features)
+        return np.argmax(probabilities, axis=1), probabilities
+
+
+class EstimatorBackend(InferenceBackend):
+    """Delegates to the estimator's own predict_proba"""
+
+    name = "estimator"
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        return np.asarray(self.model.predict_proba(features), dtype=np.float64)
+
+
+class CompiledTreeBackend(InferenceBackend):
+    """Vectorized evaluator for a tree ensemble stored as flat node arrays
+
+    All trees share one set of node arrays; each tree starts at its entry in
+    `roots`. Leaves point to themselves, so every sample can be advanced
+    `max_depth` times without branching on whether it already reached a leaf.
+    """
+
+    name = "compiled"
+
+    def __init__(self, feature, threshold, left, right, default_left, value,
+                 roots, max_depth, strict, aggregate, base_margin=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        # XGBoost sends x < threshold left, sklearn sends x <= threshold left
+        self.strict = strict
+        self.aggregate = aggregate
+        self.base_margin = base_margin
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        # Both libraries compare float32 feature values against the split
+        X = np.ascontiguousarray(features, dtype=np.float32)
+        n_samples, n_features = X.shape
+        flat = X.ravel()
+        node = np.repeat(self.roots[np.newaxis, :], n_samples, axis=0)
+        row_offset = (np.arange(n_samples) * n_features)[:, np.newaxis]
+
+        for _ in range(self.max_depth):
+            x = flat.take(row_offset + self.feature.take(node))
+            if self.strict:
+                go_left = x < self.threshold.take(node)
+            else:
+                go_left = x <= self.threshold.take(node)
+            # Comparisons with NaN are False, so only missing values need the default
+            missing = np.isnan(x)
+            if missing.any():
+                go_left |= missing & self.default_left.take(node)
+            node = np.where(go_left, self.left.take(node), self.right.take(node))
+
+        # (n_samples, n_trees, n_outputs) -> (n_samples, n_outputs)
+        leaf_values = self.value[node]
+
+        if self.aggregate == "mean":
+            return leaf_values.mean(axis=1)
+
+        margin = leaf_values.sum(axis=1) + self.base_margin
+        if self.aggregate == "logistic":
+            positive = 1.0 / (1.0 + np.exp(-margin[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        # softmax
+        margin = margin - margin.max(axis=1, keepdims=True)
+        exp = np.exp(margin)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def split_thresholds(self) -> List[np.ndarray]:
+        """Distinct split thresholds per feature (used to build parity probes)"""
+        internal = self.left != np.arange(len(self.left))
+        n_features = int(self.feature.max()) + 1 if internal.any() else 0
+        return [
+            np.unique(self.threshold[internal & (self.feature == f)])
+            for f in range(n_features)
+        ]
+
+
+class CompiledLinearBackend(InferenceBackend):
+    """Evaluates a fitted logistic-regression style model as X @ W + b"""
+
+    name = "compiled"
+
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray, multinomial: bool):
+        self.coef_t = np.ascontiguousarray(coef.T, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.multinomial = multinomial
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        scores = np.asarray(features, dtype=np.float64) @ self.coef_t + self.intercept
+        if scores.shape[1] == 1:
+            positive = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        if self.multinomial:
+            scores = scores - scores.max(axis=1, keepdims=True)
+            exp = np.exp(scores)
+            return exp / exp.sum(axis=1, keepdims=True)
+        # One-vs-rest: independent sigmoids, normalized
+        prob = 1.0 / (1.0 + np.exp(-scores))
+        return prob / prob.sum(axis=1, keepdims=True)
+
+
+def _pack_trees(trees, strict, aggregate, n_outputs, base_margin=None) -> CompiledTreeBackend:
+    """Concatenate per-tree node arrays into one flat ensemble
+
+    Each entry in `trees` is a dict with feature, threshold, left, right,
+    default_left, leaf (n_nodes x n_outputs) and depth.
+    """
+    feature, threshold, left, right, default_left, value, roots = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        n_nodes = len(tree["left"])
+        is_leaf = tree["left"] < 0
+        own = np.arange(n_nodes)
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree["feature"]))
+        threshold.append(np.where(is_leaf, 0.0, tree["threshold"]))
+        left.append(np.where(is_leaf, own, tree["left"]) + offset)
+        right.append(np.where(is_leaf, own, tree["right"]) + offset)
+        default_left.append(tree["default_left"])
+        value.append(tree["leaf"])
+        max_depth = max(max_depth, tree["depth"])
+        offset += n_nodes
+
+    return CompiledTreeBackend(
+        feature=np.concatenate(feature).astype(np.intp),
+        threshold=np.concatenate(threshold).astype(np.float64),
+        left=np.concatenate(left).astype(np.intp),
+        right=np.concatenate(right).astype(np.intp),
+        default_left=np.concatenate(default_left).astype(bool),
+        value=np.concatenate(value).astype(np.float64).reshape(offset, n_outputs),
+        roots=np.asarray(roots, dtype=np.intp),
+        max_depth=max_depth,
+        strict=strict,
+        aggregate=aggregate,
+        base_margin=base_margin,
+    )
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    """Depth of a tree given child index arrays (-1 marks a leaf)"""
+    depth = np.zeros(len(left), dtype=np.intp)
+    for node in range(len(left)):
+        # Nodes are stored parent-before-child by both libraries
+        for child in (left[node], right[node]):
+            if child >= 0:
+                depth[child] = depth[node] + 1
+    return int(depth.max())
+
+
+def _compile_xgboost(model) -> CompiledTreeBackend:
+    booster = model.get_booster()
+    dump = json.loads(booster.save_raw(raw_format="json"))
+    learner = dump["learner"]
+    gbm = learner["gradient_booster"]
+    if gbm.get("name") != "gbtree":
+        raise UnsupportedModelError(f"XGBoost booster '{gbm.get('name')}' is not supported")
+
+    objective = learner["objective"]["name"]
+    base_score = float(learner["learner_model_param"]["base_score"])
+    num_class = int(learner["learner_model_param"].get("num_class", "0"))
+    n_outputs = max(num_class, 1)
+
+    if objective == "binary:logistic":
+        aggregate = "logistic"
+        base_margin = np.log(base_score / (1.0 - base_score))
+    elif objective in ("multi:softprob", "multi:softmax"):
+        aggregate = "softmax"
+        base_margin = base_score
+    else:
+        raise UnsupportedModelError(f"XGBoost objective '{objective}' is not supported")
+
+    model_json = gbm["model"]
+    tree_info = model_json["tree_info"]
+    raw_trees = model_json["trees"]
+
+    # Respect early stopping the same way predict_proba does
+    best_iteration = getattr(model, "best_iteration", None)
+    if best_iteration is not None:
+        trees_per_round = len(raw_trees) // booster.num_boosted_rounds()
+        raw_trees = raw_trees[:(best_iteration + 1) * trees_per_round]
+
+    trees = []
+    for tree_index, raw in enumerate(raw_trees):
+        if any(split_type != 0 for split_type in raw.get("split_type", [])):
+            raise UnsupportedModelError("Categorical splits are not supported")
+        left = np.asarray(raw["left_children"], dtype=np.intp)
+        right = np.asarray(raw["right_children"], dtype=np.intp)
+        conditions = np.asarray(raw["split_conditions"], dtype=np.float32)
+        is_leaf = left < 0
+        # Leaf nodes store their output in split_conditions
+        leaf = np.zeros((len(left), n_outputs), dtype=np.float64)
+        leaf[is_leaf, tree_info[tree_index] if num_class else 0] = conditions[is_leaf]
+        trees.append({
+            "feature": np.asarray(raw["split_indices"], dtype=np.intp),
+            "threshold": conditions,
+            "left": left,
+            "right": right,
+            "default_left": np.asarray(raw["default_left"], dtype=bool),
+            "leaf": leaf,
+            "depth": _tree_depth(left, right),
+        })
+
+    return _pack_trees(trees, strict=True, aggregate=aggregate,
+                       n_outputs=n_outputs, base_margin=base_margin)
+
+
+def _compile_sklearn_forest(model) -> CompiledTreeBackend:
+    """Random Forest / Extra Trees, or a single decision tree as a forest of one"""
+    n_classes = len(model.classes_)
+    estimators = getattr(model, "estimators_", [model])
+    trees = []
+    for estimator in estimators:
+        tree = estimator.tree_
+        # Normalize node class weights to per-node class probabilities
+        counts = tree.value[:, 0, :].astype(np.float64)
+        totals = counts.sum(axis=1, keepdims=True)
+        leaf = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+        missing_left = getattr(tree, "missing_go_to_left", None)
+        if missing_left is None:
+            missing_left = np.zeros(tree.node_count, dtype=bool)
+        trees.append({
+            "feature": tree.feature,
+            "threshold": tree.threshold,
+            "left": tree.children_left,
+            "right": tree.children_right,
+            "default_left": np.asarray(missing_left, dtype=bool),
+            "leaf": leaf,
+            "depth": int(tree.max_depth),
+        })
+    return _pack_trees(trees, strict=False, aggregate="mean", n_outputs=n_classes)
+
+
+def _compile_linear(model) -> CompiledLinearBackend:
+    multi_class = getattr(model, "multi_class", "auto")
+    solver = getattr(model, "solver", "lbfgs")
+    multinomial = multi_class == "multinomial" or (multi_class == "auto" and solver != "liblinear")
+    return CompiledLinearBackend(model.coef_, model.intercept_, multinomial)
+
+
+def compile_model(model) -> InferenceBackend:
+    """Convert a fitted model into a compiled backend
+
+    Raises UnsupportedModelError for model types without a compiled form.
+    """
+    # Imports are local so the service does not require every library
+    type_name = type(model).__name__
+
+    try:
+        from xgboost import XGBClassifier
+        if isinstance(model, XGBClassifier):
+            return _compile_xgboost(model)
+    except ImportError:
+        pass
+
+    from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.tree import DecisionTreeClassifier
+
+    if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier, DecisionTreeClassifier)):
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise UnsupportedModelError("Multi-output forests are not supported")
+        return _compile_sklearn_forest(model)
+    if isinstance(model, LogisticRegression):
+        return _compile_linear(model)
+
+    raise UnsupportedModelError(f"No compiled evaluator for {type_name}")
+
+
+class RoutedBackend(InferenceBackend):
+    """Sends each call to the engine that was fastest for its row count
+
+    `routes` is a list of (max_rows, backend) in increasing max_rows; the
+    last entry takes everything larger.
+    """
+
+    def __init__(self, routes: Sequence[Tuple[float, InferenceBackend]]):
+        self.routes = list(routes)
+        self.name = "+".join(dict.fromkeys(backend.name for _, backend in self.routes))
+
+    def backend_for(self, n_rows: int) -> InferenceBackend:
+        for max_rows, backend in self.routes:
+            if n_rows <= max_rows:
+                return backend
+        return self.routes[-1][1]
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        return self.backend_for(len(features)).predict_proba(features)
+
+    def describe(self) -> str:
+        parts, lower = [], 1
+        for max_rows, backend in self.routes:
+            if math.isinf(max_rows):
+                parts.append(f"{lower}+ rows: {backend.name}")
+            else:
+                parts.append(f"{lower}-{int(max_rows)} rows: {backend.name}")
+                lower = int(max_rows) + 1
+        return ", ".join(parts)
+
+
+def time_per_call(backend: InferenceBackend, features: np.ndarray, repeats: int = ROUTING_REPEATS) -> float:
+    """Median seconds for one predict_proba call on `features`, after one warmup call"""
+    backend.predict_proba(features)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        backend.predict_proba(features)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+
+def route_by_batch_size(candidates: Sequence[InferenceBackend], probe: np.ndarray,
+                        batch_rows: Sequence[int] = ROUTING_BATCH_ROWS) -> InferenceBackend:
+    """The fastest candidate per batch-size bucket, as one backend
+
+    Returns a plain candidate when one wins every bucket.
+    """
+    winners = []
+    for rows in batch_rows:
+        features = np.resize(probe, (rows, probe.shape[1]))
+        timings = [time_per_call(backend, features) for backend in candidates]
+        winners.append(candidates[int(np.argmin(timings))])
+        logger.info("Batch of %d rows: %s", rows, ", ".join(
+            f"{backend.name} {seconds / rows * 1e6:.1f} µs/row" for backend, seconds in zip(candidates, timings)))
+    if all(winner is winners[0] for winner in winners):
+        return winners[0]
+
+    routes = []
+    for i, winner in enumerate(winners):
+        max_rows = math.floor(math.sqrt(batch_rows[i] * batch_rows[i + 1])) if i + 1 < len(batch_rows) else math.inf
+        if routes and routes[-1][1] is winner:
+            # Adjacent buckets with the same winner merge into one route
+            routes[-1] = (max_rows, winner)
+        else:
+            routes.append((max_rows, winner))
+    return RoutedBackend(routes)
+
+
+def build_probe_matrix(backend: InferenceBackend, n_features: int,
+                       n_rows: int = 512, seed: int = 0) -> np.ndarray:
+    """Build inputs that exercise both sides of every split
+
+    Tree ensembles are probed at, just below and just above their split
+    thresholds (including a few missing values); other models get a spread
+    of standard-normal values scaled to typical feature magnitudes.
+    """
+    rng = np.random.default_rng(seed)
+    probe = rng.normal(loc=0.0, scale=50.0, size=(n_rows, n_features))
+
+    if isinstance(backend, CompiledTreeBackend):
+        for f, thresholds in enumerate(backend.split_thresholds()[:n_features]):
+            if len(thresholds) == 0:
+                continue
+            picks = rng.choice(thresholds, size=n_rows)
+            nudge = rng.choice([-1e-3, 0.0, 1e-3], size=n_rows)
+            probe[:, f] = picks + nudge
+        missing = rng.random(probe.shape) < 0.02
+        probe[missing] = np.nan
+    return probe
+
+
+def check_parity(reference: InferenceBackend, candidate: InferenceBackend,
+                 features: np.ndarray, atol: float = PARITY_ATOL) -> Tuple[bool, float]:
+    """Confirm two backends agree on labels and probabilities
+
+    Returns (ok, max_abs_probability_difference).
+    """
+    ref_labels, ref_proba = reference.predict(features)
+    cand_labels, cand_proba = candidate.predict(features)
+    if ref_proba.shape != cand_proba.shape:
+        return False, float("inf")
+    max_diff = float(np.max(np.abs(ref_proba - cand_proba))) if ref_proba.size else 0.0
+    ok = bool(np.array_equal(ref_labels, cand_labels)) and max_diff <= atol
+    return ok, max_diff
+
+
+def create_backend(model, name: str = "auto", n_features: Optional[int] = None,
+                   probe: Optional[np.ndarray] = None) -> InferenceBackend:
+    """Create the requested inference backend for a loaded model
+
+    "auto" and "compiled" both try the compiled evaluator and only keep it if
+    it passes the parity check against the estimator; otherwise the estimator
+    backend is used so predictions never change silently. "compiled" then
+    uses it for every call; "auto" uses it only for the batch sizes where
+    it is faster than the estimator (see route_by_batch_size).
+    """
+    if name not in BACKEND_NAMES:
+        logger.warning(f"⚠️ Unknown inference backend '{name}', using 'auto'")
+        name = "auto"
+
+    estimator = EstimatorBackend(model)
+    if name == "estimator":
+        return estimator
+
+    try:
+        compiled = compile_model(model)
+    except UnsupportedModelError as e:
+        log = logger.warning if name == "compiled" else logger.info
+        log(f"Compiled backend unavailable ({e}), using estimator backend")
+        return estimator
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to compile model, using estimator backend: {e}")
+        return estimator
+
+    if n_features is None:
+        n_features = int(getattr(model, "n_features_in_", 0))
+    if probe is None:
+        probe = build_probe_matrix(compiled, n_features)
+
+    ok, max_diff = check_parity(estimator, compiled, probe)
+    if not ok:
+        logger.error(f"❌ Compiled backend failed parity check (max diff {max_diff:.3g}), using estimator backend")
+        return estimator
+
+    logger.info(f"✅ Compiled backend passed parity check on {len(probe)} rows (max diff {max_diff:.3g})")
+    if name == "compiled":
+        return compiled
+
+    backend = route_by_batch_size([compiled, estimator], probe)
+    if isinstance(backend, RoutedBackend):
+        logger.info(f"Routing by batch size: {backend.describe()}")
+    return backend
+
+
+if __name__ == "__main__":
+    import argparse
+    import pickle
+
+    parser = argparse.ArgumentParser(description="Check parity between inference backends")
+    parser.add_argument("--model", default="../ml_f/models/basic_pcos_model.pkl")
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as f:
+        loaded = pickle.load(f)
+    # Training bundles wrap the estimator in a dict; pipeline bundles end with
+    # it. Probes are built in the estimator's input space (after preprocessing)
+    if isinstance(loaded, dict):
+        loaded = loaded["pipeline"][-1] if "pipeline" in loaded else loaded["model"]
+
+    estimator = EstimatorBackend(loaded)
+    compiled = compile_model(loaded)
+    features = build_probe_matrix(compiled, int(loaded.n_features_in_), n_rows=args.rows)
+    ok, max_diff = check_parity(estimator, compiled, features)
+
+    for backend in (estimator, compiled):
+        start = time.perf_counter()
+        for row in features[:1000]:
+            backend.predict(row.reshape(1, -1))
+        single_us = (time.perf_counter() - start) / 1000 * 1e6
+        start = time.perf_counter()
+        backend.predict(features)
+        batch_us = (time.perf_counter() - start) / len(features) * 1e6
+        print(f"{backend.name:>9}: {single_us:8.1f} us/row single, {batch_us:8.3f} us/row batch")
+
+    routed = route_by_batch_size([compiled, estimator], features)
+    print(f"     auto: {routed.describe() if isinstance(routed, RoutedBackend) else routed.name + ' for all batch sizes'}")
+    print(f"parity: {'OK' if ok else 'FAILED'} (max abs diff {max_diff:.3g}, {len(features)} rows)")
+    raise SystemExit(0 if ok else 1)
@@ -3,28 +3,61 @@ FastAPI microservice for PCOS risk prediction
 Run with: uvicorn main:app --host 0.0.0.0 --port 8000
 """
 
-from fastapi import FastAPI, HTTPException
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import pickle
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+import asyncio
+import json
 import os
+import signal
+import sys
+import threading
 import numpy as np
-from typing import Optional, Dict, List
+from collections import OrderedDict
+from typing import Optional, Dict, List, Any, Tuple
 import logging
+from functools import lru_cache, partial
+
+import admission
+import metrics
+import profiler
+from explainer import compute_global_importances
+from registry import ModelBundle, ModelRegistry
+from scheduler import MicroBatcher
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="PCOS Prediction Service")
+# Startup phases: starting -> loading_models -> warming_up -> ready (or failed).
+# Heavy libraries (sklearn/xgboost via pickle, shap) are only imported while
+# loading models, which runs after the port is open.
+startup_state = {
+    "phase": "starting",
+    "error": None,
+    "timings_ms": {"imports": round((time.perf_counter() - _IMPORT_STARTED) * 1000, 2)},
+}
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, specify your Firebase Functions URL
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Set by serve.py while its parent loads models: workers forked meanwhile only
+# report startup progress and are replaced once loading finishes
+loading_in_parent = False
+
+def set_phase(phase: str, error: Optional[str] = None):
+    startup_state["phase"] = phase
+    startup_state["error"] = error
+    logger.info(f"Startup phase: {phase}")
+
+def record_timing(name: str, started: float):
+    """Record how long a startup step took, in milliseconds"""
+    startup_state["timings_ms"][name] = round((time.perf_counter() - started) * 1000, 2)
+
+def is_ready() -> bool:
+    return startup_state["phase"] == "ready"
+
+app = FastAPI(title="PCOS Prediction Service")
 
 # Load models
 # Try multiple paths: environment variable, container path, local dev path
@@ -55,52 +88,194 @@ def get_model_dir():
 
 MODEL_DIR = get_model_dir()
 logger.info(f"Using MODEL_DIR: {MODEL_DIR}")
-model = None
-imputer = None
-feature_names = None
 
-def load_models():
-    """Load the trained model, imputer, and feature names"""
-    global model, imputer, feature_names
+# Model served when a request doesn't pick one (see registry.py for bundle names)
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL") or None
+
+# Model for requests sent with X-Model-Tier: fast (the surrogate distilled by
+# model_comparison.py); such requests get the default model if it isn't loaded
+FAST_MODEL = os.getenv("FAST_MODEL", "surrogate")
+MODEL_TIERS = ("standard", "fast")
+
+# Shared secret for /admin endpoints (sent as X-Admin-Token); admin is disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# /admin/profile and per-request X-Profile (both also need ADMIN_TOKEN)
+ENABLE_PROFILING = os.getenv("ENABLE_PROFILING", "false").lower() == "true"
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+# Inference engine: "auto" (compiled if it passes the parity check, per batch size
+# wherever it is faster than the estimator), "estimator" or "compiled"
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "auto")
+
+# Per-prediction SHAP explanations: "true" to enable, "false" to always use global importances
+ENABLE_SHAP = os.getenv("ENABLE_SHAP", "true").lower() == "true"
+
+# Time allowed for SHAP per request; rows not explained in time use global importances
+EXPLANATION_BUDGET_MS = float(os.getenv("EXPLANATION_BUDGET_MS", "50"))
+EXPLANATION_BATCH_BUDGET_MS = float(os.getenv("EXPLANATION_BATCH_BUDGET_MS", "1000"))
+
+# Number of features the model expects (see encode_input)
+EXPECTED_FEATURES = 10
+
+# Upper bound on rows accepted by /predict/batch in a single request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "5000"))
+
+# /predict/compact: content types accepted besides JSON
+MSGPACK_CONTENT_TYPES = ("application/msgpack", "application/x-msgpack")
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+# gRPC API (grpc_server.py) served from this process on GRPC_PORT; 0 disables it
+GRPC_PORT = int(os.getenv("GRPC_PORT", "0"))
+
+# /predict/stream: rows scored per chunk, and the longest NDJSON line accepted
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "256"))
+STREAM_MAX_LINE_BYTES = int(os.getenv("STREAM_MAX_LINE_BYTES", "65536"))
+
+# Micro-batching: concurrent /predict rows arriving within BATCH_WINDOW_MS are
+# scored together (up to BATCH_MAX_ROWS) on INFERENCE_WORKERS threads
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "true").lower() == "true"
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "2"))
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "64"))
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+
+# Prediction cache: max entries (0 disables) and time-to-live per entry
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "3600"))
+
+# Admission control: prediction requests beyond MAX_CONCURRENT_REQUESTS wait in
+# a queue of MAX_QUEUED_REQUESTS for up to QUEUE_TIMEOUT_MS, the rest get 503.
+# DEFAULT_DEADLINE_MS applies to requests without an X-Deadline-Ms header (0: none)
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "32"))
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "64"))
+QUEUE_TIMEOUT_MS = float(os.getenv("QUEUE_TIMEOUT_MS", "1000"))
+DEFAULT_DEADLINE_MS = float(os.getenv("DEFAULT_DEADLINE_MS", "0"))
+
+admission_controller = admission.AdmissionController(
+    max_concurrent=MAX_CONCURRENT_REQUESTS,
+    max_queued=MAX_QUEUED_REQUESTS,
+    queue_timeout_ms=QUEUE_TIMEOUT_MS,
+)
+app.add_middleware(
+    admission.AdmissionMiddleware,
+    controller=admission_controller,
+    enabled=ADMISSION_CONTROL,
+    default_deadline_ms=DEFAULT_DEADLINE_MS or None,
+)
+
+# Request counts, latency and per-stage timings for /metrics (outside admission
+# control, so requests it sheds are counted too)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# CORS middleware, added last so it is outermost: every response, including
+# 503/504s shed by admission control, carries the CORS headers
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # In production, specify your Firebase Functions URL
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+class PredictionCache:
+    """Thread-safe LRU cache with a per-entry TTL
+    
+    Keys are canonicalized feature vectors plus the model version, so any
+    two assessments that encode to the same imputed features share a result.
+    """
+    
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+    
+    def get(self, key: bytes):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
     
+    def put(self, key: bytes, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_SECONDS)
+
+def make_cache_key(features_row: np.ndarray, model_version: Optional[str]) -> bytes:
+    """Canonical cache key for one imputed feature row and model version"""
+    # Round away float noise (e.g. computed BMI) and fold -0.0 into 0.0
+    canonical = np.round(np.asarray(features_row, dtype=np.float64), 6) + 0.0
+    return (model_version or "").encode() + b":" + canonical.tobytes()
+
+registry = ModelRegistry(
+    MODEL_DIR,
+    default_name=DEFAULT_MODEL,
+    inference_backend=INFERENCE_BACKEND,
+    enable_shap=ENABLE_SHAP,
+    explanation_budget_ms=EXPLANATION_BUDGET_MS,
+    n_features=EXPECTED_FEATURES,
+)
+
+def get_bundle(model_name: Optional[str] = None) -> Optional[ModelBundle]:
+    """Bundle for a request: the named model, or the default if None"""
+    return registry.get(model_name)
+
+def load_models(default_model: Optional[str] = None) -> bool:
+    """Load every model bundle under MODEL_DIR, warm each one up, then swap them in"""
     try:
-        model_path = os.path.join(MODEL_DIR, "basic_pcos_model.pkl")
-        imputer_path = os.path.join(MODEL_DIR, "basic_imputer.pkl")
-        features_path = os.path.join(MODEL_DIR, "basic_features.pkl")
-        
-        logger.info(f"Loading model from {model_path}")
-        with open(model_path, "rb") as f:
-            model = pickle.load(f)
-        logger.info(f"✅ Model loaded: {type(model)}")
-        
-        # Try to load imputer (may fail due to pickle version incompatibility)
-        try:
-            logger.info(f"Loading imputer from {imputer_path}")
-            with open(imputer_path, "rb") as f:
-                loaded_imputer = pickle.load(f)
-            
-            # Check if imputer is fitted
-            if hasattr(loaded_imputer, 'statistics_') and loaded_imputer.statistics_ is not None:
-                imputer = loaded_imputer
-                logger.info(f"✅ Imputer loaded and fitted: {type(imputer)}")
-            else:
-                logger.warning(f"⚠️ Imputer loaded but not fitted, will skip imputation")
-                imputer = None
-        except Exception as e:
-            logger.warning(f"⚠️ Could not load imputer (will skip imputation): {e}")
-            # Fallback: set imputer to None, we'll handle missing values in transform_input
-            imputer = None
-        
-        # Try to load feature names
-        try:
-            logger.info(f"Loading features from {features_path}")
-            with open(features_path, "rb") as f:
-                feature_names = pickle.load(f)
-            logger.info(f"✅ Features loaded: {type(feature_names)}")
-        except Exception as e:
-            logger.warning(f"⚠️ Could not load feature names: {e}")
-            feature_names = None
-        
+        started = time.perf_counter()
+        if not registry.load(warm_up=warm_up, default_name=default_model):
+            return False
+        record_timing("registry_load", started)
+        # Report the default model's load steps as the startup timings
+        startup_state["timings_ms"].update(get_bundle().timings_ms)
         logger.info("✅ Models loaded successfully")
         return True
     except Exception as e:
@@ -109,22 +284,164 @@ def load_models():
         logger.error(traceback.format_exc())
         return False
 
+# Synthetic assessment used to warm up inference and explanation before ready
+WARM_UP_ASSESSMENT = {
+    "age": 28,
+    "weight": 65,
+    "height": 165,
+    "cycleRegularity": "irregular",
+    "exerciseFrequency": "1-2_week",
+    "diet": "balanced",
+}
+
+# How long a prediction request waits for startup to finish before a 503
+STARTUP_WAIT_SECONDS = float(os.getenv("STARTUP_WAIT_SECONDS", "10"))
+
+def warm_up(bundle: ModelBundle):
+    """Run one synthetic prediction so the first real request pays no one-time costs
+    
+    Runs synchronously (no worker threads) so it is safe before serve.py forks.
+    """
+    if not is_ready():
+        set_phase("warming_up")
+    started = time.perf_counter()
+    features = transform_input(AssessmentInput(**WARM_UP_ASSESSMENT), bundle)
+    predictions, probabilities = bundle.backend.predict(features)
+    names = get_feature_names(bundle)
+    if bundle.explainer is not None:
+        # Explanations fall back to global importances, so SHAP problems don't block readiness
+        try:
+            contributions = bundle.explainer.warm_up(features, predictions)
+            build_contributors(contributions[0], names)
+        except Exception as e:
+            logger.warning(f"⚠️ [{bundle.name}] SHAP warm-up failed: {e}")
+    PredictionResult(
+        label=LABEL_MAP.get(int(predictions[0]), "No Risk"),
+        probabilities=format_probabilities(probabilities[0]),
+        topContributors=calculate_feature_importance(bundle, features)
+    )
+    bundle.record_timing("first_inference", started)
+
+def initialize() -> bool:
+    """Load and warm up models, recording each startup phase"""
+    if not is_ready():
+        set_phase("loading_models")
+    if not load_models():
+        if not is_ready():
+            set_phase("failed", "Model loading failed. Please check server logs.")
+        return False
+    
+    startup_state["timings_ms"]["total"] = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 2)
+    set_phase("ready")
+    logger.info(f"✅ Ready, startup timings (ms): {startup_state['timings_ms']}")
+    return True
+
+reload_state = {"in_progress": False, "last_success": None, "last_error": None, "last_duration_ms": None}
+
+def reload_models(default_model: Optional[str] = None) -> bool:
+    """Reload every bundle from MODEL_DIR without interrupting traffic
+    
+    New bundles are loaded and warmed up alongside the current ones and then
+    swapped in atomically; in-flight requests finish on the bundle they hold.
+    """
+    reload_state["in_progress"] = True
+    started = time.perf_counter()
+    try:
+        ok = load_models(default_model)
+        reload_state["last_error"] = None if ok else "Reload failed; previous models are still being served"
+        if ok:
+            reload_state["last_success"] = time.time()
+        return ok
+    finally:
+        reload_state["last_duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        reload_state["in_progress"] = False
+
+scheduler: Optional[MicroBatcher] = None
+ready_event: Optional[asyncio.Event] = None
+grpc_server = None
+
 # Load models on startup
 @app.on_event("startup")
 async def startup_event():
-    if not load_models():
-        logger.warning("Models failed to load. Service will return errors.")
+    global scheduler, ready_event, grpc_server
+    ready_event = asyncio.Event()
+    
+    # Inference runs on worker threads so the event loop keeps accepting requests
+    scheduler = MicroBatcher(
+        score_features,
+        max_rows=BATCH_MAX_ROWS if MICRO_BATCHING else 1,
+        window_ms=BATCH_WINDOW_MS if MICRO_BATCHING else 0.0,
+        workers=INFERENCE_WORKERS,
+    )
+    scheduler.start()
+    
+    # SIGUSR1 reloads models in place (serve.py uses SIGHUP on the parent instead)
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(
+            signal.SIGUSR1,
+            lambda: threading.Thread(target=reload_models, name="model-reload", daemon=True).start()
+        )
+    except (NotImplementedError, RuntimeError, AttributeError):
+        # Not supported on this platform or outside the main thread
+        pass
+    
+    # gRPC shares this event loop, scheduler and models; imported here so
+    # serve.py's parent never initializes gRPC before forking
+    if GRPC_PORT:
+        from grpc_server import create_server
+        grpc_server = create_server(sys.modules[__name__], GRPC_PORT)
+        await grpc_server.start()
+        logger.info(f"✅ gRPC server listening on port {GRPC_PORT}")
+    
+    # serve.py loads models once in the parent and forks workers that share them
+    if is_ready():
+        ready_event.set()
+        return
+    if loading_in_parent:
+        return
+    
+    # Otherwise load in the background so the port opens immediately;
+    # /health and /ready report progress
+    def load_in_background():
+        if not initialize():
+            logger.warning("Models failed to load. Service will return errors.")
+        # Wake waiting requests whether loading succeeded or not
+        loop.call_soon_threadsafe(ready_event.set)
+    
+    threading.Thread(target=load_in_background, name="model-loader", daemon=True).start()
+
+async def wait_until_ready():
+    """Wait briefly for startup to finish, then fail fast with 503"""
+    if is_ready():
+        return
+    if ready_event is not None:
+        try:
+            await asyncio.wait_for(ready_event.wait(), timeout=STARTUP_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+    if not is_ready():
+        detail = startup_state["error"] or f"Service is starting (phase: {startup_state['phase']})"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "1"})
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if grpc_server is not None:
+        await grpc_server.stop(5)
+    if scheduler is not None:
+        await scheduler.stop()
 
 # Request/Response models
 class AssessmentInput(BaseModel):
     age: float
-    weight: float
-    height: float
+    # Positive and finite: BMI is derived from them when not given
+    weight: float = Field(gt=0, allow_inf_nan=False)
+    height: float = Field(gt=0, allow_inf_nan=False)
     cycleRegularity: str  # "regular" or "irregular"
     exerciseFrequency: str  # "none", "1-2_week", "3-4_week", "5-plus_week"
     diet: str  # "balanced", "unhealthy", "other"
     cycleLength: Optional[float] = None
-    bmi: Optional[float] = None
+    bmi: Optional[float] = Field(None, allow_inf_nan=False)
     medicalHistory: Optional[str] = None
     pregnant: Optional[bool] = None
     abortions: Optional[float] = None
@@ -155,14 +472,34 @@ class PredictionResult(BaseModel):
     probabilities: Dict[str, float]
     topContributors: List[FeatureContributor]
 
-def transform_input(input_data: AssessmentInput) -> np.ndarray:
-    """Transform input data to match model's expected format
+class BatchPredictionRequest(BaseModel):
+    # Rows are validated one by one so a bad row only fails itself
+    assessments: List[Dict[str, Any]]
+
+class BatchPredictionItem(BaseModel):
+    index: int
+    result: Optional[PredictionResult] = None
+    error: Optional[str] = None
+
+class BatchPredictionResponse(BaseModel):
+    results: List[BatchPredictionItem]
+    succeeded: int
+    failed: int
+
+# Map model class indices to labels
+# Adjust based on your model's class mapping
+LABEL_MAP = {0: "No Risk", 1: "Early", 2: "High"}
+
+def encode_input(input_data: AssessmentInput, bundle: Optional[ModelBundle] = None) -> np.ndarray:
+    """Encode a single assessment into the model's 10-feature row
     
-    Model expects 10 features in this order:
+    Column order, categorical codes and any imputation/scaling come from the
+    bundle's feature spec (see feature_encoder.py). Bundles without a spec
+    use the original encoding:
     1. Age (yrs)
     2. Weight (Kg)
     3. Height(Cm)
-    4. BMI
+    4. BMI (computed from weight and height if not provided)
     5. Cycle(R/I) - 1=regular, 2=irregular
     6. Cycle length(days)
     7. Skin darkening (Y/N) - 1=Yes, 0=No
@@ -170,133 +507,122 @@ def transform_input(input_data: AssessmentInput) -> np.ndarray:
     9. Reg.Exercise(Y/N) - 1=Yes, 0=No
     10. Pregnant(Y/N) - 1=Yes, 0=No
     """
-    # Calculate BMI if not provided
-    bmi = input_data.bmi if input_data.bmi else input_data.weight / ((input_data.height / 100) ** 2)
-    
-    # Encode cycle regularity: 1=regular, 2=irregular
-    cycle_regular = 1 if input_data.cycleRegularity == "regular" else 2
-    
-    # Convert boolean to int (1=Yes, 0=No)
-    skin_darkening = 1 if input_data.skinDarkening else 0
-    fast_food = 1 if input_data.fastFood else 0
-    # Map exercise frequency to regular exercise (Yes/No)
-    # If exercise frequency is "none", regular_exercise = 0, otherwise = 1
-    regular_exercise = 1 if input_data.exerciseFrequency != "none" else 0
-    pregnant = 1 if input_data.pregnant else 0
-    
-    # Build feature array matching the model's expected 10 features
-    features = np.array([
-        input_data.age,                    # 1. Age (yrs)
-        input_data.weight,                  # 2. Weight (Kg)
-        input_data.height,                  # 3. Height(Cm)
-        bmi,                                # 4. BMI
-        cycle_regular,                      # 5. Cycle(R/I) - 1=regular, 2=irregular
-        input_data.cycleLength or 0,        # 6. Cycle length(days)
-        skin_darkening,                     # 7. Skin darkening (Y/N)
-        fast_food,                          # 8. Fast food (Y/N)
-        regular_exercise,                   # 9. Reg.Exercise(Y/N)
-        pregnant,                           # 10. Pregnant(Y/N)
-    ]).reshape(1, -1)
-    
-    # Apply imputer if available, otherwise fill NaN with 0
-    if imputer is not None:
-        try:
-            features_imputed = imputer.transform(features)
-        except Exception as e:
-            # If imputer fails (e.g., not fitted), fall back to NaN filling
-            logger.warning(f"Imputer transform failed, using fallback: {e}")
-            features_imputed = np.nan_to_num(features, nan=0.0)
-    else:
-        # Fill NaN values with 0 if no imputer available
-        features_imputed = np.nan_to_num(features, nan=0.0)
+    return (bundle or get_bundle()).encoder.encode_row(input_data)
+
+def impute_features(features: np.ndarray, bundle: Optional[ModelBundle] = None) -> np.ndarray:
+    """Apply a model's preprocessing (scaling, imputation) to a 2D feature matrix"""
+    bundle = bundle or get_bundle()
+    with metrics.stage("imputer", bundle.name):
+        return bundle.preprocess(features)
+
+def transform_input(input_data: AssessmentInput, bundle: Optional[ModelBundle] = None) -> np.ndarray:
+    """Transform input data to match model's expected format (1 x 10 matrix)"""
+    bundle = bundle or get_bundle()
+    with metrics.stage("transform_input", bundle.name):
+        row = encode_input(input_data, bundle).reshape(1, -1)
+    return impute_features(row, bundle)
+
+def transform_batch(inputs: List[AssessmentInput], bundle: Optional[ModelBundle] = None) -> np.ndarray:
+    """Encode many assessments into one imputed (n x 10) matrix in a single vectorized pass"""
+    bundle = bundle or get_bundle()
+    with metrics.stage("transform_input", bundle.name):
+        features = bundle.encoder.encode_batch(inputs)
+    return impute_features(features, bundle)
+
+def format_probabilities(probabilities: np.ndarray) -> Dict[str, float]:
+    """Map a row of class probabilities to the response format"""
+    return {
+        "NoRisk": float(probabilities[0]) if len(probabilities) > 0 else 0.0,
+        "Early": float(probabilities[1]) if len(probabilities) > 1 else 0.0,
+        "High": float(probabilities[2]) if len(probabilities) > 2 else 0.0,
+    }
+
+DEFAULT_FEATURE_NAMES = [
+    "Age (yrs)",
+    "Weight (Kg)",
+    "Height(Cm)",
+    "BMI",
+    "Cycle(R/I)",
+    "Cycle length(days)",
+    "Skin darkening (Y/N)",
+    "Fast food (Y/N)",
+    "Reg.Exercise(Y/N)",
+    "Pregnant(Y/N)"
+]
+
+FEATURE_EXPLANATIONS = {
+    "Age (yrs)": "Age can be a factor in PCOS risk, especially for women over 30.",
+    "Weight (Kg)": "Weight is a key factor in PCOS risk assessment.",
+    "Height(Cm)": "Height is used to calculate BMI, which affects PCOS risk.",
+    "BMI": "Higher BMI is associated with increased PCOS risk.",
+    "Cycle(R/I)": "Irregular menstrual cycles are a key indicator of PCOS.",
+    "Cycle length(days)": "Abnormal cycle length can indicate hormonal imbalances.",
+    "Skin darkening (Y/N)": "Skin darkening (acanthosis nigricans) is associated with insulin resistance and PCOS.",
+    "Fast food (Y/N)": "Unhealthy diet patterns can contribute to PCOS symptoms.",
+    "Reg.Exercise(Y/N)": "Regular exercise helps manage PCOS symptoms and improve insulin sensitivity.",
+    "Pregnant(Y/N)": "Pregnancy history can be relevant to PCOS assessment.",
+    # Also match without exact formatting
+    "Age": "Age can be a factor in PCOS risk, especially for women over 30.",
+    "Weight": "Weight is a key factor in PCOS risk assessment.",
+    "Height": "Height is used to calculate BMI, which affects PCOS risk.",
+    "Cycle Regularity": "Irregular menstrual cycles are a key indicator of PCOS.",
+    "Cycle length": "Abnormal cycle length can indicate hormonal imbalances.",
+    "Skin darkening": "Skin darkening (acanthosis nigricans) is associated with insulin resistance and PCOS.",
+    "Fast food": "Unhealthy diet patterns can contribute to PCOS symptoms.",
+    "Reg.Exercise": "Regular exercise helps manage PCOS symptoms and improve insulin sensitivity.",
+    "Pregnant": "Pregnancy history can be relevant to PCOS assessment.",
+}
+
+@lru_cache(maxsize=None)
+def explain_feature(feature_name: str) -> str:
+    """Look up the user-facing explanation for a feature name"""
+    # Try exact match first, then try without (Y/N) suffix, then use generic
+    explanation = FEATURE_EXPLANATIONS.get(feature_name)
+    if not explanation:
+        # Try without (Y/N) suffix
+        base_name = feature_name.split(" (Y/N)")[0].split("(Y/N)")[0]
+        explanation = FEATURE_EXPLANATIONS.get(base_name)
+    if not explanation:
+        # Try matching by partial name
+        for key, value in FEATURE_EXPLANATIONS.items():
+            if key.lower() in feature_name.lower() or feature_name.lower() in key.lower():
+                explanation = value
+                break
+    if not explanation:
+        explanation = f"{feature_name} contributes to the risk assessment."
+    return explanation
+
+def get_feature_names(bundle: ModelBundle) -> List[str]:
+    """Use the model's feature names if available, otherwise use defaults"""
+    names = bundle.feature_names
+    if isinstance(names, list) and len(names) >= len(DEFAULT_FEATURE_NAMES):
+        return names
+    return DEFAULT_FEATURE_NAMES
+
+def build_contributors(importances: np.ndarray, names: List[str], top_k: int = 3) -> List[FeatureContributor]:
+    """Turn one row of importances into the top-k contributors"""
+    # Normalize
+    total = np.sum(importances)
+    importances = importances / total if total > 0 else importances
     
-    return features_imputed
+    top_indices = np.argsort(importances)[-top_k:][::-1]
+    return [
+        FeatureContributor(
+            feature=names[idx],
+            contribution=float(importances[idx]),
+            explanation=explain_feature(names[idx])
+        )
+        for idx in top_indices
+        if idx < len(names)
+    ]
 
-def calculate_feature_importance(model, features: np.ndarray, feature_names: List[str]) -> List[FeatureContributor]:
-    """Calculate feature importance using model coefficients or SHAP"""
+def calculate_feature_importance(bundle: ModelBundle, features: np.ndarray) -> List[FeatureContributor]:
+    """Top contributors from the model's global importances (cached at load time)"""
     try:
-        # If model has feature_importances_ (tree-based)
-        if hasattr(model, 'feature_importances_'):
-            importances = model.feature_importances_
-        # If model has coef_ (linear models)
-        elif hasattr(model, 'coef_'):
-            importances = np.abs(model.coef_[0] if model.coef_.ndim > 1 else model.coef_)
-        else:
-            # Fallback: use random feature importance
-            importances = np.random.rand(len(feature_names))
-        
-        # Normalize
-        importances = importances / np.sum(importances) if np.sum(importances) > 0 else importances
-        
-        # Get top 3
-        top_indices = np.argsort(importances)[-3:][::-1]
-        
-        # Map feature indices to actual feature names
-        default_feature_names = [
-            "Age (yrs)",
-            "Weight (Kg)",
-            "Height(Cm)",
-            "BMI",
-            "Cycle(R/I)",
-            "Cycle length(days)",
-            "Skin darkening (Y/N)",
-            "Fast food (Y/N)",
-            "Reg.Exercise(Y/N)",
-            "Pregnant(Y/N)"
-        ]
-        
-        # Use provided feature names if available, otherwise use defaults
-        actual_feature_names = feature_names if feature_names and len(feature_names) >= len(default_feature_names) else default_feature_names
-        
-        explanations = {
-            "Age (yrs)": "Age can be a factor in PCOS risk, especially for women over 30.",
-            "Weight (Kg)": "Weight is a key factor in PCOS risk assessment.",
-            "Height(Cm)": "Height is used to calculate BMI, which affects PCOS risk.",
-            "BMI": "Higher BMI is associated with increased PCOS risk.",
-            "Cycle(R/I)": "Irregular menstrual cycles are a key indicator of PCOS.",
-            "Cycle length(days)": "Abnormal cycle length can indicate hormonal imbalances.",
-            "Skin darkening (Y/N)": "Skin darkening (acanthosis nigricans) is associated with insulin resistance and PCOS.",
-            "Fast food (Y/N)": "Unhealthy diet patterns can contribute to PCOS symptoms.",
-            "Reg.Exercise(Y/N)": "Regular exercise helps manage PCOS symptoms and improve insulin sensitivity.",
-            "Pregnant(Y/N)": "Pregnancy history can be relevant to PCOS assessment.",
-            # Also match without exact formatting
-            "Age": "Age can be a factor in PCOS risk, especially for women over 30.",
-            "Weight": "Weight is a key factor in PCOS risk assessment.",
-            "Height": "Height is used to calculate BMI, which affects PCOS risk.",
-            "Cycle Regularity": "Irregular menstrual cycles are a key indicator of PCOS.",
-            "Cycle length": "Abnormal cycle length can indicate hormonal imbalances.",
-            "Skin darkening": "Skin darkening (acanthosis nigricans) is associated with insulin resistance and PCOS.",
-            "Fast food": "Unhealthy diet patterns can contribute to PCOS symptoms.",
-            "Reg.Exercise": "Regular exercise helps manage PCOS symptoms and improve insulin sensitivity.",
-            "Pregnant": "Pregnancy history can be relevant to PCOS assessment.",
-        }
-        
-        contributors = []
-        for idx in top_indices:
-            if idx < len(actual_feature_names):
-                feature_name = actual_feature_names[idx]
-                contribution = float(importances[idx])
-                # Try exact match first, then try without (Y/N) suffix, then use generic
-                explanation = explanations.get(feature_name)
-                if not explanation:
-                    # Try without (Y/N) suffix
-                    base_name = feature_name.split(" (Y/N)")[0].split("(Y/N)")[0]
-                    explanation = explanations.get(base_name)
-                if not explanation:
-                    # Try matching by partial name
-                    for key, value in explanations.items():
-                        if key.lower() in feature_name.lower() or feature_name.lower() in key.lower():
-                            explanation = value
-                            break
-                if not explanation:
-                    explanation = f"{feature_name} contributes to the risk assessment."
-                contributors.append(FeatureContributor(
-                    feature=feature_name,
-                    contribution=contribution,
-                    explanation=explanation
-                ))
-        
-        return contributors
+        importances = bundle.global_importances
+        if importances is None:
+            importances = compute_global_importances(bundle.model, features.shape[1])
+        return build_contributors(importances, get_feature_names(bundle))
     except Exception as e:
         logger.error(f"Error calculating feature importance: {e}")
         return [
@@ -312,63 +638,681 @@ def calculate_feature_importance(model, features: np.ndarray, feature_names: Lis
             ),
         ]
 
+def explain_predictions(features: np.ndarray, predictions: np.ndarray, bundle: ModelBundle,
+                        budget_ms: Optional[float] = None) -> Tuple[List[List[FeatureContributor]], List[bool]]:
+    """Per-row top contributors from SHAP, falling back to global importances
+    
+    Rows that SHAP cannot explain within the time budget (or at all) get the
+    cached global importances instead. Also returns, per row, whether the
+    explanation is final (SHAP succeeded or SHAP is not in use).
+    """
+    names = get_feature_names(bundle)
+    explainer = bundle.explainer
+    fallback = None
+    contributions = None
+    if explainer is not None:
+        contributions = explainer.explain(features, predictions, budget_ms)
+    
+    results = []
+    final = []
+    for row in range(len(features)):
+        if contributions is not None and not np.isnan(contributions[row]).any():
+            results.append(build_contributors(contributions[row], names))
+            final.append(True)
+        else:
+            if fallback is None:
+                fallback = calculate_feature_importance(bundle, features)
+            results.append(fallback)
+            final.append(explainer is None)
+    return results, final
+
+def explain_matrix(features: np.ndarray, predictions: np.ndarray, bundle: ModelBundle,
+                   budget_ms: Optional[float] = None) -> np.ndarray:
+    """Per-row importances: SHAP where explained within budget, global importances elsewhere"""
+    importances = np.empty(features.shape, dtype=np.float64)
+    importances[:] = bundle.global_importances
+    if bundle.explainer is not None:
+        contributions = bundle.explainer.explain(features, predictions, budget_ms)
+        explained = ~np.isnan(contributions).any(axis=1)
+        importances[explained] = contributions[explained]
+    return importances
+
+def render_results(predictions: np.ndarray, probabilities: np.ndarray, importances: np.ndarray,
+                   names: List[str], top_k: int = 3) -> List[Dict[str, Any]]:
+    """PredictionResult-shaped plain dicts, built without pydantic"""
+    totals = importances.sum(axis=1, keepdims=True)
+    normalized = np.divide(importances, totals, out=np.zeros_like(importances), where=totals > 0)
+    top = np.argsort(normalized, axis=1)[:, ::-1][:, :top_k]
+    results = []
+    for row in range(len(predictions)):
+        results.append({
+            "label": LABEL_MAP.get(int(predictions[row]), "No Risk"),
+            "probabilities": format_probabilities(probabilities[row]),
+            "topContributors": [
+                {
+                    "feature": names[idx],
+                    "contribution": float(normalized[row, idx]),
+                    "explanation": explain_feature(names[idx]),
+                }
+                for idx in top[row]
+                if idx < len(names)
+            ],
+        })
+    return results
+
+def score_compact(features: np.ndarray, bundle: ModelBundle,
+                  budget_ms: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Score an imputed feature matrix straight to plain dicts (no cache, no pydantic)"""
+    with metrics.stage("model", bundle.name):
+        predictions, probabilities = bundle.backend.predict(features)
+    with metrics.stage("explanation", bundle.name):
+        importances = explain_matrix(features, predictions, bundle, budget_ms)
+        return render_results(predictions, probabilities, importances, get_feature_names(bundle))
+
+def score_features(features: np.ndarray, bundle: Optional[ModelBundle] = None,
+                   budget_ms: Optional[float] = None) -> List[PredictionResult]:
+    """Score an imputed feature matrix, serving repeated rows from the cache
+    
+    Only distinct cache misses go through inference and explanation, in one
+    pass.
+    Rows whose SHAP explanation fell back to global importances are not
+    cached so a later request can still get a per-row explanation.
+    """
+    bundle = bundle or get_bundle()
+    results: List[Optional[PredictionResult]] = [None] * len(features)
+    keys = [make_cache_key(row, bundle.version) for row in features] if prediction_cache.enabled else None
+    
+    # Rows to score, and rows that repeat an earlier miss in the same matrix
+    miss_rows = []
+    duplicates = {}
+    for row in range(len(features)):
+        if keys is None:
+            miss_rows.append(row)
+            continue
+        if keys[row] in duplicates:
+            duplicates[keys[row]].append(row)
+            continue
+        cached = prediction_cache.get(keys[row])
+        if cached is not None:
+            results[row] = cached
+        else:
+            miss_rows.append(row)
+            duplicates[keys[row]] = []
+    
+    if miss_rows:
+        misses = features[miss_rows] if len(miss_rows) < len(features) else features
+        # Label is the argmax of a single probability pass
+        with metrics.stage("model", bundle.name):
+            predictions, probabilities = bundle.backend.predict(misses)
+        with metrics.stage("explanation", bundle.name):
+            contributors, final = explain_predictions(misses, predictions, bundle, budget_ms)
+        for i, row in enumerate(miss_rows):
+            result = PredictionResult(
+                label=LABEL_MAP.get(int(predictions[i]), "No Risk"),
+                probabilities=format_probabilities(probabilities[i]),
+                topContributors=contributors[i]
+            )
+            results[row] = result
+            if keys is not None:
+                for duplicate in duplicates[keys[row]]:
+                    results[duplicate] = result
+                if final[i]:
+                    prediction_cache.put(keys[row], result)
+    
+    return results
+
+async def before_deadline(awaitable):
+    """Await inference unless the caller's X-Deadline-Ms runs out first (504)
+    
+    Work still queued in the micro-batcher when the deadline passes is
+    dropped, as for a caller that went away.
+    """
+    remaining = admission.remaining_seconds()
+    if remaining is None:
+        return await awaitable
+    try:
+        if remaining <= 0:
+            raise admission.DeadlineExceeded()
+        return await asyncio.wait_for(awaitable, timeout=remaining)
+    except (admission.DeadlineExceeded, asyncio.TimeoutError):
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise HTTPException(status_code=504, detail="Deadline exceeded before the prediction was ready")
+
+def check_deadline():
+    """504 if the caller's deadline has already passed (before synchronous inference)"""
+    try:
+        admission.check_deadline()
+    except admission.DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Deadline exceeded before inference")
+
+def resolve_bundle(model_name: Optional[str], tier: Optional[str] = None) -> ModelBundle:
+    """Bundle for the requested model name or tier (default if neither), 404 if unknown
+    
+    An explicit model name wins over the tier.
+    """
+    if tier is not None:
+        tier = tier.strip().lower()
+        if tier not in MODEL_TIERS:
+            raise HTTPException(status_code=400, detail=f"Unknown model tier '{tier}'. Use one of: {', '.join(MODEL_TIERS)}")
+        if model_name is None and tier == "fast" and FAST_MODEL in registry.names():
+            model_name = FAST_MODEL
+    try:
+        bundle = get_bundle(model_name)
+    except KeyError:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown model '{model_name}'. Available: {', '.join(registry.names())}"
+        )
+    if bundle is None:
+        raise HTTPException(status_code=503, detail="Model not loaded. Please check server logs.")
+    metrics.set_model(bundle.name)
+    return bundle
+
+def require_admin(token: Optional[str]):
+    """Check the X-Admin-Token header against ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def require_profiling(token: Optional[str]):
+    """Profiling needs ENABLE_PROFILING and the admin token"""
+    if not ENABLE_PROFILING:
+        raise HTTPException(status_code=403, detail="Profiling is disabled (ENABLE_PROFILING not set)")
+    require_admin(token)
+
 @app.get("/health")
 async def health():
     """Health check endpoint"""
+    bundle = get_bundle()
     return {
         "status": "healthy",
-        "model_loaded": model is not None,
-        "imputer_loaded": imputer is not None
+        "phase": startup_state["phase"],
+        "ready": is_ready(),
+        "model_loaded": bundle is not None,
+        "imputer_loaded": bundle is not None and bundle.imputer is not None,
+        "inference_backend": bundle.backend.name if bundle is not None and bundle.backend is not None else None,
+        "explainer": bundle.explainer.stats() if bundle is not None and bundle.explainer is not None else None,
+        "model_version": bundle.version if bundle is not None else None,
+        "default_model": registry.default_name,
+        "models": registry.names(),
+        "cache": prediction_cache.stats(),
+        "scheduler": scheduler.stats() if scheduler is not None else None,
+        "admission": admission_controller.stats() if ADMISSION_CONTROL else None,
+        "reload": reload_state,
+        "startup": startup_state
     }
 
-@app.post("/predict", response_model=PredictionResult)
-async def predict(input_data: AssessmentInput):
-    """Predict PCOS risk from assessment input"""
-    if model is None:
-        raise HTTPException(status_code=503, detail="Model not loaded. Please check server logs.")
+@app.get("/ready")
+async def ready():
+    """Readiness check: 200 once models are loaded and warmed up, 503 before"""
+    body = {
+        "ready": is_ready(),
+        "phase": startup_state["phase"],
+        "error": startup_state["error"],
+        "timings_ms": startup_state["timings_ms"],
+    }
+    if not is_ready():
+        return JSONResponse(status_code=503, content=body, headers={"Retry-After": "1"})
+    return body
+
+def model_info() -> Dict[Tuple[str, ...], float]:
+    bundles = {name: get_bundle(name) for name in registry.names()}
+    return {
+        (name, bundle.version or "", bundle.backend.name if bundle.backend is not None else "",
+         str(name == registry.default_name).lower()): 1.0
+        for name, bundle in bundles.items()
+    }
+
+def scheduler_gauges(key: str) -> Dict[Tuple[str, ...], float]:
+    if scheduler is None:
+        return {}
+    stats = scheduler.stats()
+    return {(): float(stats[key])}
+
+metrics.registry.gauge(
+    "pcos_model_info", "Loaded models and their versions (value is always 1)",
+    ("model", "version", "backend", "default"), callback=model_info)
+metrics.registry.gauge(
+    "pcos_model_generation", "Number of successful model (re)loads",
+    callback=lambda: {(): float(registry.generation)})
+metrics.registry.gauge(
+    "pcos_inference_queued_rows", "Rows waiting for the micro-batcher",
+    callback=lambda: scheduler_gauges("queued"))
+metrics.registry.gauge(
+    "pcos_inference_batches_in_flight", "Micro-batches currently being scored",
+    callback=lambda: scheduler_gauges("in_flight"))
+metrics.registry.gauge(
+    "pcos_prediction_cache_entries", "Entries in the prediction cache",
+    callback=lambda: {(): float(prediction_cache.stats()["size"])})
+metrics.registry.gauge(
+    "pcos_admission_active_requests", "Prediction requests holding an admission slot",
+    callback=lambda: {(): float(admission_controller.active)})
+metrics.registry.gauge(
+    "pcos_admission_queued_requests", "Prediction requests waiting for an admission slot",
+    callback=lambda: {(): float(admission_controller.queued)})
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics (text exposition format)"""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/models")
+async def list_models():
+    """Loaded model bundles, their versions and training metrics"""
+    return dict(registry.describe(), fast=FAST_MODEL if FAST_MODEL in registry.names() else None)
+
+@app.post("/admin/reload")
+async def admin_reload(default_model: Optional[str] = None,
+                       x_admin_token: Optional[str] = Header(None)):
+    """Rediscover and reload every model under MODEL_DIR, then swap atomically
+    
+    Optionally makes `default_model` the new default. In-flight requests
+    finish on the models they started with.
+    """
+    require_admin(x_admin_token)
+    loop = asyncio.get_running_loop()
+    # Loading is CPU/IO heavy; keep it off the event loop and the inference threads
+    ok = await loop.run_in_executor(None, reload_models, default_model)
+    if not ok:
+        raise HTTPException(status_code=500, detail=reload_state["last_error"])
+    return {"reloaded": True, **registry.describe(), "duration_ms": reload_state["last_duration_ms"]}
+
+@app.get("/admin/profile")
+async def admin_profile(seconds: float = 10.0, interval_ms: float = 5.0, idle: bool = False,
+                        x_admin_token: Optional[str] = Header(None)):
+    """Sample every thread's stack for `seconds` and return collapsed stacks
+    
+    The output feeds flamegraph.pl, speedscope or inferno directly. Idle
+    threads (event loop waiting, inference threads without work) are left
+    out unless `idle` is set.
+    """
+    require_profiling(x_admin_token)
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]")
+    loop = asyncio.get_running_loop()
+    try:
+        # The sampler needs its own thread; the event loop keeps serving meanwhile
+        sampler = await loop.run_in_executor(None, profiler.sample, seconds, interval_ms, idle)
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(sampler.collapsed(), headers={"X-Profile-Samples": str(sampler.samples)})
+
+async def profiled_predict(input_data: AssessmentInput, bundle: ModelBundle, sort: str) -> JSONResponse:
+    """Score one assessment under cProfile and return the result with the report
+    
+    The whole pipeline runs in one call on an inference thread so cProfile
+    sees it; SHAP runs on the explainer's own thread and shows up as the
+    wait inside explain(). Cache hits are profiled as cache hits.
+    """
+    def pipeline():
+        return score_features(transform_input(input_data, bundle), bundle, EXPLANATION_BUDGET_MS)[0]
+    
+    if scheduler is not None and scheduler.running:
+        result, report = await scheduler.run(partial(profiler.profile_call, pipeline, sort=sort))
+    else:
+        result, report = profiler.profile_call(pipeline, sort=sort)
+    return JSONResponse({"result": result.model_dump(), "profile": report})
+
+async def predict_with(input_data: AssessmentInput, bundle: ModelBundle,
+                       profile: Optional[str] = None) -> PredictionResult:
+    """Score one assessment with the given model bundle
     
+    With `profile` (a pstats sort key, or any true value) the response
+    is {"result": ..., "profile": "<pstats report>"} instead.
+    """
     try:
+        if profile:
+            return await profiled_predict(input_data, bundle, profile.strip().lower())
+        
         # Transform input
-        features = transform_input(input_data)
+        features = transform_input(input_data, bundle)
         
         # Validate feature shape
-        expected_features = 10
-        if features.shape[1] != expected_features:
-            logger.error(f"Feature shape mismatch: expected {expected_features}, got {features.shape[1]}. Features: {features}")
+        if features.shape[1] != EXPECTED_FEATURES:
+            logger.error(f"Feature shape mismatch: expected {EXPECTED_FEATURES}, got {features.shape[1]}. Features: {features}")
             raise HTTPException(
                 status_code=400, 
-                detail=f"Feature shape mismatch: expected {expected_features}, got {features.shape[1]}"
+                detail=f"Feature shape mismatch: expected {EXPECTED_FEATURES}, got {features.shape[1]}"
             )
         
-        # Make prediction
-        prediction = model.predict(features)[0]
-        probabilities = model.predict_proba(features)[0]
-        
-        # Map prediction to label
-        # Adjust based on your model's class mapping
-        label_map = {0: "No Risk", 1: "Early", 2: "High"}
-        label = label_map.get(int(prediction), "No Risk")
-        
-        # Format probabilities
-        prob_dict = {
-            "NoRisk": float(probabilities[0]) if len(probabilities) > 0 else 0.0,
-            "Early": float(probabilities[1]) if len(probabilities) > 1 else 0.0,
-            "High": float(probabilities[2]) if len(probabilities) > 2 else 0.0,
-        }
-        
-        # Calculate feature importance
-        feature_names_list = feature_names if isinstance(feature_names, list) else []
-        top_contributors = calculate_feature_importance(model, features, feature_names_list)
-        
-        return PredictionResult(
-            label=label,
-            probabilities=prob_dict,
-            topContributors=top_contributors
-        )
+        # Predict and explain (or serve a cached result for identical features),
+        # coalesced with concurrent requests for the same model and run off the event loop
+        if scheduler is not None and scheduler.running:
+            return await before_deadline(scheduler.submit(features[0], bundle))
+        check_deadline()
+        return score_features(features, bundle)[0]
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Prediction error: {e}")
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+@app.post("/predict", response_model=PredictionResult)
+async def predict(input_data: AssessmentInput, x_model: Optional[str] = Header(None),
+                  x_model_tier: Optional[str] = Header(None), x_profile: Optional[str] = Header(None),
+                  x_admin_token: Optional[str] = Header(None)):
+    """Predict PCOS risk from assessment input
+    
+    Uses the default model unless the X-Model header names another one, or
+    X-Model-Tier: fast asks for the distilled fast-tier model. X-Profile
+    (with the admin token) returns a cProfile report for this call.
+    """
+    metrics.handler_started()
+    if x_profile:
+        require_profiling(x_admin_token)
+    await wait_until_ready()
+    result = await predict_with(input_data, resolve_bundle(x_model, x_model_tier), x_profile)
+    metrics.handler_finished()
+    return result
+
+@app.post("/models/{model_name}/predict", response_model=PredictionResult)
+async def predict_with_model(model_name: str, input_data: AssessmentInput,
+                             x_profile: Optional[str] = Header(None),
+                             x_admin_token: Optional[str] = Header(None)):
+    """Predict PCOS risk with a specific model"""
+    metrics.handler_started()
+    if x_profile:
+        require_profiling(x_admin_token)
+    await wait_until_ready()
+    result = await predict_with(input_data, resolve_bundle(model_name), x_profile)
+    metrics.handler_finished()
+    return result
+
+def parse_compact_body(body: bytes, content_type: str, n_features: int) -> Tuple[np.ndarray, bool]:
+    """Decode positional feature vectors into an (n, n_features) matrix
+    
+    Accepts one vector or a list of vectors as JSON or MessagePack, or one
+    vector per line as NDJSON; null means missing. Returns the matrix and
+    whether the body was a single vector.
+    """
+    if content_type in MSGPACK_CONTENT_TYPES:
+        try:
+            import msgpack
+        except ImportError:
+            raise HTTPException(status_code=415, detail="MessagePack support is not installed (pip install msgpack)")
+        data = msgpack.unpackb(body)
+    elif content_type == NDJSON_CONTENT_TYPE:
+        data = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        data = json.loads(body)
+    
+    single = isinstance(data, list) and len(data) > 0 and not isinstance(data[0], list)
+    # numpy turns null/None into NaN for float arrays
+    matrix = np.array([data] if single else data, dtype=np.float64)
+    if matrix.ndim != 2 or matrix.shape[1] != n_features or len(matrix) == 0:
+        raise ValueError(f"Expected vectors of {n_features} numbers, got shape {matrix.shape}")
+    if np.isinf(matrix).any():
+        raise ValueError("Feature values must be finite (use null for missing)")
+    return matrix, single
+
+@app.post("/predict/compact")
+async def predict_compact(request: Request, x_model: Optional[str] = Header(None),
+                          x_model_tier: Optional[str] = Header(None)):
+    """Score positional feature vectors for trusted internal callers
+    
+    The body holds the model's raw features in feature spec order (see
+    GET /models), as JSON, MessagePack or NDJSON. Imputation and scaling
+    are applied as for /predict, but the 27-field assessment model and the
+    pydantic response models are skipped; results are serialized directly,
+    as MessagePack if the Accept header asks for it. A single vector
+    returns one result, a list of vectors returns a list.
+    """
+    metrics.handler_started()
+    await wait_until_ready()
+    bundle = resolve_bundle(x_model, x_model_tier)
+    
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    started = time.perf_counter()
+    try:
+        matrix, single = parse_compact_body(await request.body(), content_type, bundle.encoder.n_features)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Invalid compact body: {str(e)}")
+    metrics.add_validation(time.perf_counter() - started)
+    
+    if len(matrix) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(matrix)} rows (max {MAX_BATCH_SIZE})"
+        )
+    
+    try:
+        features = impute_features(bundle.encoder.finish(matrix), bundle)
+        if scheduler is not None and scheduler.running:
+            if single:
+                # Coalesced with other compact rows, like /predict
+                results = [await before_deadline(scheduler.submit(features[0], bundle, score_compact))]
+            else:
+                check_deadline()
+                results = await before_deadline(
+                    scheduler.run(score_compact, features, bundle, EXPLANATION_BATCH_BUDGET_MS))
+        else:
+            check_deadline()
+            results = score_compact(features, bundle)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Compact prediction error: {e}")
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+    
+    payload = results[0] if single else results
+    metrics.handler_finished()
+    accept = request.headers.get("accept", "")
+    if any(media_type in accept for media_type in MSGPACK_CONTENT_TYPES):
+        try:
+            import msgpack
+            return Response(content=msgpack.packb(payload), media_type=MSGPACK_CONTENT_TYPES[0])
+        except ImportError:
+            pass
+    return Response(content=json.dumps(payload, separators=(",", ":")), media_type="application/json")
+
+async def predict_rows(rows: List[Dict[str, Any]], bundle: ModelBundle) -> List[BatchPredictionItem]:
+    """Validate, encode and score raw assessment dicts, one item per row in order
+    
+    Shared by /predict/batch and the gRPC PredictBatch call.
+    """
+    items = [BatchPredictionItem(index=i) for i in range(len(rows))]
+    
+    # Validate and encode each row, collecting per-row errors
+    valid_indices = []
+    assessments = []
+    started = time.perf_counter()
+    for i, raw in enumerate(rows):
+        try:
+            assessments.append(AssessmentInput.model_validate(raw))
+            valid_indices.append(i)
+        except ValidationError as e:
+            problems = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+            items[i].error = f"Invalid assessment: {problems}"
+    metrics.add_validation(time.perf_counter() - started)
+    
+    if assessments:
+        try:
+            # Valid rows are encoded together, column by column
+            features = transform_batch(assessments, bundle)
+            
+            # Cache misses get one model call and one vectorized SHAP pass
+            check_deadline()
+            if scheduler is not None and scheduler.running:
+                results = await before_deadline(
+                    scheduler.run(score_features, features, bundle, EXPLANATION_BATCH_BUDGET_MS))
+            else:
+                results = score_features(features, bundle, EXPLANATION_BATCH_BUDGET_MS)
+            
+            for row, i in enumerate(valid_indices):
+                items[i].result = results[row]
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Batch prediction error: {e}")
+            raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+    
+    return items
+
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_batch(request: BatchPredictionRequest, x_model: Optional[str] = Header(None),
+                        x_model_tier: Optional[str] = Header(None)):
+    """Score many assessments with a single model call
+    
+    Rows are validated individually so one bad row does not fail the whole
+    batch; valid rows are encoded into one matrix and scored with a single
+    model call. Results are returned in input order.
+    """
+    metrics.handler_started()
+    await wait_until_ready()
+    bundle = resolve_bundle(x_model, x_model_tier)
+    
+    if len(request.assessments) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.assessments)} rows (max {MAX_BATCH_SIZE})"
+        )
+    
+    items = await predict_rows(request.assessments, bundle)
+    
+    succeeded = sum(item.result is not None for item in items)
+    metrics.handler_finished()
+    return BatchPredictionResponse(
+        results=items,
+        succeeded=succeeded,
+        failed=len(items) - succeeded
+    )
+
+class NDJSONStreamResponse(StreamingResponse):
+    """Streams chunks from an async iterator that is itself reading the request body
+    
+    Starlette's StreamingResponse listens for client disconnect while
+    streaming, which consumes request body messages meant for the iterator.
+    Here only the iterator calls receive(); a disconnect surfaces as the
+    body ending or a failed send.
+    """
+    media_type = "application/x-ndjson"
+    
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        try:
+            async for chunk in self.body_iterator:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        except OSError:
+            # Client went away mid-stream
+            return
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+async def iter_ndjson_lines(request: Request, max_line_bytes: int):
+    """Yield the request body's lines as they arrive, without buffering the whole body
+    
+    Blank lines are skipped. A line longer than max_line_bytes is dropped
+    and yielded as None so the caller can report it.
+    """
+    buffer = bytearray()
+    overlong = False
+    async for chunk in request.stream():
+        buffer += chunk
+        start = 0
+        while True:
+            newline = buffer.find(b"\n", start)
+            if newline < 0:
+                break
+            line = bytes(buffer[start:newline]).strip()
+            start = newline + 1
+            if overlong:
+                overlong = False
+                yield None
+            elif line:
+                yield line if len(line) <= max_line_bytes else None
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            # Keep discarding until the end of this line
+            overlong = True
+            buffer.clear()
+    line = bytes(buffer).strip()
+    if overlong:
+        yield None
+    elif line:
+        yield line if len(line) <= max_line_bytes else None
+
+def parse_stream_row(line: Optional[bytes]) -> AssessmentInput:
+    if line is None:
+        raise ValueError(f"Line exceeds {STREAM_MAX_LINE_BYTES} bytes")
+    try:
+        raw = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"Malformed JSON: {e}")
+    try:
+        return AssessmentInput.model_validate(raw)
+    except ValidationError as e:
+        problems = "; ".join(
+            f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+        )
+        raise ValueError(f"Invalid assessment: {problems}")
+
+def stream_error(index: int, message: str) -> bytes:
+    return json.dumps({"index": index, "error": message}, separators=(",", ":")).encode() + b"\n"
+
+async def score_stream_chunk(chunk: List[Tuple[int, Optional[bytes]]], bundle: ModelBundle) -> bytes:
+    """Parse, score and serialize one chunk of NDJSON lines"""
+    out = []
+    valid = []
+    assessments = []
+    for index, line in chunk:
+        try:
+            assessments.append(parse_stream_row(line))
+            valid.append(index)
+        except ValueError as e:
+            out.append((index, stream_error(index, str(e))))
+    
+    if assessments:
+        try:
+            features = transform_batch(assessments, bundle)
+            if scheduler is not None and scheduler.running:
+                results = await scheduler.run(score_features, features, bundle, EXPLANATION_BATCH_BUDGET_MS)
+            else:
+                results = score_features(features, bundle, EXPLANATION_BATCH_BUDGET_MS)
+            for index, result in zip(valid, results):
+                out.append((index, b'{"index":%d,"result":%s}\n' % (index, result.model_dump_json().encode())))
+        except Exception as e:
+            logger.error(f"Stream chunk scoring error: {e}")
+            out.extend((index, stream_error(index, f"Prediction failed: {str(e)}")) for index in valid)
+    
+    out.sort(key=lambda item: item[0])
+    return b"".join(line for _, line in out)
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request, x_model: Optional[str] = Header(None),
+                         x_model_tier: Optional[str] = Header(None)):
+    """Score an NDJSON body of assessments, streaming NDJSON results back
+    
+    Rows are read, scored and written in chunks of STREAM_CHUNK_ROWS, so
+    memory stays flat however large the body is; the next chunk is only read
+    once the previous one has been sent. Each output line is
+    {"index": n, "result": {...}} or {"index": n, "error": "..."}, in input
+    order, where n counts non-blank input lines from 0. A bad row gets an
+    error line and the stream continues.
+    """
+    metrics.handler_started()
+    await wait_until_ready()
+    bundle = resolve_bundle(x_model, x_model_tier)
+    
+    async def generate():
+        chunk = []
+        index = 0
+        async for line in iter_ndjson_lines(request, STREAM_MAX_LINE_BYTES):
+            chunk.append((index, line))
+            index += 1
+            if len(chunk) >= STREAM_CHUNK_ROWS:
+                yield await score_stream_chunk(chunk, bundle)
+                chunk = []
+        if chunk:
+            yield await score_stream_chunk(chunk, bundle)
+    
+    return NDJSONStreamResponse(generate())
+
 if __name__ == "__main__":
     import uvicorn
     # Use PORT environment variable (Cloud Run provides this) or default to 8000 for local
@@ -0,0 +1,370 @@
+"""
+Prometheus metrics for the PCOS prediction service
+
+A small, dependency-free implementation of counters, gauges and histograms
+rendered in the Prometheus text exposition format (version 0.0.4), plus an
+ASGI middleware that times each request and splits it into stages:
+
+- queue:          waiting for an admission slot (gated paths only; also
+                  recorded for requests shed while queued)
+- validation:     request start until the endpoint runs (body parsing and
+                  pydantic validation) minus the queue wait, plus per-row
+                  validation in batches
+- serialization:  endpoint return until the response starts (response model
+                  validation and JSON encoding)
+- transform_input, imputer, model, explanation: timed inside the pipeline
+
+Metrics are per process: under serve.py each worker keeps its own, and the
+`pid` in process metrics tells them apart.
+"""
+
+import contextvars
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Starlette appends "; charset=utf-8"
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds; stages range from microseconds (encoding) to the SHAP budget
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    """Base class: a named metric family with a fixed set of label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _current(self) -> Dict[Tuple[str, ...], float]:
+        """{label values: value}, from the callback when the metric has one"""
+        if getattr(self, "callback", None) is not None:
+            try:
+                return self.callback()
+            except Exception:
+                return {}
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(suffix, formatted labels, value) triples"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Counter incremented directly, or read at scrape time from a callback
+
+    A callback (as for Gauge) suits totals kept elsewhere, such as the
+    process's CPU time; it must only ever grow.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(),
+                 callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        for key, value in sorted(self._current().items()):
+            yield "", _format_labels(self.labelnames, key), value
+
+
+class Gauge(Metric):
+    """Gauge set directly, or computed at scrape time by a callback
+
+    The callback returns {label values tuple: value}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(),
+                 callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        for key, value in sorted(self._current().items()):
+            yield "", _format_labels(self.labelnames, key), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # First bucket whose upper bound holds the value; counts are made cumulative on render
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            state[index] += 1
+            state[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                yield "_bucket", _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"'), cumulative
+            yield "_sum", _format_labels(self.labelnames, key), state[-1]
+            yield "_count", _format_labels(self.labelnames, key), cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), callback=None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, callback))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def process_rss_bytes() -> float:
+    """Current resident set size, falling back to the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return float(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is KiB on Linux
+        return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "pcos_stage_duration_seconds", "Time spent in each prediction pipeline stage", ("stage", "model"))
+REQUEST_SECONDS = registry.histogram(
+    "pcos_http_request_duration_seconds", "End-to-end HTTP request latency", ("method", "path"))
+REQUESTS = registry.counter(
+    "pcos_http_requests_total", "HTTP requests by response status", ("method", "path", "status"))
+ERRORS = registry.counter(
+    "pcos_http_request_errors_total", "HTTP requests that ended in a 4xx/5xx status", ("method", "path", "status"))
+IN_FLIGHT = registry.gauge(
+    "pcos_http_requests_in_flight", "HTTP requests currently being handled")
+registry.gauge(
+    "process_resident_memory_bytes", "Resident memory size in bytes", ("pid",),
+    callback=lambda: {(str(os.getpid()),): process_rss_bytes()})
+registry.counter(
+    "process_cpu_seconds_total", "User and system CPU time spent in seconds", ("pid",),
+    callback=lambda: {(str(os.getpid()),): time.process_time()})
+
+
+class RequestTimer:
+    """Per-request timestamps shared between the middleware and the endpoint"""
+
+    __slots__ = ("started", "handler_started", "handler_finished", "model", "extra_validation", "queue_wait")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.handler_started: Optional[float] = None
+        self.handler_finished: Optional[float] = None
+        self.model = ""
+        self.extra_validation = 0.0
+        # Set by admission control for gated requests
+        self.queue_wait: Optional[float] = None
+
+
+_current: contextvars.ContextVar[Optional[RequestTimer]] = contextvars.ContextVar("request_timer", default=None)
+
+
+def current_timer() -> Optional[RequestTimer]:
+    return _current.get()
+
+
+def handler_started():
+    """Mark the start of the endpoint body (ends the validation stage)"""
+    timer = _current.get()
+    if timer is not None:
+        timer.handler_started = time.perf_counter()
+
+
+def set_model(model: str):
+    """Label the request's validation and serialization stages with its model"""
+    timer = _current.get()
+    if timer is not None:
+        timer.model = model
+
+
+def handler_finished():
+    """Mark the endpoint's return (starts the serialization stage)"""
+    timer = _current.get()
+    if timer is not None:
+        timer.handler_finished = time.perf_counter()
+
+
+def add_validation(seconds: float):
+    """Count validation done inside the endpoint (e.g. per batch row) towards the request's validation stage"""
+    timer = _current.get()
+    if timer is not None:
+        timer.extra_validation += seconds
+
+
+def set_queue_wait(seconds: float):
+    """Record the time the request waited for admission (its queue stage)"""
+    timer = _current.get()
+    if timer is not None:
+        timer.queue_wait = seconds
+
+
+def observe_stage(stage: str, seconds: float, model: str = ""):
+    STAGE_SECONDS.observe(seconds, stage=stage, model=model)
+
+
+@contextmanager
+def stage(name: str, model: str = ""):
+    """Time a block as one pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name, model=model)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests
+
+    Paths are reported as route templates (e.g. /models/{model_name}/predict)
+    so the label set stays bounded.
+    """
+
+    def __init__(self, app, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+        self._route_paths: Dict[Callable, str] = {}
+
+    def _route_path(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            for route in getattr(scope.get("app"), "routes", []):
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = route.path
+                    break
+            path = self._route_paths[endpoint] = path or "unmatched"
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        timer = RequestTimer()
+        token = _current.set(timer)
+        status = {"code": 500, "started": None}
+        IN_FLIGHT.inc()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                status["started"] = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            IN_FLIGHT.dec()
+            finished = time.perf_counter()
+            method = scope.get("method", "")
+            path = self._route_path(scope)
+            code = str(status["code"])
+            REQUESTS.inc(method=method, path=path, status=code)
+            if status["code"] >= 400:
+                ERRORS.inc(method=method, path=path, status=code)
+            REQUEST_SECONDS.observe(finished - timer.started, method=method, path=path)
+            queue_wait = timer.queue_wait or 0.0
+            if timer.queue_wait is not None:
+                STAGE_SECONDS.observe(timer.queue_wait, stage="queue", model=timer.model)
+            if timer.handler_started is not None:
+                STAGE_SECONDS.observe(timer.handler_started - timer.started - queue_wait + timer.extra_validation,
+                                      stage="validation", model=timer.model)
+            if timer.handler_finished is not None and status["started"] is not None:
+                STAGE_SECONDS.observe(status["started"] - timer.handler_finished,
+                                      stage="serialization", model=timer.model)
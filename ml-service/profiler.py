@@ -0,0 +1,129 @@
+"""
+On-demand profiling for the PCOS prediction service
+
+Two tools, both behind the admin token and ENABLE_PROFILING:
+
+- StackSampler: a statistical sampler that wakes every few milliseconds,
+  reads every thread's Python stack with sys._current_frames() and counts
+  identical stacks. Output is in the collapsed-stack format read by
+  flamegraph.pl, speedscope and inferno:
+
+      MainThread;main.py:predict;main.py:predict_with;... 42
+
+  The sampled threads are never stopped or traced, so the cost is one
+  stack walk per thread per interval, paid by the sampler thread.
+
+- profile_call: runs one function under cProfile and returns its result
+  with a pstats report, for a detailed look at a single request.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Leaf frames of threads waiting for work; skipped unless idle stacks are requested
+IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+    ("base_events.py", "_run_once"),
+}
+
+SORT_KEYS = ("cumulative", "tottime", "calls")
+
+
+class ProfilerBusy(RuntimeError):
+    """Another sampling session is already running"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """Samples all threads' stacks at a fixed interval and counts collapsed stacks"""
+
+    def __init__(self, interval_ms: float = 5.0, include_idle: bool = False, max_depth: int = 128):
+        self.interval = max(0.5, interval_ms) / 1000.0
+        self.include_idle = include_idle
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def _sample_once(self, own_ident: int, names: Dict[int, str]):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            if not self.include_idle:
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                    continue
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, f"thread-{ident}"))
+            # Collapsed stacks go root first; ';' separates frames
+            self.stacks[";".join(reversed(labels)).replace(" ", "_")] += 1
+        self.samples += 1
+
+    def run(self, seconds: float) -> "StackSampler":
+        """Sample for `seconds` on the calling thread (run it off the event loop)"""
+        own_ident = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        next_sample = time.perf_counter()
+        names: Dict[int, str] = {}
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if self.samples % 50 == 0:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self._sample_once(own_ident, names)
+            next_sample += self.interval
+            time.sleep(max(0.0, next_sample - time.perf_counter()))
+        return self
+
+    def collapsed(self) -> str:
+        """Collapsed-stack text, most frequent stacks first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+_session_lock = threading.Lock()
+
+
+def sample(seconds: float, interval_ms: float = 5.0, include_idle: bool = False) -> StackSampler:
+    """Run one sampling session; raises ProfilerBusy if another is in progress"""
+    if not _session_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profiling session is already running")
+    try:
+        return StackSampler(interval_ms, include_idle).run(seconds)
+    finally:
+        _session_lock.release()
+
+
+def profile_call(fn: Callable[..., Any], *args, sort: str = "cumulative",
+                 limit: Optional[int] = 40) -> Tuple[Any, str]:
+    """Call fn(*args) under cProfile; returns (result, pstats report)
+
+    Only the calling thread is profiled.
+    """
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        result = fn(*args)
+    finally:
+        profile.disable()
+    report = io.StringIO()
+    stats = pstats.Stats(profile, stream=report)
+    stats.strip_dirs().sort_stats(sort if sort in SORT_KEYS else "cumulative").print_stats(limit)
+    return result, report.getvalue()
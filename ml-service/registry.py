@@ -0,0 +1,389 @@
+"""
+Model registry for the PCOS prediction service
+
+Discovers every model bundle under MODEL_DIR and keeps them loaded side by
+side so callers can pick a model per request:
+
+- "basic":  basic_pcos_model.pkl + basic_imputer.pkl + basic_features.pkl
+- "<name>": <name>.artifact directories (see artifact.py), preferred when
+            present, or <name>_model.pkl bundles; model_comparison.py writes
+            both. Pickles are a dict with the fitted sklearn 'pipeline'
+            (impute -> scale -> model) and 'metrics'; older ones hold
+            'model', 'imputer' and 'scaler' separately
+
+Artifacts carry their feature spec in the manifest. Pickled bundles take it
+from <name>_feature_spec.json next to them (see feature_encoder.py); bundles
+without one use the legacy encoding.
+
+Reloading builds and warms up a complete new set of bundles first, then swaps
+it in with a single reference assignment. Requests already holding a bundle
+finish on it; new requests see the new set. If the default model fails to
+load, the current set stays in place.
+"""
+
+import glob
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from artifact import ARTIFACT_SUFFIX, load_artifact
+from explainer import BudgetedExplainer, build_tree_explainer, compute_global_importances
+from feature_encoder import LEGACY_SPEC, FeatureEncoder, FeatureSpec, FeatureSpecError, spec_path_for
+from inference import InferenceBackend, create_backend
+
+logger = logging.getLogger(__name__)
+
+BASIC_MODEL_NAME = "basic"
+BASIC_MODEL_FILE = "basic_pcos_model.pkl"
+BUNDLE_SUFFIX = "_model.pkl"
+
+
+def file_sha256(path: str) -> str:
+    """Hex SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelBundle:
+    """A loaded model with its preprocessing, inference backend and explainer"""
+
+    def __init__(self, name: str, model, imputer=None, scaler=None,
+                 feature_names: Optional[List[str]] = None, metrics: Optional[dict] = None,
+                 version: Optional[str] = None, source: Optional[str] = None,
+                 feature_spec: Optional[FeatureSpec] = None, preprocessor=None,
+                 backend: Optional[InferenceBackend] = None):
+        self.name = name
+        self.model = model
+        self.imputer = imputer
+        self.scaler = scaler
+        # Fitted pipeline prefix (impute, then scale) of pipeline bundles
+        self.preprocessor = preprocessor
+        self.feature_names = feature_names
+        self.metrics = metrics or {}
+        # Model version keys the prediction cache, so a new model never serves stale results
+        self.version = version
+        self.source = source
+        self.feature_spec = feature_spec or LEGACY_SPEC
+        self.encoder: FeatureEncoder = self.feature_spec.compile()
+        # Artifacts of tree ensembles load straight into the compiled backend
+        self.backend: Optional[InferenceBackend] = backend
+        self.prebuilt_backend = backend is not None
+        self.explainer: Optional[BudgetedExplainer] = None
+        self.global_importances: Optional[np.ndarray] = None
+        self.timings_ms: Dict[str, float] = {}
+
+    def record_timing(self, name: str, started: float):
+        self.timings_ms[name] = round((time.perf_counter() - started) * 1000, 2)
+
+    def preprocess(self, features: np.ndarray) -> np.ndarray:
+        """Impute and scale an encoded feature matrix the way the model was trained
+
+        Pipeline bundles impute, then scale; older bundles scaled first and
+        imputed scaled data, so they are served in that order. Steps the
+        feature spec already applied while encoding are skipped.
+        """
+        if self.preprocessor is not None:
+            if self.encoder.imputes and (self.scaler is None or self.encoder.scales):
+                return features
+            return self.preprocessor.transform(features)
+        if self.scaler is not None and not self.encoder.scales:
+            features = self.scaler.transform(features)
+        if self.encoder.imputes:
+            return features
+        # Apply imputer if available, otherwise fill NaN with 0
+        if self.imputer is not None:
+            try:
+                return self.imputer.transform(features)
+            except Exception as e:
+                # If imputer fails (e.g., not fitted), fall back to NaN filling
+                logger.warning(f"Imputer transform failed, using fallback: {e}")
+                return np.nan_to_num(features, nan=0.0)
+        # Fill NaN values with 0 if no imputer available
+        return np.nan_to_num(features, nan=0.0)
+
+    def prepare(self, inference_backend: str, enable_shap: bool,
+                explanation_budget_ms: float, n_features: int):
+        """Build the inference backend, cached importances and explainer"""
+        if self.feature_spec.n_features != n_features:
+            raise FeatureSpecError(
+                f"[{self.name}] Feature spec has {self.feature_spec.n_features} features, "
+                f"service expects {n_features}"
+            )
+        if not self.prebuilt_backend:
+            started = time.perf_counter()
+            self.backend = create_backend(self.model, inference_backend, n_features=n_features)
+            self.record_timing("backend_build", started)
+        logger.info(f"✅ [{self.name}] Inference backend: {self.backend.name}")
+
+        # Cache global importances once; they are the fallback for explanations
+        self.global_importances = compute_global_importances(self.model, n_features)
+
+        # Build the SHAP explainer once so requests only pay for shap_values
+        self.explainer = None
+        if enable_shap:
+            started = time.perf_counter()
+            tree_explainer = build_tree_explainer(self.model)
+            if tree_explainer is not None:
+                self.explainer = BudgetedExplainer(tree_explainer, explanation_budget_ms)
+                logger.info(f"✅ [{self.name}] SHAP explainer ready (budget {explanation_budget_ms:.0f} ms)")
+            self.record_timing("explainer_build", started)
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "model_type": getattr(self.model, "model_type", type(self.model).__name__),
+            "source": self.source,
+            "inference_backend": self.backend.name if self.backend is not None else None,
+            "imputer_loaded": self.imputer is not None,
+            "scaler_loaded": self.scaler is not None,
+            "feature_spec": self.feature_spec is not LEGACY_SPEC,
+            "features": self.feature_spec.names,
+            "explainer": self.explainer is not None,
+            "metrics": {k: float(v) for k, v in self.metrics.items() if isinstance(v, (int, float))},
+        }
+
+
+def load_feature_spec(model_dir: str, name: str) -> Optional[FeatureSpec]:
+    """The bundle's feature spec, or None if it has none (legacy encoding)"""
+    path = spec_path_for(model_dir, name)
+    if not os.path.exists(path):
+        return None
+    spec = FeatureSpec.load(path)
+    logger.info(f"✅ [{name}] Feature spec loaded from {path}")
+    return spec
+
+
+def load_basic_bundle(model_dir: str) -> ModelBundle:
+    """Load the trained model, imputer, and feature names (three separate pickles)"""
+    model_path = os.path.join(model_dir, BASIC_MODEL_FILE)
+    imputer_path = os.path.join(model_dir, "basic_imputer.pkl")
+    features_path = os.path.join(model_dir, "basic_features.pkl")
+
+    logger.info(f"Loading model from {model_path}")
+    started = time.perf_counter()
+    with open(model_path, "rb") as f:
+        model = pickle.load(f)
+    model_load_ms = round((time.perf_counter() - started) * 1000, 2)
+    logger.info(f"✅ Model loaded: {type(model)}")
+
+    # Try to load imputer (may fail due to pickle version incompatibility)
+    imputer = None
+    started = time.perf_counter()
+    try:
+        logger.info(f"Loading imputer from {imputer_path}")
+        with open(imputer_path, "rb") as f:
+            loaded_imputer = pickle.load(f)
+
+        # Check if imputer is fitted
+        if hasattr(loaded_imputer, 'statistics_') and loaded_imputer.statistics_ is not None:
+            imputer = loaded_imputer
+            logger.info(f"✅ Imputer loaded and fitted: {type(imputer)}")
+        else:
+            logger.warning("⚠️ Imputer loaded but not fitted, will skip imputation")
+    except Exception as e:
+        # Fallback: no imputer, missing values are filled with 0 in preprocess
+        logger.warning(f"⚠️ Could not load imputer (will skip imputation): {e}")
+    imputer_load_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    # Try to load feature names
+    feature_names = None
+    try:
+        logger.info(f"Loading features from {features_path}")
+        with open(features_path, "rb") as f:
+            feature_names = pickle.load(f)
+        logger.info(f"✅ Features loaded: {type(feature_names)}")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load feature names: {e}")
+
+    bundle = ModelBundle(
+        BASIC_MODEL_NAME, model, imputer=imputer,
+        feature_names=feature_names if isinstance(feature_names, list) else None,
+        version=file_sha256(model_path)[:12], source=model_path,
+        feature_spec=load_feature_spec(model_dir, BASIC_MODEL_NAME),
+    )
+    bundle.timings_ms["model_load"] = model_load_ms
+    bundle.timings_ms["imputer_load"] = imputer_load_ms
+    return bundle
+
+
+def load_training_bundle(name: str, path: str) -> ModelBundle:
+    """Load a {'pipeline', 'metrics'} (or older {'model', 'imputer', 'scaler', 'metrics'})
+    bundle from model_comparison.py"""
+    logger.info(f"Loading model bundle '{name}' from {path}")
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        payload = pickle.load(f)
+    model_load_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    if not isinstance(payload, dict) or not ("pipeline" in payload or "model" in payload):
+        raise ValueError(f"{path} is not a model bundle (expected a dict with a 'pipeline' or 'model' key)")
+
+    parts = {"imputer": payload.get("imputer"), "scaler": payload.get("scaler")}
+    if "pipeline" in payload:
+        pipeline = payload["pipeline"]
+        steps = dict(pipeline.steps)
+        parts = {
+            "imputer": steps.get("impute"),
+            "scaler": steps.get("scale") if steps.get("scale") not in (None, "passthrough") else None,
+            "preprocessor": pipeline[:-1],
+        }
+        model = pipeline[-1]
+    else:
+        model = payload["model"]
+    bundle = ModelBundle(
+        name, model, metrics=payload.get("metrics"), version=file_sha256(path)[:12], source=path,
+        feature_spec=load_feature_spec(os.path.dirname(path), name), **parts,
+    )
+    bundle.timings_ms["model_load"] = model_load_ms
+    logger.info(f"✅ [{name}] Loaded {type(bundle.model).__name__}")
+    return bundle
+
+
+def load_artifact_bundle(name: str, path: str) -> ModelBundle:
+    """Load a <name>.artifact directory; raises ArtifactError if it is corrupt or incompatible"""
+    logger.info(f"Loading model artifact '{name}' from {path}")
+    loaded = load_artifact(path)
+    bundle = ModelBundle(
+        name, loaded.model, metrics=loaded.metrics, version=loaded.version, source=path,
+        feature_spec=loaded.feature_spec, backend=loaded.backend,
+    )
+    bundle.timings_ms["model_load"] = loaded.load_ms
+    logger.info(f"✅ [{name}] Loaded {loaded.manifest['model_type']} ({loaded.manifest['kind']} artifact, "
+                f"{loaded.load_ms} ms)")
+    return bundle
+
+
+class ModelRegistry:
+    """Holds every loaded bundle and swaps them atomically on reload"""
+
+    def __init__(self, model_dir: str, default_name: Optional[str] = None,
+                 inference_backend: str = "auto", enable_shap: bool = True,
+                 explanation_budget_ms: float = 50.0, n_features: int = 10):
+        self.model_dir = model_dir
+        self.requested_default = default_name
+        self.inference_backend = inference_backend
+        self.enable_shap = enable_shap
+        self.explanation_budget_ms = explanation_budget_ms
+        self.n_features = n_features
+        # (bundles by name, default name) is replaced as a whole, never mutated
+        self._state: Tuple[Dict[str, ModelBundle], Optional[str]] = ({}, None)
+        self._reload_lock = threading.Lock()
+        self.generation = 0
+        self.loaded_at: Optional[float] = None
+
+    def discover(self) -> Dict[str, str]:
+        """Map bundle name -> file path for everything under model_dir
+
+        An artifact directory wins over a pickle of the same name.
+        """
+        found = {}
+        if os.path.exists(os.path.join(self.model_dir, BASIC_MODEL_FILE)):
+            found[BASIC_MODEL_NAME] = os.path.join(self.model_dir, BASIC_MODEL_FILE)
+        for path in sorted(glob.glob(os.path.join(self.model_dir, f"*{BUNDLE_SUFFIX}"))):
+            filename = os.path.basename(path)
+            if filename == BASIC_MODEL_FILE:
+                continue
+            found[filename[:-len(BUNDLE_SUFFIX)]] = path
+        for path in sorted(glob.glob(os.path.join(self.model_dir, f"*{ARTIFACT_SUFFIX}"))):
+            if os.path.isdir(path):
+                found[os.path.basename(path)[:-len(ARTIFACT_SUFFIX)]] = path
+        return found
+
+    def _load_one(self, name: str, path: str) -> ModelBundle:
+        if path.endswith(ARTIFACT_SUFFIX):
+            bundle = load_artifact_bundle(name, path)
+        elif name == BASIC_MODEL_NAME:
+            bundle = load_basic_bundle(self.model_dir)
+        else:
+            bundle = load_training_bundle(name, path)
+        bundle.prepare(self.inference_backend, self.enable_shap,
+                       self.explanation_budget_ms, self.n_features)
+        return bundle
+
+    def load(self, warm_up: Optional[Callable[[ModelBundle], None]] = None,
+             default_name: Optional[str] = None) -> bool:
+        """Load (or reload) every bundle, warm them up, then swap them in at once
+
+        Returns False, keeping the current bundles, if the default model
+        cannot be loaded or warmed up.
+        """
+        with self._reload_lock:
+            discovered = self.discover()
+            default = default_name or self.requested_default or self.default_name
+            if default is None or default not in discovered:
+                default = BASIC_MODEL_NAME if BASIC_MODEL_NAME in discovered else next(iter(discovered), None)
+            if default is None:
+                logger.error(f"❌ No model bundles found in {self.model_dir}")
+                return False
+
+            bundles = {}
+            for name, path in discovered.items():
+                try:
+                    bundles[name] = self._load_one(name, path)
+                except Exception as e:
+                    logger.error(f"❌ Error loading model '{name}' from {path}: {e}")
+                    if name == default:
+                        import traceback
+                        logger.error(traceback.format_exc())
+
+            # Warm everything up before it can receive traffic
+            if warm_up is not None:
+                for name in list(bundles):
+                    try:
+                        warm_up(bundles[name])
+                    except Exception as e:
+                        logger.error(f"❌ Warm-up failed for model '{name}': {e}")
+                        del bundles[name]
+
+            if default not in bundles:
+                logger.error(f"❌ Default model '{default}' failed to load or warm up; keeping current models")
+                return False
+
+            self._state = (bundles, default)
+            self.generation += 1
+            self.loaded_at = time.time()
+            logger.info(f"✅ Loaded {len(bundles)} model(s): {', '.join(bundles)} (default: {default})")
+            return True
+
+    def set_default(self, name: str):
+        bundles, _ = self._state
+        if name not in bundles:
+            raise KeyError(name)
+        self._state = (bundles, name)
+        self.requested_default = name
+
+    def get(self, name: Optional[str] = None) -> Optional[ModelBundle]:
+        """Bundle by name (default if None); None if nothing is loaded
+
+        Raises KeyError for an unknown name.
+        """
+        bundles, default = self._state
+        if name is None:
+            return bundles.get(default) if default is not None else None
+        return bundles[name]
+
+    @property
+    def default_name(self) -> Optional[str]:
+        return self._state[1]
+
+    def names(self) -> List[str]:
+        return list(self._state[0])
+
+    def describe(self) -> dict:
+        bundles, default = self._state
+        return {
+            "default": default,
+            "generation": self.generation,
+            "loaded_at": self.loaded_at,
+            "models": [dict(bundle.describe(), default=name == default) for name, bundle in bundles.items()],
+        }
@@ -0,0 +1,173 @@
+"""
+Micro-batching scheduler for the PCOS prediction service
+
+Single-row requests are queued on the event loop and coalesced: the first
+row opens a short window, and every row that arrives before the window
+closes (or until the batch is full) is stacked into one matrix. The matrix
+is scored on a worker thread, off the event loop, and each result is handed
+back to the request that submitted it.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesces concurrent rows into batched calls to `score_fn`
+
+    `score_fn(matrix, group)` receives an (n_rows, n_features) matrix of rows
+    submitted with the same `group` (e.g. the model they target) and must
+    return a list with one result per row, in order. Rows submitted with
+    their own `fn` are scored by it instead, batched only with rows sharing
+    that `fn`.
+    """
+
+    def __init__(self, score_fn: Callable[[np.ndarray, Any], List[Any]],
+                 max_rows: int = 64, window_ms: float = 2.0, workers: int = 1):
+        self.score_fn = score_fn
+        self.max_rows = max(1, max_rows)
+        self.window_ms = max(0.0, window_ms)
+        self.workers = max(1, workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._inflight = set()
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._collector is not None and not self._collector.done()
+
+    def start(self):
+        """Start the collector task on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        # One slot per worker thread: collect the next batch while one is scoring
+        self._slots = asyncio.Semaphore(self.workers)
+        self._collector = asyncio.create_task(self._collect())
+        logger.info(f"✅ Micro-batcher started (window {self.window_ms} ms, max {self.max_rows} rows, "
+                    f"{self.workers} worker(s))")
+
+    async def stop(self):
+        """Stop collecting and wait for batches already being scored"""
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        # Fail anything still queued rather than leaving callers hanging
+        while self._queue is not None and not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Scheduler stopped"))
+
+    async def submit(self, row: np.ndarray, group: Any = None, fn: Optional[Callable] = None) -> Any:
+        """Queue one feature row and wait for its result
+
+        Rows are only batched with rows submitted with the same group and fn.
+        """
+        if not self.running:
+            raise RuntimeError("Scheduler is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, (fn or self.score_fn, group), future))
+        return await future
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run other CPU-bound work on the inference threads"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "window_ms": self.window_ms,
+            "max_rows": self.max_rows,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": len(self._inflight),
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch_rows": self.rows / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "busy_seconds": round(self.busy_seconds, 6),
+        }
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = []
+            try:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self.window_ms / 1000.0
+                while len(batch) < self.max_rows:
+                    # Drain whatever is already queued without waiting
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except BaseException:
+                self._slots.release()
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Scheduler stopped"))
+                raise
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            # Requests whose caller went away don't need scoring
+            batch = [item for item in batch if not item[2].done()]
+            groups = {}
+            for item in batch:
+                fn, group = item[1]
+                groups.setdefault((fn, id(group)), []).append(item)
+            for items in groups.values():
+                await self._score(items)
+        finally:
+            self._slots.release()
+
+    async def _score(self, items):
+        matrix = np.vstack([row for row, _, _ in items])
+        fn, group = items[0][1]
+        start = time.perf_counter()
+        try:
+            results = await self.run(fn, matrix, group)
+        except Exception as e:
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.busy_seconds += time.perf_counter() - start
+
+        self.batches += 1
+        self.rows += len(items)
+        self.largest_batch = max(self.largest_batch, len(items))
+        for (_, _, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
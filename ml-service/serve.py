@@ -0,0 +1,222 @@
+"""
+Pre-forking production server for the PCOS prediction service
+
+The parent process binds the listening socket, loads the model, imputer and
+feature names once, then forks N uvicorn workers. Workers inherit the loaded
+artifacts copy-on-write instead of unpickling their own copies, so resident
+memory does not grow with the worker count.
+
+While the parent loads, a first set of workers (without models) answers
+/health and /ready with the startup phase; predictions wait up to
+STARTUP_WAIT_SECONDS, then get 503. They are replaced by loaded workers as
+soon as loading finishes.
+
+Signals (sent to the parent):
+    SIGHUP          reload model artifacts in the parent, then replace workers
+                    one at a time (each old worker drains in-flight requests)
+    SIGTERM/SIGINT  stop all workers gracefully and exit
+
+Run with:
+    python serve.py --workers 4 --port 8080
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+import main
+
+logger = logging.getLogger("serve")
+
+# How long a worker gets to finish in-flight requests before it is killed
+GRACEFUL_TIMEOUT_SECONDS = float(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+
+
+def default_workers() -> int:
+    """WEB_CONCURRENCY if set, otherwise one worker per available core"""
+    if os.getenv("WEB_CONCURRENCY"):
+        return int(os.getenv("WEB_CONCURRENCY"))
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Arbiter:
+    """Forks and supervises uvicorn workers sharing one listening socket"""
+
+    def __init__(self, sock: socket.socket, workers: int, log_level: str):
+        self.sock = sock
+        self.num_workers = max(1, workers)
+        self.log_level = log_level
+        self.workers = {}  # pid -> generation
+        self.generation = 0
+        self.reload_requested = False
+        self.shutdown_requested = False
+
+    def preload(self) -> bool:
+        """Load and warm up artifacts in the parent so forked workers share them"""
+        ok = main.initialize()
+        # Move everything allocated so far out of the GC's reach: collections in
+        # the workers would otherwise touch (and copy) the shared pages
+        gc.collect()
+        gc.freeze()
+        return ok
+
+    def spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker()
+            # _run_worker never returns
+        self.workers[pid] = self.generation
+        logger.info(f"Started worker {pid} (generation {self.generation})")
+        return pid
+
+    def _run_worker(self):
+        # Workers use uvicorn's own SIGTERM/SIGINT handling
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            config = uvicorn.Config(main.app, log_level=self.log_level,
+                                    timeout_graceful_shutdown=int(GRACEFUL_TIMEOUT_SECONDS))
+            uvicorn.Server(config).run(sockets=[self.sock])
+        except Exception:
+            logger.exception("Worker crashed")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def stop_worker(self, pid: int, timeout: float = GRACEFUL_TIMEOUT_SECONDS):
+        """Ask a worker to drain and exit, killing it if it takes too long"""
+        self.stop_workers([pid], timeout)
+
+    def stop_workers(self, pids, timeout: float = GRACEFUL_TIMEOUT_SECONDS):
+        """Ask workers to drain and exit together, killing those that take too long"""
+        running = []
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                running.append(pid)
+            except ProcessLookupError:
+                self.workers.pop(pid, None)
+        deadline = time.monotonic() + timeout
+        while running and time.monotonic() < deadline:
+            running = [pid for pid in running if not os.waitpid(pid, os.WNOHANG)[0]]
+            if running:
+                time.sleep(0.05)
+        for pid in running:
+            logger.warning(f"Worker {pid} did not exit in {timeout:.0f}s, killing")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        for pid in pids:
+            self.workers.pop(pid, None)
+
+    def start(self):
+        """Serve startup progress from model-less workers while the parent loads
+
+        Once loading finishes (or fails) a full set of workers sharing the
+        loaded artifacts is forked and the startup workers are stopped
+        together, so few requests still reach one that is not ready.
+        """
+        main.set_phase("loading_models")
+        main.loading_in_parent = True
+        for _ in range(self.num_workers):
+            self.spawn()
+        logger.info(f"🚀 Preloading models in parent {os.getpid()} for {self.num_workers} worker(s)")
+        if not self.preload():
+            # Workers then retry loading on their own, as with uvicorn main:app
+            logger.warning("Models failed to load. Workers will return errors.")
+        main.loading_in_parent = False
+        startup_workers = list(self.workers)
+        self.generation += 1
+        for _ in range(self.num_workers):
+            self.spawn()
+        self.stop_workers(startup_workers)
+
+    def reload(self):
+        """Reload artifacts, then replace workers one by one
+
+        The listening socket stays open throughout and a new worker is
+        started before each old one is stopped, so no connection is refused.
+        """
+        logger.info("Reloading model artifacts")
+        gc.unfreeze()
+        if not self.preload():
+            logger.error("❌ Reload failed; keeping current workers")
+            return
+        self.generation += 1
+        for old_pid in [pid for pid, gen in self.workers.items() if gen < self.generation]:
+            self.spawn()
+            self.stop_worker(old_pid)
+        logger.info(f"✅ Reload complete (generation {self.generation})")
+
+    def reap(self):
+        """Collect exited workers and replace unexpected exits"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self.workers.pop(pid, None) is not None and not self.shutdown_requested:
+                logger.warning(f"Worker {pid} exited unexpectedly (status {status}), restarting")
+                self.spawn()
+
+    def run(self):
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGTERM, self._on_shutdown)
+        signal.signal(signal.SIGINT, self._on_shutdown)
+
+        self.start()
+
+        while not self.shutdown_requested:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            self.reap()
+            time.sleep(0.2)
+
+        logger.info("Shutting down workers")
+        for pid in list(self.workers):
+            self.stop_worker(pid)
+        self.sock.close()
+
+    def _on_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def _on_shutdown(self, signum, frame):
+        self.shutdown_requested = True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the PCOS prediction service with pre-forked workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8080)))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    arbiter = Arbiter(bind_socket(args.host, args.port), args.workers, args.log_level)
+    arbiter.run()
+    sys.exit(0)
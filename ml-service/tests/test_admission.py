@@ -0,0 +1,54 @@
+"""Deadline handling of the admission middleware"""
+
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionMiddleware, parse_deadline_ms
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    (b"250", 250.0),
+    (b"0", 0.0),
+    (b"-5", -5.0),
+    (b"soon", None),
+    (b"nan", None),
+    (b"inf", None),
+])
+def test_parse_deadline_ms(value, expected):
+    assert parse_deadline_ms(value) == expected
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def call(middleware, path, deadline=None):
+    headers = [(b"x-deadline-ms", deadline)] if deadline is not None else []
+    scope = {"type": "http", "path": path, "headers": headers}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return sent[0]["status"]
+
+
+@pytest.mark.parametrize("deadline", [b"0", b"-5"])
+def test_expired_deadline_is_shed(deadline):
+    middleware = AdmissionMiddleware(ok_app, AdmissionController())
+    assert call(middleware, "/predict", deadline) == 504
+    assert middleware.controller.active == 0
+
+
+def test_future_or_missing_deadline_is_served():
+    middleware = AdmissionMiddleware(ok_app, AdmissionController())
+    assert call(middleware, "/predict", b"1000") == 200
+    assert call(middleware, "/predict") == 200
+    assert call(middleware, "/predict", b"garbage") == 200
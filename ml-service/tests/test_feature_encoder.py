@@ -0,0 +1,61 @@
+"""LEGACY_SPEC must keep encoding assessments exactly as the original service did"""
+
+import numpy as np
+import pytest
+
+from feature_encoder import LEGACY_SPEC
+
+
+def original_encode_input(data):
+    """The service's encoding before feature specs, as a raw 10-feature row"""
+    bmi = data["bmi"] if data.get("bmi") else data["weight"] / ((data["height"] / 100) ** 2)
+    return np.array([
+        data["age"],
+        data["weight"],
+        data["height"],
+        bmi,
+        1 if data["cycleRegularity"] == "regular" else 2,
+        data.get("cycleLength") or 0,
+        1 if data.get("skinDarkening") else 0,
+        1 if data.get("fastFood") else 0,
+        1 if data["exerciseFrequency"] != "none" else 0,
+        1 if data.get("pregnant") else 0,
+    ], dtype=np.float64)
+
+
+def random_assessments(n, seed=0):
+    rng = np.random.default_rng(seed)
+    optional = lambda value: None if rng.random() < 0.3 else value  # noqa: E731
+    return [{
+        "age": float(rng.integers(15, 50)),
+        "weight": float(rng.uniform(35, 130)),
+        "height": float(rng.uniform(130, 200)),
+        "bmi": optional(float(rng.choice([0.0, rng.uniform(15, 45)]))),
+        "cycleRegularity": str(rng.choice(["regular", "irregular", "unknown"])),
+        "cycleLength": optional(float(rng.integers(0, 12))),
+        "skinDarkening": optional(bool(rng.integers(2))),
+        "fastFood": optional(bool(rng.integers(2))),
+        "exerciseFrequency": str(rng.choice(["none", "1-2_week", "3-4_week", "5-plus_week"])),
+        "pregnant": optional(bool(rng.integers(2))),
+        "diet": "balanced",
+    } for _ in range(n)]
+
+
+def test_legacy_spec_matches_original_encoding():
+    encoder = LEGACY_SPEC.compile()
+    assessments = random_assessments(500)
+    expected = np.vstack([original_encode_input(a) for a in assessments])
+    for i, assessment in enumerate(assessments):
+        np.testing.assert_array_equal(encoder.encode_row(assessment), expected[i])
+    # Vectorized BMI may differ from Python floats in the last bit
+    np.testing.assert_allclose(encoder.encode_batch(assessments), expected, rtol=1e-12, atol=0)
+
+
+@pytest.mark.parametrize("field, value", [("height", 0), ("height", -170), ("weight", 0)])
+def test_assessment_rejects_non_positive_body_measurements(field, value):
+    from pydantic import ValidationError
+
+    from main import AssessmentInput
+    assessment = dict(random_assessments(1)[0], **{field: value})
+    with pytest.raises(ValidationError):
+        AssessmentInput.model_validate(assessment)
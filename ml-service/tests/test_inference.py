@@ -0,0 +1,79 @@
+"""Compiled evaluators must match the estimators' own predict_proba"""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+
+from inference import (PARITY_ATOL, CompiledLinearBackend, CompiledTreeBackend, EstimatorBackend,
+                       RoutedBackend, build_probe_matrix, check_parity, compile_model, create_backend)
+
+N_FEATURES = 10
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, N_FEATURES))
+    y = (X[:, 0] + 0.5 * X[:, 1] - X[:, 2] + rng.normal(scale=0.5, size=len(X)) > 0).astype(int)
+    return X, y
+
+
+def assert_parity(model, compiled_type, with_missing=True):
+    compiled = compile_model(model)
+    assert isinstance(compiled, compiled_type)
+    probe = build_probe_matrix(compiled, N_FEATURES)
+    if not with_missing:
+        probe = np.nan_to_num(probe)
+    expected = model.predict_proba(probe)
+    np.testing.assert_allclose(compiled.predict_proba(probe), expected, rtol=0, atol=PARITY_ATOL)
+    ok, _ = check_parity(EstimatorBackend(model), compiled, probe)
+    assert ok
+
+
+def test_decision_tree_parity(data):
+    X, y = data
+    assert_parity(DecisionTreeClassifier(max_depth=6, random_state=0).fit(X, y), CompiledTreeBackend)
+
+
+def test_random_forest_parity(data):
+    X, y = data
+    model = RandomForestClassifier(n_estimators=20, max_depth=5, random_state=0).fit(X, y)
+    assert_parity(model, CompiledTreeBackend)
+
+
+def test_logistic_regression_parity(data):
+    X, y = data
+    # Logistic regression does not accept missing values
+    assert_parity(LogisticRegression(max_iter=1000).fit(X, y), CompiledLinearBackend, with_missing=False)
+
+
+def test_xgboost_parity(data):
+    xgboost = pytest.importorskip("xgboost")
+    X, y = data
+    X = X.copy()
+    X[::7, 3] = np.nan
+    model = xgboost.XGBClassifier(n_estimators=30, max_depth=4, random_state=0).fit(X, y)
+    assert_parity(model, CompiledTreeBackend)
+
+
+def test_routed_backend_picks_by_row_count(data):
+    X, y = data
+    model = LogisticRegression(max_iter=1000).fit(X, y)
+    small, large = compile_model(model), EstimatorBackend(model)
+    routed = RoutedBackend([(16, small), (float("inf"), large)])
+    assert routed.backend_for(1) is small
+    assert routed.backend_for(16) is small
+    assert routed.backend_for(17) is large
+    assert routed.name == "compiled+estimator"
+    np.testing.assert_allclose(routed.predict_proba(X), model.predict_proba(X), atol=PARITY_ATOL)
+
+
+def test_auto_backend_matches_estimator(data):
+    X, y = data
+    model = RandomForestClassifier(n_estimators=10, max_depth=4, random_state=0).fit(X, y)
+    backend = create_backend(model, "auto", n_features=N_FEATURES)
+    for rows in (1, 50, 400):
+        np.testing.assert_allclose(backend.predict_proba(X[:rows]), model.predict_proba(X[:rows]),
+                                   atol=PARITY_ATOL)
@@ -0,0 +1,130 @@
+"""
+Per-model checkpoints for resumable training runs
+
+Every finished stage of a candidate (hyperparameter search, training) is
+saved as soon as it completes, so a run that fails on one model or is
+killed part-way resumes with only the missing work. A checkpoint is valid
+for exactly the inputs it was computed from; its key hashes
+
+- the data fingerprint (the exact train/test arrays),
+- the candidate's hyperparameters and stage settings, and
+- the code version (source of the stage's functions and the versions of
+  numpy, scikit-learn and xgboost),
+
+so changing any of them retrains that candidate alone.
+
+    <root>/<data fingerprint>/             one run directory per dataset
+        <stage>/<model>-<key>/outcome.pkl  the stage's result (fitted pipeline, metrics, ...)
+                             /meta.json    key, SHA-256 of outcome.pkl, when it was saved
+
+A new checkpoint replaces older ones for the same model and stage.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+from datetime import datetime
+from importlib import metadata
+from typing import Any, Callable, Iterable, Optional
+
+import numpy as np
+
+from artifact import atomic_directory, remove_siblings
+from feature_store import file_digest
+
+LIBRARIES = ('numpy', 'scikit-learn', 'xgboost')
+
+# Estimator parameters that change how fast a model trains, not what it learns
+RUNTIME_PARAMS = ('n_jobs', 'nthread', 'verbose', 'verbosity')
+
+
+def data_fingerprint(*arrays) -> str:
+    """SHA-256 over the shape, dtype and bytes of every array"""
+    digest = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f'{array.shape}{array.dtype.str}'.encode())
+        digest.update(memoryview(array).cast('B'))
+    return digest.hexdigest()[:16]
+
+
+def code_version(functions: Iterable[Callable]) -> str:
+    """Hash of the functions' source and the installed library versions"""
+    digest = hashlib.sha256()
+    for function in functions:
+        digest.update(inspect.getsource(function).encode())
+    for library in LIBRARIES:
+        try:
+            digest.update(f'{library}=={metadata.version(library)}'.encode())
+        except metadata.PackageNotFoundError:
+            digest.update(f'{library} missing'.encode())
+    return digest.hexdigest()[:16]
+
+
+def model_params(model) -> dict:
+    """An estimator's hyperparameters, without the ones that only affect speed"""
+    params = model.get_params(deep=False)
+    return {key: value for key, value in params.items() if key not in RUNTIME_PARAMS}
+
+
+def _slug(name: str) -> str:
+    return name.lower().replace(' ', '_')
+
+
+class CheckpointStore:
+    """Checkpoints of one run directory (one dataset fingerprint)"""
+
+    def __init__(self, root: str, fingerprint: str, reuse: bool = True):
+        self.fingerprint = fingerprint
+        self.run_dir = os.path.join(root, fingerprint)
+        # False: run everything again, overwriting existing checkpoints
+        self.reuse = reuse
+
+    def key(self, stage: str, name: str, code: str, **settings: Any) -> str:
+        """Checkpoint key for `name` at `stage` given its code version and settings"""
+        payload = json.dumps({
+            'data': self.fingerprint, 'stage': stage, 'model': name, 'code': code, 'settings': settings,
+        }, sort_keys=True, default=repr)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    def _entry(self, stage: str, name: str, key: str) -> str:
+        return os.path.join(self.run_dir, stage, f'{_slug(name)}-{key}')
+
+    def load(self, stage: str, name: str, key: str) -> Optional[Any]:
+        """The checkpointed outcome, or None if there is no valid one"""
+        entry = self._entry(stage, name, key)
+        if not self.reuse or not os.path.isdir(entry):
+            return None
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                meta = json.load(f)
+            path = os.path.join(entry, 'outcome.pkl')
+            if meta.get('key') != key or file_digest(path) != meta.get('sha256'):
+                raise ValueError('checksum or key mismatch')
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError) as e:
+            print(f"⚠️  Checkpoint {entry} is unusable ({e}); discarding it")
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+
+    def save(self, stage: str, name: str, key: str, outcome: Any):
+        """Write `outcome` as the checkpoint for `name` at `stage`, replacing older ones"""
+        entry = self._entry(stage, name, key)
+        with atomic_directory(entry) as staging:
+            path = os.path.join(staging, 'outcome.pkl')
+            with open(path, 'wb') as f:
+                pickle.dump(outcome, f, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(os.path.join(staging, 'meta.json'), 'w') as f:
+                json.dump({
+                    'key': key,
+                    'model': name,
+                    'stage': stage,
+                    'sha256': file_digest(path),
+                    'saved': datetime.now().isoformat(timespec='seconds'),
+                }, f, indent=2)
+        # Checkpoints for older settings or code of this model are never read again
+        remove_siblings(entry, f'{_slug(name)}-')
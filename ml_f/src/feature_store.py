@@ -0,0 +1,113 @@
+"""
+Prepared-dataset cache for model training
+
+Parsing and cleaning the training CSV is done once: the cleaned feature
+matrix, target and row index are written as .npy files and later runs
+memory-map them instead of re-reading the CSV. Forked training workers
+share the mapped pages through the page cache.
+
+Entries are keyed by a SHA-256 of the source file's bytes and of the
+preparation function's source code, so editing either the CSV or the
+cleaning code produces a new entry; the stale one is removed.
+
+    <cache_dir>/<source name>-<key>/X.npy        float64 features (rows x columns)
+                                   /y.npy        int64 target
+                                   /index.npy    int64 row labels from the source
+                                   /meta.json    columns, source path, rows, key
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ml-service's artifact module (on sys.path via model_comparison.py)
+from artifact import atomic_directory, remove_siblings
+
+CHUNK_BYTES = 1 << 20
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(source_path: str, prepare: Callable, extra: str = '') -> str:
+    """Fingerprint of the source data together with the code that prepares it"""
+    digest = hashlib.sha256()
+    digest.update(file_digest(source_path).encode())
+    digest.update(inspect.getsource(prepare).encode())
+    digest.update(extra.encode())
+    return digest.hexdigest()[:16]
+
+
+def _load(entry: str) -> Tuple[pd.DataFrame, pd.Series]:
+    with open(os.path.join(entry, 'meta.json')) as f:
+        meta = json.load(f)
+    X = np.load(os.path.join(entry, 'X.npy'), mmap_mode='r')
+    y = np.load(os.path.join(entry, 'y.npy'), mmap_mode='r')
+    index = pd.Index(np.load(os.path.join(entry, 'index.npy')))
+    # A single float64 block: the frame wraps the mapped array without copying
+    features = pd.DataFrame(X, columns=meta['columns'], index=index, copy=False)
+    return features, pd.Series(y, index=index, name=meta['target'], copy=False)
+
+
+def _store(entry: str, features: pd.DataFrame, target: pd.Series, meta: dict):
+    try:
+        with atomic_directory(entry) as staging:
+            np.save(os.path.join(staging, 'X.npy'), np.ascontiguousarray(features.to_numpy(dtype=np.float64)))
+            np.save(os.path.join(staging, 'y.npy'), target.to_numpy(dtype=np.int64))
+            np.save(os.path.join(staging, 'index.npy'), features.index.to_numpy(dtype=np.int64))
+            with open(os.path.join(staging, 'meta.json'), 'w') as f:
+                json.dump(meta, f, indent=2)
+    except OSError:
+        # Another run may have stored the same entry meanwhile
+        if not os.path.isdir(entry):
+            raise
+
+
+def cached_dataset(source_path: str, prepare: Callable[[str], Tuple[pd.DataFrame, pd.Series]],
+                   cache_dir: Optional[str] = None, extra_key: str = '') -> Tuple[pd.DataFrame, pd.Series, str]:
+    """(features, target, key) for `prepare(source_path)`, memory-mapped from the cache
+
+    `prepare` runs only on a cache miss; its features must be numeric and
+    its target integer. `extra_key` covers anything else the result depends
+    on (e.g. a column list defined elsewhere). `cache_dir` defaults to
+    .cache/ next to the source.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(source_path)), '.cache')
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    key = cache_key(source_path, prepare, extra_key)
+    entry = os.path.join(cache_dir, f'{name}-{key}')
+
+    if os.path.isdir(entry):
+        try:
+            features, target = _load(entry)
+            print(f"⚡ Using prepared dataset {entry} ({len(features)} rows, memory-mapped)")
+            return features, target, key
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  Prepared dataset {entry} is unreadable ({e}); rebuilding")
+            shutil.rmtree(entry, ignore_errors=True)
+
+    features, target = prepare(source_path)
+    _store(entry, features, target, {
+        'key': key,
+        'source': os.path.abspath(source_path),
+        'rows': len(features),
+        'columns': [str(column) for column in features.columns],
+        'target': target.name,
+    })
+    # Entries for older versions of this source are never read again
+    remove_siblings(entry, f'{name}-')
+    print(f"💾 Prepared dataset cached in {entry}")
+    return _load(entry) + (key,)
@@ -6,7 +6,11 @@ Trains multiple models and compares their performance metrics
 
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
+from joblib import Memory
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingRandomSearchCV, StratifiedKFold, train_test_split
+from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.impute import SimpleImputer
 from sklearn.metrics import (
@@ -23,50 +27,144 @@ from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.svm import SVC
 from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
 from xgboost import XGBClassifier
 
+import argparse
+import multiprocessing
 import pickle
 import os
+import shutil
+import subprocess
+import sys
 import json
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from threadpoolctl import threadpool_limits
+
+# Feature encoding is shared with the prediction service
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'ml-service')
+sys.path.insert(0, SERVICE_DIR)
+from artifact import ARTIFACT_SUFFIX, save_artifact
+from feature_encoder import TRAINING_SPEC
+from inference import create_backend
+
+from checkpoints import CheckpointStore, code_version, data_fingerprint, model_params
+from feature_store import cached_dataset
+
 # Set random seed for reproducibility
 RANDOM_STATE = 42
 np.random.seed(RANDOM_STATE)
 
-def load_and_prepare_data(csv_path='data/PCOS_cleaned_basic.csv'):
-    """Load and prepare the PCOS dataset"""
-    print(f"📊 Loading data from {csv_path}...")
+# The distilled fast-tier model is saved as <output_dir>/surrogate_model.pkl
+SURROGATE_NAME = 'surrogate'
+
+# Class index -> label, as the prediction service reports it (LABEL_MAP in main.py)
+CLASS_LABELS = {0: 'No Risk', 1: 'Early', 2: 'High'}
+
+# Models trained on standardized features
+SCALED_MODELS = ['SVM', 'KNN', 'Logistic Regression']
+
+# Hyperparameter search (--search): parameter lists and the resource successive
+# halving grows. Ensembles get more trees each round; the rest more training rows.
+SEARCH_SPACES = {
+    'XGBoost': ({
+        'max_depth': [2, 3, 4, 6],
+        'learning_rate': [0.03, 0.1, 0.3],
+        'subsample': [0.7, 1.0],
+        'min_child_weight': [1, 5],
+    }, 'n_estimators'),
+    'Random Forest': ({
+        'max_depth': [4, 6, 10, None],
+        'min_samples_leaf': [1, 2, 5],
+        'max_features': ['sqrt', 0.5],
+    }, 'n_estimators'),
+    'Gradient Boosting': ({
+        'max_depth': [2, 3, 5],
+        'learning_rate': [0.03, 0.1, 0.3],
+        'subsample': [0.7, 1.0],
+    }, 'n_estimators'),
+    'Logistic Regression': ({
+        'C': [0.001, 0.01, 0.1, 1.0, 10.0, 100.0],
+    }, 'n_samples'),
+    'SVM': ({
+        'C': [0.1, 1.0, 10.0, 100.0],
+        'gamma': ['scale', 0.01, 0.1, 1.0],
+    }, 'n_samples'),
+    'KNN': ({
+        'n_neighbors': [3, 5, 7, 11, 15, 21],
+        'weights': ['uniform', 'distance'],
+    }, 'n_samples'),
+}
+# Most trees an ensemble is given in the final halving round
+SEARCH_MAX_ESTIMATORS = 300
+
+# Inference benchmark: rows per batch-throughput call
+BENCHMARK_BATCH_ROWS = 1000
+
+# Measures the memory a saved bundle adds to a fresh process once it is loaded
+# and compiled the way the service does it; libraries are imported beforehand
+RSS_PROBE = '''
+import pickle, sys
+sys.path.insert(0, sys.argv[1])
+import numpy, sklearn.ensemble, sklearn.impute, sklearn.linear_model, sklearn.neighbors
+import sklearn.pipeline, sklearn.preprocessing, sklearn.svm, sklearn.tree, xgboost
+from inference import create_backend
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+
+before = rss_kb()
+with open(sys.argv[2], 'rb') as f:
+    pipeline = pickle.load(f)['pipeline']
+backend = create_backend(pipeline[-1], n_features=int(sys.argv[3]))
+print(rss_kb() - before)
+'''
+
+def resolve_data_path(csv_path='data/PCOS_cleaned_basic.csv'):
+    """The first of csv_path and the known fallback locations that exists"""
+    alt_paths = [
+        '../data/PCOS_cleaned_basic.csv',
+        'data/PCOS_data.csv',
+        '../data/PCOS_data.csv'
+    ]
+    for path in [csv_path] + alt_paths:
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(f"Could not find data file in any of: {csv_path}, {alt_paths}")
+
+def load_and_prepare_data(csv_path='data/PCOS_cleaned_basic.csv', use_cache=True, cache_dir=None):
+    """Load and prepare the PCOS dataset
     
-    # Try to load the CSV file
-    try:
-        df = pd.read_csv(csv_path)
-    except FileNotFoundError:
-        # Try alternative paths
-        alt_paths = [
-            '../data/PCOS_cleaned_basic.csv',
-            'data/PCOS_data.csv',
-            '../data/PCOS_data.csv'
-        ]
-        df = None
-        for path in alt_paths:
-            try:
-                df = pd.read_csv(path)
-                csv_path = path
-                break
-            except:
-                continue
-        if df is None:
-            raise FileNotFoundError(f"Could not find data file in any of: {csv_path}, {alt_paths}")
+    The cleaned features and target are cached next to the CSV (see
+    feature_store.py) and memory-mapped on later runs; the cache is keyed
+    by the CSV's contents and the code of prepare_dataset.
+    """
+    csv_path = resolve_data_path(csv_path)
+    print(f"📊 Loading data from {csv_path}...")
+    if not use_cache:
+        return prepare_dataset(csv_path)
+    X, y, _ = cached_dataset(csv_path, prepare_dataset, cache_dir=cache_dir,
+                             extra_key=','.join(TRAINING_SPEC.names))
+    return X, y
+
+def prepare_dataset(csv_path):
+    """Parse the CSV and clean it into (features, target)"""
+    df = pd.read_csv(csv_path)
     
     print(f"✅ Loaded {len(df)} samples with {len(df.columns)} features")
     
-    # The model expects 10 features based on main.py
+    # The model expects 10 features, in the order of the shared feature spec
+    # (ml-service/feature_encoder.py):
     # 1. Age (yrs)
     # 2. Weight (Kg)
     # 3. Height(Cm)
     # 4. BMI
-    # 5. Cycle(R/I) - 1=regular, 2=irregular
+    # 5. Cycle(R/I) - 2=regular, 4=irregular
     # 6. Cycle length(days)
     # 7. Skin darkening (Y/N) - 1=Yes, 0=No
     # 8. Fast food (Y/N) - 1=Yes, 0=No
@@ -74,17 +172,17 @@ def load_and_prepare_data(csv_path='data/PCOS_cleaned_basic.csv'):
     # 10. Pregnant(Y/N) - 1=Yes, 0=No
     
     # Check if this is the cleaned dataset (has exact columns we need)
-    required_features = ['Age (yrs)', 'Weight (Kg)', 'Height(Cm)', 'BMI', 'Cycle(R/I)', 
-                        'Cycle length(days)', 'Skin darkening (Y/N)', 'Fast food (Y/N)', 
-                        'Reg.Exercise(Y/N)', 'Pregnant(Y/N)']
+    required_features = TRAINING_SPEC.names
     
     # Use cleaned dataset directly (simpler and cleaner)
     print("✅ Using cleaned dataset with exact feature columns")
-    features_df = df[required_features].copy()
+    features_df = df[required_features]
     
-    # Convert to numeric (handle any string values)
-    for col in features_df.columns:
-        features_df[col] = pd.to_numeric(features_df[col], errors='coerce')
+    # Convert to numeric (handle any string values); numeric columns pass through
+    non_numeric = features_df.select_dtypes(exclude='number').columns
+    if len(non_numeric):
+        features_df = features_df.apply(pd.to_numeric, errors='coerce')
+    features_df = features_df.astype(np.float64)
     
     # Target variable
     target = pd.to_numeric(df['PCOS (Y/N)'], errors='coerce').fillna(0).astype(int)
@@ -154,29 +252,28 @@ def load_and_prepare_data(csv_path='data/PCOS_cleaned_basic.csv'):
     
     return features_df, target
 
-def train_and_evaluate_model(model, name, X_train, X_test, y_train, y_test, scaler=None):
-    """Train a model and return evaluation metrics"""
+def train_and_evaluate_model(model, name, X_train, X_test, y_train, y_test, memory=None):
+    """Train a model in its preprocessing pipeline and return evaluation metrics
+    
+    Pipelines sharing `memory` fit each preprocessing prefix (impute, then
+    scale for SCALED_MODELS) once on a given training set and reuse it.
+    """
     print(f"\n🔧 Training {name}...")
     
     try:
-        # Scale features for models that need it
-        if scaler and name in ['SVM', 'KNN', 'Logistic Regression']:
-            X_train_scaled = scaler.fit_transform(X_train)
-            X_test_scaled = scaler.transform(X_test)
-        else:
-            X_train_scaled = X_train
-            X_test_scaled = X_test
-        
-        # Handle missing values with imputation
-        imputer = SimpleImputer(strategy='median')
-        X_train_imputed = imputer.fit_transform(X_train_scaled)
-        X_test_imputed = imputer.transform(X_test_scaled)
+        pipeline = build_pipeline(model, name in SCALED_MODELS, memory=memory)
         
-        # Train model
-        model.fit(X_train_imputed, y_train)
+        # Train model (preprocessing comes from the cache when another pipeline fitted it)
+        started = time.perf_counter()
+        pipeline.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - started
+        # The fitted pipeline is saved; the cache directory does not outlive training
+        pipeline.memory = None
         
         # Predict
-        y_pred = model.predict(X_test_imputed)
+        started = time.perf_counter()
+        y_pred = pipeline.predict(X_test)
+        predict_seconds = time.perf_counter() - started
         
         # Calculate metrics
         accuracy = accuracy_score(y_test, y_pred)
@@ -202,11 +299,11 @@ def train_and_evaluate_model(model, name, X_train, X_test, y_train, y_test, scal
         print(f"   Precision: {precision:.4f}")
         print(f"   Recall: {recall:.4f}")
         print(f"   F1-Score: {f1:.4f}")
+        print(f"   Fit: {fit_seconds:.3f}s, predict: {predict_seconds * 1000:.1f}ms")
         
         return {
-            'model': model,
-            'imputer': imputer,
-            'scaler': scaler,
+            'pipeline': pipeline,
+            'model': pipeline['model'],
             'accuracy': accuracy,
             'precision': precision,
             'recall': recall,
@@ -215,7 +312,9 @@ def train_and_evaluate_model(model, name, X_train, X_test, y_train, y_test, scal
             'recall_binary': recall_binary,
             'f1_binary': f1_binary,
             'confusion_matrix': cm.tolist(),
-            'classification_report': classification_report(y_test, y_pred, output_dict=True)
+            'classification_report': classification_report(y_test, y_pred, output_dict=True),
+            'fit_seconds': fit_seconds,
+            'predict_seconds': predict_seconds,
         }
     except Exception as e:
         print(f"❌ Error training {name}: {str(e)}")
@@ -223,20 +322,484 @@ def train_and_evaluate_model(model, name, X_train, X_test, y_train, y_test, scal
         traceback.print_exc()
         return None
 
-def main():
+def set_thread_budget(model, threads):
+    """Cap the threads an estimator may use itself (n_jobs for sklearn, XGBoost)"""
+    params = model.get_params()
+    if 'n_jobs' in params:
+        model.set_params(n_jobs=threads)
+    return model
+
+def train_with_budget(model, name, threads, X_train, X_test, y_train, y_test, cache_dir):
+    """Worker entry point: train one candidate within its thread budget
+    
+    threadpool_limits also caps BLAS/OpenMP pools (SVM, logistic regression)
+    that n_jobs does not reach.
+    """
+    with threadpool_limits(limits=threads):
+        return train_and_evaluate_model(
+            set_thread_budget(model, threads), name, X_train, X_test, y_train, y_test,
+            memory=Memory(cache_dir, verbose=0)
+        )
+
+def available_cpus():
+    """CPUs this process may run on (affinity / cpuset aware), not all the host has"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def run_per_model(fn, models, jobs, *args):
+    """Call fn(model, name, threads, *args) for every candidate, `jobs` at a time
+    
+    Each of the `jobs` worker processes gets an equal share of the CPUs as
+    its thread budget, so the pool never runs more threads than cores.
+    With jobs=1 candidates run in this process, one after another, using
+    every core. Returns ({name: outcome}, wall-clock seconds, (jobs, threads))
+    with the job count and per-job thread budget actually used; candidates
+    whose outcome is None (failed) are left out.
+    """
+    cpus = available_cpus()
+    # More processes than CPUs would oversubscribe even at one thread each
+    jobs = max(1, min(jobs, len(models), cpus))
+    threads = max(1, cpus // jobs)
+    started = time.perf_counter()
+    if jobs == 1:
+        outcomes = {name: fn(model, name, threads, *args) for name, model in models.items()}
+    else:
+        print(f"\n⚡ Running {len(models)} models on {jobs} processes, {threads} thread(s) each...")
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+            futures = {name: pool.submit(fn, model, name, threads, *args) for name, model in models.items()}
+            outcomes = {name: future.result() for name, future in futures.items()}
+    wall_seconds = time.perf_counter() - started
+    return {name: outcome for name, outcome in outcomes.items() if outcome}, wall_seconds, (jobs, threads)
+
+def run_checkpointed(model, name, threads, fn, store, stage, keys, *args):
+    """Worker entry point: run fn for one candidate and checkpoint its outcome at once"""
+    outcome = fn(model, name, threads, *args)
+    if outcome:
+        try:
+            store.save(stage, name, keys[name], outcome)
+        except OSError as e:
+            # The outcome is still used; only resuming it later is lost
+            print(f"⚠️  Could not checkpoint {name} ({stage}): {e}")
+    return outcome
+
+def resume_per_model(fn, models, jobs, store, stage, keys, *args):
+    """run_per_model, skipping candidates with a valid checkpoint for keys[name]
+    
+    Each candidate that runs is checkpointed by its worker as soon as it
+    finishes, so an interrupted run keeps everything completed so far.
+    Without a store every candidate runs. Returns ({name: outcome},
+    wall-clock seconds, (jobs, threads), names reused from checkpoints);
+    (0, 0) when nothing had to run.
+    """
+    if store is None:
+        return run_per_model(fn, models, jobs, *args) + ([],)
+    cached = {}
+    for name in models:
+        outcome = store.load(stage, name, keys[name])
+        if outcome is not None:
+            cached[name] = outcome
+    pending = {name: model for name, model in models.items() if name not in cached}
+    if cached:
+        print(f"\n♻️  Reusing {stage} checkpoints for {', '.join(cached)}; "
+              f"{len(pending)} model(s) left to run")
+    outcomes, wall_seconds, parallelism = {}, 0.0, (0, 0)
+    if pending:
+        outcomes, wall_seconds, parallelism = run_per_model(run_checkpointed, pending, jobs, fn, store, stage, keys, *args)
+    merged = {name: cached.get(name) or outcomes.get(name) for name in models}
+    return {name: outcome for name, outcome in merged.items() if outcome}, wall_seconds, parallelism, list(cached)
+
+def train_all(models, X_train, X_test, y_train, y_test, jobs=1, store=None):
+    """Train and evaluate every candidate, `jobs` at a time (see run_per_model)
+    
+    All candidates share one preprocessing cache: the imputer is fitted once
+    for the split and the scaler once for the scaled models. With a
+    checkpoint store, candidates already trained with the same data,
+    hyperparameters and code are loaded instead (see resume_per_model).
+    """
+    code = code_version([train_and_evaluate_model, build_pipeline])
+    keys = {
+        name: store.key('train', name, code, params=model_params(model), scaled=name in SCALED_MODELS)
+        for name, model in models.items()
+    } if store is not None else {}
+    with tempfile.TemporaryDirectory(prefix='pcos-train-') as cache_dir:
+        return resume_per_model(train_with_budget, models, jobs, store, 'train', keys,
+                                X_train, X_test, y_train, y_test, cache_dir)
+
+def build_pipeline(model, scaled, memory=None):
+    """Impute (then scale) and fit `model`; fitted preprocessing is memoized in `memory`
+    
+    Serving applies the same steps in the same order (the feature spec
+    carries the imputer's statistics and the scaler's mean and scale).
+    """
+    return Pipeline([
+        ('impute', SimpleImputer(strategy='median')),
+        ('scale', StandardScaler() if scaled else 'passthrough'),
+        ('model', model),
+    ], memory=memory)
+
+def search_model(model, name, threads, X_train, y_train, splits, cache_dir, n_candidates, factor):
+    """Successive-halving random search for one candidate over shared CV folds
+    
+    Every sampled configuration is scored on the same stratified folds; after
+    each round only the best 1/`factor` go on, with `factor` times the
+    resource (trees for ensembles, training rows otherwise). The imputer and
+    scaler fitted on a fold are cached in `cache_dir` and reused by every
+    configuration, and every other scaled model, trained on that fold.
+    """
+    space, resource = SEARCH_SPACES[name]
+    # Small spaces are searched exhaustively
+    n_candidates = min(n_candidates, int(np.prod([len(values) for values in space.values()])))
+    print(f"\n🔎 Searching {name} ({n_candidates} candidates, {len(splits)} folds, resource: {resource})...")
+    estimator = clone(model)
+    if 'probability' in estimator.get_params():
+        # Search scores labels only; Platt scaling's internal CV would multiply the cost
+        estimator.set_params(probability=False)
+    resource_options = {}
+    if resource != 'n_samples':
+        resource = f'model__{resource}'
+        resource_options['max_resources'] = SEARCH_MAX_ESTIMATORS
+    try:
+        with threadpool_limits(limits=threads):
+            search = HalvingRandomSearchCV(
+                build_pipeline(set_thread_budget(estimator, threads), name in SCALED_MODELS,
+                                memory=Memory(cache_dir, verbose=0)),
+                {f'model__{key}': values for key, values in space.items()},
+                n_candidates=n_candidates,
+                factor=factor,
+                resource=resource,
+                # Size the first round so the last one gets the full resource
+                min_resources='exhaust',
+                cv=splits,
+                scoring='f1_weighted',
+                random_state=RANDOM_STATE,
+                refit=False,
+                return_train_score=False,
+                error_score=np.nan,
+                **resource_options,
+            )
+            started = time.perf_counter()
+            search.fit(X_train, y_train)
+            seconds = time.perf_counter() - started
+    except Exception as e:
+        print(f"❌ Error searching {name}: {str(e)}")
+        return None
+    
+    best = search.best_index_
+    params = {key.split('__', 1)[1]: value for key, value in search.best_params_.items()}
+    if resource != 'n_samples':
+        # The best configuration was scored with the final round's trees
+        params[resource.split('__', 1)[1]] = int(search.cv_results_['n_resources'][best])
+    outcome = {
+        'params': params,
+        'cv_f1_mean': float(search.cv_results_['mean_test_score'][best]),
+        'cv_f1_std': float(search.cv_results_['std_test_score'][best]),
+        'candidates_per_round': [int(n) for n in search.n_candidates_],
+        'resources_per_round': [int(n) for n in search.n_resources_],
+        'fits': int(sum(search.n_candidates_) * len(splits)),
+        'seconds': seconds,
+    }
+    print(f"✅ {name}: CV F1 {outcome['cv_f1_mean']:.4f} ± {outcome['cv_f1_std']:.4f} with {params} "
+          f"(rounds {outcome['candidates_per_round']}, {seconds:.1f}s)")
+    return outcome
+
+def search_all(models, X_train, y_train, folds, n_candidates, factor, jobs=1, store=None):
+    """Hyperparameter search for every candidate on one shared set of folds
+    
+    The stratified splits are computed once, and the preprocessing cache
+    lives for the whole search, so all candidates see identical folds.
+    Searches are checkpointed like training (see resume_per_model).
+    Returns ({name: outcome}, wall-clock seconds, (jobs, threads), names
+    reused from checkpoints).
+    """
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=RANDOM_STATE).split(X_train, y_train))
+    code = code_version([search_model, build_pipeline])
+    keys = {
+        name: store.key('search', name, code, params=model_params(model), space=SEARCH_SPACES[name],
+                        folds=folds, n_candidates=n_candidates, factor=factor,
+                        max_estimators=SEARCH_MAX_ESTIMATORS, random_state=RANDOM_STATE)
+        for name, model in models.items()
+    } if store is not None else {}
+    with tempfile.TemporaryDirectory(prefix='pcos-search-') as cache_dir:
+        return resume_per_model(search_model, models, jobs, store, 'search', keys,
+                                X_train, y_train, splits, cache_dir, n_candidates, factor)
+
+def prepare_features(result, X):
+    """Apply a trained model's own preprocessing (its pipeline minus the model) to raw features"""
+    return result['pipeline'][:-1].transform(X)
+
+def pipeline_spec(pipeline):
+    """The shared feature spec carrying a fitted pipeline's imputation and scaling"""
+    spec = TRAINING_SPEC.with_statistics(statistics=pipeline['impute'].statistics_)
+    scaler = pipeline['scale']
+    if isinstance(scaler, StandardScaler):
+        spec = spec.with_statistics(mean=scaler.mean_, scale=scaler.scale_)
+    return spec
+
+def save_model(output_dir, slug, pipeline, metrics, **extra):
+    """Write <slug>_model.pkl, <slug>_feature_spec.json and <slug>.artifact; returns their paths
+
+    The pickle keeps the whole fitted pipeline; the artifact stores the
+    final estimator as plain arrays with the pipeline's preprocessing in
+    its feature spec, which is what the service loads first.
+    """
+    model_path = f"{output_dir}/{slug}_model.pkl"
+    spec_path = f"{output_dir}/{slug}_feature_spec.json"
+    artifact_path = f"{output_dir}/{slug}{ARTIFACT_SUFFIX}"
+    with open(model_path, 'wb') as f:
+        pickle.dump({'pipeline': pipeline, 'metrics': metrics, **extra}, f)
+    spec = pipeline_spec(pipeline)
+    spec.save(spec_path)
+    save_artifact(artifact_path, pipeline[-1], spec, name=slug, class_labels=CLASS_LABELS,
+                  metrics=metrics, extra=extra or None)
+    return model_path, spec_path, artifact_path
+
+def soft_targets(X, probabilities):
+    """Expand rows so a classifier can fit the teacher's probabilities
+    
+    Every row appears once per class, weighted by the teacher's probability
+    for that class; zero-weight copies are dropped.
+    """
+    n_rows, n_classes = probabilities.shape
+    X_soft = np.repeat(X, n_classes, axis=0)
+    y_soft = np.tile(np.arange(n_classes), n_rows)
+    weights = probabilities.reshape(-1)
+    keep = weights > 0
+    return X_soft[keep], y_soft[keep], weights[keep]
+
+def row_timings_us(backend, X, repeats=500):
+    """Single-row predict_proba timings in microseconds, after a short warmup"""
+    row = np.ascontiguousarray(X[:1], dtype=np.float64)
+    for _ in range(20):
+        backend.predict_proba(row)
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        started = time.perf_counter()
+        backend.predict_proba(row)
+        timings[i] = time.perf_counter() - started
+    return timings * 1e6
+
+def serving_latency_us(model, X, repeats=2000):
+    """(backend name, median single-row latency in µs) on the backend the service would build
+    
+    Uses the same create_backend as benchmark_inference and the service's
+    registry, so models are compared as they are actually served.
+    """
+    backend = create_backend(model, n_features=X.shape[1])
+    return backend.name, float(np.median(row_timings_us(backend, X, repeats)))
+
+def loaded_rss_mb(artifact_path, n_features):
+    """Resident memory a saved bundle adds to a fresh process (None if not measurable)"""
+    try:
+        output = subprocess.run(
+            [sys.executable, '-c', RSS_PROBE, SERVICE_DIR, artifact_path, str(n_features)],
+            capture_output=True, text=True, timeout=120, check=True,
+        ).stdout
+        return int(output.strip().splitlines()[-1]) / 1024
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError):
+        return None
+
+def benchmark_inference(result, X_test, repeats=2000):
+    """Serving cost of one trained pipeline
+    
+    Latency and throughput are for the model on the service's inference
+    backend (compiled where possible), on rows already encoded and
+    preprocessed as the service's feature encoder hands them over. Size is
+    the pickled bundle; RSS is measured by loading it in a fresh process.
+    """
+    X = prepare_features(result, X_test)
+    backend = create_backend(result['model'], n_features=X.shape[1])
+    timings = row_timings_us(backend, X, repeats)
+    
+    batch = np.ascontiguousarray(np.resize(X, (BENCHMARK_BATCH_ROWS, X.shape[1])), dtype=np.float64)
+    backend.predict_proba(batch)
+    batch_seconds = []
+    for _ in range(5):
+        started = time.perf_counter()
+        backend.predict_proba(batch)
+        batch_seconds.append(time.perf_counter() - started)
+    
+    with tempfile.NamedTemporaryFile(suffix='.pkl') as f:
+        pickle.dump({'pipeline': result['pipeline']}, f)
+        f.flush()
+        size_bytes = os.path.getsize(f.name)
+        rss_mb = loaded_rss_mb(f.name, X.shape[1])
+    return {
+        'backend': backend.name,
+        'latency_p50_us': float(np.percentile(timings, 50)),
+        'latency_p99_us': float(np.percentile(timings, 99)),
+        'batch_rows_per_second': float(BENCHMARK_BATCH_ROWS / np.median(batch_seconds)),
+        'size_kb': size_bytes / 1024,
+        'rss_mb': rss_mb,
+    }
+
+def pareto_front(names, quality, inference):
+    """Candidates no other candidate beats on quality, p99 latency and size at once"""
+    def costs(name):
+        return (-quality[name], inference[name]['latency_p99_us'], inference[name]['size_kb'])
+    
+    def dominates(a, b):
+        return all(x <= y for x, y in zip(costs(a), costs(b))) and costs(a) != costs(b)
+    
+    return [name for name in names if not any(dominates(other, name) for other in names if other != name)]
+
+def select_model(quality, inference, max_latency_us=None, max_size_kb=None):
+    """Pick the best-quality Pareto-optimal model within the latency and size budgets
+    
+    Returns (name, front, within_budget). Without budgets this is the
+    highest-quality model, ties going to the cheaper one. If no model fits
+    the budgets, the best-quality model overall is returned.
+    """
+    names = list(quality)
+    front = pareto_front(names, quality, inference)
+    within_budget = [
+        name for name in names
+        if (max_latency_us is None or inference[name]['latency_p99_us'] <= max_latency_us)
+        and (max_size_kb is None or inference[name]['size_kb'] <= max_size_kb)
+    ]
+    eligible = [name for name in front if name in within_budget] or within_budget or names
+    # Highest quality first; among equals, the faster and then the smaller model
+    best = min(eligible, key=lambda name: (-quality[name], inference[name]['latency_p99_us'],
+                                           inference[name]['size_kb']))
+    return best, front, within_budget
+
+def distill_surrogate(teacher_name, teacher, X_train, X_test, y_test, tolerance, min_speedup=None):
+    """Fit compact surrogates to the teacher's probabilities and gate them
+    
+    Candidates are shallow decision trees and a logistic model, trained on
+    the teacher's soft labels for the training set; those of the teacher's
+    own model family are skipped, as they would not simplify it. Latency is
+    the median single-row time on the service's inference backend, for the
+    teacher and every candidate alike. A candidate passes if its accuracy
+    and F1 on the held-out test set (true labels) are within `tolerance` of
+    the teacher's and it is faster than the teacher, by at least
+    `min_speedup` times when given. The fastest passing candidate is
+    promoted; ties go to the simpler candidate (listed first).
+    """
+    print(f"\n🧪 Distilling a fast-tier surrogate from {teacher_name} (tolerance {tolerance:.3f})...")
+    teacher_train = teacher['model'].predict_proba(prepare_features(teacher, X_train))
+    X_teacher_test = prepare_features(teacher, X_test)
+    teacher_test = teacher['model'].predict(X_teacher_test)
+    teacher_backend, teacher_latency = serving_latency_us(teacher['model'], X_teacher_test)
+    
+    candidates = {
+        f'Decision Tree (depth {depth})': (
+            DecisionTreeClassifier(max_depth=depth, min_samples_leaf=5, random_state=RANDOM_STATE), False
+        )
+        for depth in (2, 3, 4, 5)
+    }
+    candidates['Logistic Regression'] = (
+        LogisticRegression(random_state=RANDOM_STATE, max_iter=1000, solver='lbfgs'), True
+    )
+    
+    # Each preprocessing prefix is fitted once and shared by the candidates using it
+    prefixes = {}
+    results = []
+    for name, (model, needs_scaling) in candidates.items():
+        if type(model) is type(teacher['model']):
+            print(f"   ⏭️  {name}: same model family as {teacher_name}, skipped")
+            continue
+        if needs_scaling not in prefixes:
+            prefix = build_pipeline(model, needs_scaling)[:-1]
+            X_fit = prefix.fit_transform(X_train)
+            prefixes[needs_scaling] = (prefix, X_fit, prefix.transform(X_test))
+        prefix, X_fit, X_eval = prefixes[needs_scaling]
+        X_soft, y_soft, weights = soft_targets(X_fit, teacher_train)
+        model.fit(X_soft, y_soft, sample_weight=weights)
+        
+        candidate = {'pipeline': Pipeline(prefix.steps + [('model', model)]), 'model': model}
+        y_pred = model.predict(X_eval)
+        accuracy = accuracy_score(y_test, y_pred)
+        f1 = f1_score(y_test, y_pred, average='weighted', zero_division=0)
+        backend, latency = serving_latency_us(model, X_eval)
+        candidate.update({
+            'name': name,
+            'accuracy': accuracy,
+            'precision': precision_score(y_test, y_pred, average='weighted', zero_division=0),
+            'recall': recall_score(y_test, y_pred, average='weighted', zero_division=0),
+            'f1_score': f1,
+            'fidelity': float(np.mean(y_pred == teacher_test)),
+            'backend': backend,
+            'latency_us': latency,
+        })
+        candidate['speedup'] = teacher_latency / latency
+        candidate['passed'] = (accuracy >= teacher['accuracy'] - tolerance
+                               and f1 >= teacher['f1_score'] - tolerance
+                               and candidate['speedup'] > 1
+                               and (min_speedup is None or candidate['speedup'] >= min_speedup))
+        results.append(candidate)
+        print(f"   {'✅' if candidate['passed'] else '❌'} {name}: accuracy {accuracy:.4f}, F1 {f1:.4f}, "
+              f"agreement with teacher {candidate['fidelity']:.4f}, {latency:.1f} µs/row on {backend} "
+              f"({candidate['speedup']:.2f}x)")
+    
+    passing = [candidate for candidate in results if candidate['passed']]
+    promoted = min(passing, key=lambda candidate: candidate['latency_us']) if passing else None
+    if promoted:
+        print(f"🏎️  Promoting {promoted['name']} as the fast tier "
+              f"({teacher_latency:.1f} → {promoted['latency_us']:.1f} µs/row)")
+    else:
+        speed = f"{min_speedup:g}x faster" if min_speedup is not None else "faster"
+        print(f"⚠️  No surrogate within {tolerance:.3f} of {teacher_name} and {speed}; fast tier not exported")
+    return {
+        'teacher': teacher_name,
+        'teacher_backend': teacher_backend,
+        'teacher_latency_us': teacher_latency,
+        'tolerance': tolerance,
+        'min_speedup': min_speedup,
+        'candidates': results,
+        'promoted': promoted,
+    }
+
+def main(argv=None):
     """Main function to train and compare all models"""
+    parser = argparse.ArgumentParser(description='Train and compare PCOS prediction models')
+    parser.add_argument('--distill-tolerance', type=float, default=0.02,
+                        help='Max accuracy/F1 drop allowed for the fast-tier surrogate')
+    parser.add_argument('--skip-distill', action='store_true', help='Do not distill a fast-tier surrogate')
+    parser.add_argument('--min-surrogate-speedup', type=float,
+                        help='Require the surrogate to be at least this many times faster than the teacher '
+                             '(median single-row latency, e.g. 2); by default any speed-up is enough')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Models trained in parallel processes (0: one per CPU); CPUs are split between them')
+    parser.add_argument('--search', action='store_true',
+                        help='Tune each model with stratified k-fold CV and successive halving first')
+    parser.add_argument('--folds', type=int, default=5, help='CV folds for --search')
+    parser.add_argument('--search-candidates', type=int, default=24,
+                        help='Configurations sampled per model in the first halving round')
+    parser.add_argument('--halving-factor', type=int, default=3,
+                        help='Each halving round keeps 1/factor of the configurations')
+    parser.add_argument('--no-benchmark', action='store_true',
+                        help='Skip the inference benchmark (and with it budget-aware selection)')
+    parser.add_argument('--max-latency-ms', type=float,
+                        help='Budget on single-row p99 inference latency for the selected model')
+    parser.add_argument('--max-size-mb', type=float,
+                        help='Budget on the serialized size of the selected model')
+    parser.add_argument('--no-data-cache', action='store_true',
+                        help='Re-parse the CSV instead of using the prepared-dataset cache')
+    parser.add_argument('--run-dir', default='models/runs',
+                        help='Where per-model checkpoints are kept (one run directory per dataset)')
+    parser.add_argument('--fresh', action='store_true',
+                        help='Retrain every model instead of resuming from checkpoints (they are overwritten)')
+    parser.add_argument('--no-checkpoints', action='store_true',
+                        help='Neither read nor write checkpoints')
+    args = parser.parse_args(argv)
+    jobs = args.jobs if args.jobs > 0 else available_cpus()
+    
     print("=" * 80)
     print("🚀 PCOS Prediction Model Comparison")
     print("=" * 80)
     
     # Load data
     try:
-        X, y = load_and_prepare_data()
+        X, y = load_and_prepare_data(use_cache=not args.no_data_cache)
     except Exception as e:
         print(f"❌ Error loading data: {e}")
         print("\nTrying alternative data file...")
         try:
-            X, y = load_and_prepare_data('data/PCOS_cleaned_basic.csv')
+            X, y = load_and_prepare_data('data/PCOS_cleaned_basic.csv', use_cache=False)
         except Exception as e2:
             print(f"❌ Error: {e2}")
             return
@@ -255,8 +818,16 @@ def main():
     print(f"   Training set: {len(X_train)} samples")
     print(f"   Test set: {len(X_test)} samples")
     
-    # Initialize scaler for models that need it
-    scaler = StandardScaler()
+    # Columns are in TRAINING_SPEC order; pipelines are fitted on plain arrays,
+    # as serving passes them, so no column-name checks travel with the artifact
+    X_train, X_test = X_train.to_numpy(), X_test.to_numpy()
+    
+    # Checkpoints are only valid for this exact split
+    store = None
+    if not args.no_checkpoints:
+        store = CheckpointStore(args.run_dir, data_fingerprint(X_train, X_test, y_train, y_test),
+                                reuse=not args.fresh)
+        print(f"   Run directory: {store.run_dir}")
     
     # Define all models to compare
     models = {
@@ -294,16 +865,29 @@ def main():
         )
     }
     
-    # Train and evaluate all models
-    results = {}
-    
-    for name, model in models.items():
-        result = train_and_evaluate_model(
-            model, name, X_train, X_test, y_train, y_test,
-            scaler=scaler if name in ['SVM', 'KNN', 'Logistic Regression'] else None
+    # Tune hyperparameters on the training set only; the test set stays held out
+    searches = {}
+    search_wall_seconds = 0.0
+    search_reused = []
+    if args.search:
+        searches, search_wall_seconds, _, search_reused = search_all(
+            models, X_train, y_train, args.folds, args.search_candidates, args.halving_factor,
+            jobs=jobs, store=store
         )
-        if result:
-            results[name] = result
+        for name, outcome in searches.items():
+            models[name].set_params(**outcome['params'])
+        print(f"\n⏱️  Search wall-clock: {search_wall_seconds:.2f}s")
+    
+    # Train and evaluate all models
+    results, training_wall_seconds, (training_jobs, training_threads), reused = train_all(
+        models, X_train, X_test, y_train, y_test, jobs=jobs, store=store
+    )
+    model_seconds = sum(result['fit_seconds'] + result['predict_seconds'] for result in results.values())
+    print(f"\n⏱️  Training wall-clock: {training_wall_seconds:.2f}s "
+          f"(sum of per-model fit + predict: {model_seconds:.2f}s, "
+          f"{training_jobs} job(s) x {training_threads} thread(s))")
+    if reused:
+        print(f"   Reused from checkpoints (not counted in wall-clock): {', '.join(reused)}")
     
     # Create comparison dataframe
     print("\n" + "=" * 80)
@@ -320,14 +904,55 @@ def main():
             'F1-Score': f"{result['f1_score']:.4f}",
             'Precision (Binary)': f"{result['precision_binary']:.4f}",
             'Recall (Binary)': f"{result['recall_binary']:.4f}",
-            'F1 (Binary)': f"{result['f1_binary']:.4f}"
+            'F1 (Binary)': f"{result['f1_binary']:.4f}",
+            'Fit (s)': f"{result['fit_seconds']:.3f}",
+            'Predict (ms)': f"{result['predict_seconds'] * 1000:.1f}"
         })
     
     comparison_df = pd.DataFrame(comparison_data)
     print("\n" + comparison_df.to_string(index=False))
     
-    # Find best model
-    best_model_name = max(results.items(), key=lambda x: x[1]['f1_score'])[0]
+    # Serving cost of every candidate
+    inference = {}
+    if not args.no_benchmark:
+        print(f"\n⏱️  Benchmarking inference...")
+        for name, result in results.items():
+            inference[name] = benchmark_inference(result, X_test)
+            cost = inference[name]
+            rss = f"{cost['rss_mb']:.1f} MB" if cost['rss_mb'] is not None else "n/a"
+            print(f"   {name}: p50 {cost['latency_p50_us']:.1f} µs, p99 {cost['latency_p99_us']:.1f} µs, "
+                  f"{cost['batch_rows_per_second']:,.0f} rows/s, {cost['size_kb']:.1f} KB, RSS +{rss} "
+                  f"({cost['backend']} backend)")
+    
+    # Quality is cross-validated F1 when searched, so one split cannot decide it
+    searched = bool(searches) and all(name in searches for name in results)
+    quality = {name: searches[name]['cv_f1_mean'] if searched else results[name]['f1_score'] for name in results}
+    max_latency_us = args.max_latency_ms * 1000 if args.max_latency_ms is not None else None
+    max_size_kb = args.max_size_mb * 1024 if args.max_size_mb is not None else None
+    front, within_budget = [], list(results)
+    if inference:
+        best_model_name, front, within_budget = select_model(quality, inference, max_latency_us, max_size_kb)
+    else:
+        best_model_name = max(results, key=lambda name: quality[name])
+    if searched:
+        selection = (f"the highest cross-validated F1-Score ({searches[best_model_name]['cv_f1_mean']:.4f} "
+                     f"± {searches[best_model_name]['cv_f1_std']:.4f} over {args.folds} folds); "
+                     f"test-set F1-Score {results[best_model_name]['f1_score']:.4f}")
+    else:
+        selection = f"the highest F1-Score of {results[best_model_name]['f1_score']:.4f}"
+    if inference:
+        budgets = []
+        if args.max_latency_ms is not None:
+            budgets.append(f"p99 ≤ {args.max_latency_ms:g} ms")
+        if args.max_size_mb is not None:
+            budgets.append(f"size ≤ {args.max_size_mb:g} MB")
+        if budgets and best_model_name not in within_budget:
+            print(f"⚠️  No model fits the budgets ({', '.join(budgets)}); selecting on quality alone")
+            selection += f"; no model fits the budgets ({', '.join(budgets)})"
+        elif budgets:
+            selection += f" among Pareto-optimal models within the budgets ({', '.join(budgets)})"
+        else:
+            selection += " (Pareto-optimal on quality, latency and size)"
     print(f"\n🏆 BEST MODEL: {best_model_name}")
     print(f"   F1-Score: {results[best_model_name]['f1_score']:.4f}")
     print(f"   Accuracy: {results[best_model_name]['accuracy']:.4f}")
@@ -351,35 +976,170 @@ def main():
             'recall_binary': float(result['recall_binary']),
             'f1_binary': float(result['f1_binary']),
             'confusion_matrix': result['confusion_matrix'],
-            'classification_report': result['classification_report']
+            'classification_report': result['classification_report'],
+            'fit_seconds': float(result['fit_seconds']),
+            'predict_seconds': float(result['predict_seconds'])
         }
+    for name, outcome in searches.items():
+        if name in detailed_results:
+            detailed_results[name]['search'] = outcome
+    for name, cost in inference.items():
+        detailed_results[name]['inference'] = cost
+    detailed_results['_selection'] = {
+        'selected': best_model_name,
+        'quality_metric': 'cv_f1_mean' if searched else 'f1_score',
+        'max_latency_us': max_latency_us,
+        'max_size_kb': max_size_kb,
+        'pareto_front': front,
+        'within_budget': within_budget,
+    }
+    detailed_results['_training'] = {
+        'jobs': training_jobs,
+        'threads_per_job': training_threads,
+        'jobs_requested': jobs,
+        'cpu_count': available_cpus(),
+        'wall_seconds': training_wall_seconds,
+        'sum_model_seconds': model_seconds,
+        'search_wall_seconds': search_wall_seconds if args.search else None,
+        'run_dir': store.run_dir if store is not None else None,
+        'reused_checkpoints': {'search': search_reused, 'train': reused},
+    }
     
     with open(f'{output_dir}/detailed_comparison_results.json', 'w') as f:
         json.dump(detailed_results, f, indent=2)
     
     print(f"💾 Detailed results saved to {output_dir}/detailed_comparison_results.json")
     
-    # Save all trained models
+    # Save all trained models: the fitted pipeline is the artifact, and its
+    # feature spec lets serving impute and scale while encoding
     print(f"\n💾 Saving trained models...")
     for name, result in results.items():
-        model_filename = f"{output_dir}/{name.lower().replace(' ', '_')}_model.pkl"
         try:
-            with open(model_filename, 'wb') as f:
-                pickle.dump({
-                    'model': result['model'],
-                    'imputer': result['imputer'],
-                    'scaler': result.get('scaler'),
-                    'metrics': {
-                        'accuracy': result['accuracy'],
-                        'precision': result['precision'],
-                        'recall': result['recall'],
-                        'f1_score': result['f1_score']
-                    }
-                }, f)
-            print(f"   ✅ {name} saved to {model_filename}")
+            model_filename, spec_filename, artifact_dir = save_model(
+                output_dir, name.lower().replace(' ', '_'), result['pipeline'], {
+                    'accuracy': result['accuracy'],
+                    'precision': result['precision'],
+                    'recall': result['recall'],
+                    'f1_score': result['f1_score']
+                })
+            print(f"   ✅ {name} saved to {model_filename} (feature spec: {spec_filename}, artifact: {artifact_dir})")
         except Exception as e:
             print(f"   ❌ Error saving {name}: {e}")
     
+    # Distill the best model into a fast-tier surrogate, exported only if it passes the gate
+    distillation = None
+    surrogate_files = (f"{output_dir}/{SURROGATE_NAME}_model.pkl",
+                       f"{output_dir}/{SURROGATE_NAME}_feature_spec.json",
+                       f"{output_dir}/{SURROGATE_NAME}{ARTIFACT_SUFFIX}")
+    if not args.skip_distill:
+        distillation = distill_surrogate(best_model_name, results[best_model_name],
+                                         X_train, X_test, y_test, args.distill_tolerance,
+                                         args.min_surrogate_speedup)
+        promoted = distillation['promoted']
+        if promoted:
+            save_model(output_dir, SURROGATE_NAME, promoted['pipeline'], {
+                'accuracy': promoted['accuracy'],
+                'precision': promoted['precision'],
+                'recall': promoted['recall'],
+                'f1_score': promoted['f1_score'],
+                'fidelity': promoted['fidelity'],
+            }, teacher=best_model_name, surrogate=promoted['name'])
+            print(f"   ✅ Surrogate saved to {surrogate_files[0]} (feature spec: {surrogate_files[1]}, "
+                  f"artifact: {surrogate_files[2]})")
+        else:
+            # Never leave an earlier surrogate behind for a teacher it was not gated against
+            for path in surrogate_files:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+        
+        with open(f'{output_dir}/distillation_results.json', 'w') as f:
+            json.dump({
+                'teacher': distillation['teacher'],
+                'teacher_accuracy': float(results[best_model_name]['accuracy']),
+                'teacher_f1_score': float(results[best_model_name]['f1_score']),
+                'teacher_backend': distillation['teacher_backend'],
+                'teacher_latency_us': distillation['teacher_latency_us'],
+                'tolerance': distillation['tolerance'],
+                'min_speedup': distillation['min_speedup'],
+                'promoted': promoted['name'] if promoted else None,
+                'candidates': {
+                    candidate['name']: {
+                        **{key: float(candidate[key])
+                           for key in ('accuracy', 'f1_score', 'fidelity', 'latency_us', 'speedup')},
+                        'backend': candidate['backend'],
+                        'passed': bool(candidate['passed']),
+                    }
+                    for candidate in distillation['candidates']
+                },
+            }, f, indent=2)
+    
+    distillation_section = ""
+    if distillation is not None:
+        rows = "\n".join(
+            f"| {c['name']} | {c['accuracy']:.4f} | {c['f1_score']:.4f} | {c['fidelity']:.4f} | "
+            f"{c['latency_us']:.1f} | {c['speedup']:.2f}x | {'✅' if c['passed'] else '❌'} |"
+            for c in distillation['candidates']
+        )
+        outcome = (f"**{distillation['promoted']['name']}** promoted as the fast tier (`{SURROGATE_NAME}_model.pkl`)"
+                   if distillation['promoted'] else "No candidate passed; no fast tier exported")
+        speed_gate = (f"at least {distillation['min_speedup']:g}x faster"
+                      if distillation['min_speedup'] is not None else "faster than it")
+        distillation_section = f"""
+## Fast-Tier Surrogate
+Distilled from {best_model_name} ({distillation['teacher_latency_us']:.1f} µs/row on {distillation['teacher_backend']}); candidates must stay within {distillation['tolerance']:.3f} of its accuracy and F1 and be {speed_gate}; the fastest passing one is promoted.
+
+| Candidate | Accuracy | F1-Score | Agreement | µs/row | Speed-up | Passed |
+|---|---|---|---|---|---|---|
+{rows}
+
+{outcome}
+"""
+    
+    checkpoint_line = ""
+    if reused or search_reused:
+        stages = [f"{stage}: {', '.join(names)}" for stage, names in (('search', search_reused), ('training', reused)) if names]
+        checkpoint_line = (f"- Reused from checkpoints in `{store.run_dir}` (not in wall-clock; times are from "
+                           f"the original run): {'; '.join(stages)}\n")
+    
+    inference_section = ""
+    if inference:
+        def rss_cell(cost):
+            return f"{cost['rss_mb']:.1f}" if cost['rss_mb'] is not None else "n/a"
+        
+        rows = "\n".join(
+            f"| {name} | {cost['backend']} | {cost['latency_p50_us']:.1f} | {cost['latency_p99_us']:.1f} | "
+            f"{cost['batch_rows_per_second']:,.0f} | {cost['size_kb']:.1f} | {rss_cell(cost)} | "
+            f"{'✅' if name in front else ''} | {'✅' if name in within_budget else '❌'} |"
+            for name, cost in inference.items()
+        )
+        inference_section = f"""
+## Inference Cost
+Single-row latency and {BENCHMARK_BATCH_ROWS}-row batch throughput on the service's inference backend (preprocessed rows), pickled size, and resident memory added by loading the model in a fresh process.
+
+| Model | Backend | p50 (µs) | p99 (µs) | Batch rows/s | Size (KB) | RSS (MB) | Pareto | Within budget |
+|---|---|---|---|---|---|---|---|---|
+{rows}
+"""
+    
+    search_section = ""
+    if searches:
+        rows = "\n".join(
+            f"| {name} | {outcome['cv_f1_mean']:.4f} ± {outcome['cv_f1_std']:.4f} | "
+            f"{' → '.join(str(n) for n in outcome['candidates_per_round'])} | {outcome['fits']} | "
+            f"{outcome['seconds']:.1f} | `{json.dumps(outcome['params'], default=str)}` |"
+            for name, outcome in searches.items()
+        )
+        search_section = f"""
+## Hyperparameter Search
+Successive-halving random search (factor {args.halving_factor}) scored by weighted F1 on the same {args.folds} stratified folds of the training set; total {search_wall_seconds:.1f}s.
+
+| Model | CV F1-Score | Candidates per round | Fits | Seconds | Chosen parameters |
+|---|---|---|---|---|---|
+{rows}
+"""
+    
     # Create a summary report
     report = f"""
 # ML Model Comparison Report
@@ -397,9 +1157,13 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 {comparison_df.to_markdown(index=False)}
 
+## Training Time
+- Wall-clock: {training_wall_seconds:.2f}s with {training_jobs} parallel job(s) x {training_threads} thread(s) on {available_cpus()} CPU(s)
+- Sum of per-model fit + predict: {model_seconds:.2f}s
+{checkpoint_line}{search_section}{inference_section}
 ## Best Model
-**{best_model_name}** achieved the highest F1-Score of {results[best_model_name]['f1_score']:.4f}
-
+**{best_model_name}** achieved {selection}
+{distillation_section}
 ## Detailed Results
 See `detailed_comparison_results.json` for confusion matrices and classification reports.
 """